@@ -0,0 +1,107 @@
+from .files import get_file_digest
+from subprocess import Popen, PIPE, STDOUT
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+
+# Tool versions do not change during a campaign, so only query them once
+_tool_versions = {}
+
+
+def get_tool_versions(version_commands):
+    """
+    Return a dictionary giving, for each tool of `version_commands` (a dictionary
+    tool name -> bash command), the output of its version command.
+    """
+    versions = {}
+    for tool, cmd in sorted(version_commands.items()):
+        if cmd not in _tool_versions:
+            p = Popen(cmd, shell=True, stdout=PIPE, stderr=STDOUT)
+            stdout, _ = p.communicate()
+            _tool_versions[cmd] = stdout.decode(errors="replace").strip()
+        versions[tool] = _tool_versions[cmd]
+
+    return versions
+
+
+def get_run_inputs(topo_parameter, experiment_parameter, experiment_class, repetition):
+    """
+    Gather everything that determines the outcome of a run in a JSON-able dictionary
+    """
+    return {
+        "topo": topo_parameter.as_dict(),
+        "traces": {p: get_file_digest(p) for p in topo_parameter.get_trace_paths()},
+        "experiment": experiment_parameter.as_dict(),
+        "experiment_name": experiment_class.NAME,
+        "repetition": repetition,
+        "tool_versions": get_tool_versions(experiment_class.VERSION_COMMANDS),
+    }
+
+
+class ResultCache(object):
+    """
+    Content-addressed storage of the results of runs.
+
+    The results of a run are stored in `results_dir/{hash}`, where `hash` is
+    computed over the inputs of the run (see `get_run_inputs`). While the run is
+    ongoing, its results are in `results_dir/{hash}.partial`; the directory is
+    renamed once the run completes, and it then contains a `run.json` file
+    describing the inputs of the run. A run whose directory is complete does not
+    need to be run again, so that an interrupted campaign can be resumed.
+
+    Attributes:
+        results_dir     the directory containing all the run directories
+    """
+    PARTIAL_SUFFIX = ".partial"
+    RUN_INFO_FILENAME = "run.json"
+
+    def __init__(self, results_dir):
+        self.results_dir = os.path.abspath(results_dir)
+        if not os.path.isdir(self.results_dir):
+            os.makedirs(self.results_dir)
+
+    def get_run_hash(self, run_inputs):
+        return hashlib.sha256(json.dumps(run_inputs, sort_keys=True).encode()).hexdigest()
+
+    def get_directory(self, run_hash):
+        return os.path.join(self.results_dir, run_hash)
+
+    def get_partial_directory(self, run_hash):
+        return self.get_directory(run_hash) + ResultCache.PARTIAL_SUFFIX
+
+    def is_complete(self, run_hash):
+        return os.path.isfile(os.path.join(self.get_directory(run_hash),
+            ResultCache.RUN_INFO_FILENAME))
+
+    def start(self, run_hash):
+        """
+        Create an empty directory for the run and return it. Leftovers of a
+        previous interrupted attempt are removed.
+        """
+        partial_directory = self.get_partial_directory(run_hash)
+        if os.path.exists(partial_directory):
+            logging.info("Removing the results of an interrupted run in {}".format(
+                partial_directory))
+            shutil.rmtree(partial_directory)
+
+        os.makedirs(partial_directory)
+        return partial_directory
+
+    def complete(self, run_hash, run_info):
+        """
+        Mark the run as complete, storing `run_info` alongside its results
+        """
+        partial_directory = self.get_partial_directory(run_hash)
+        with open(os.path.join(partial_directory, ResultCache.RUN_INFO_FILENAME), "w") as f:
+            json.dump(run_info, f, indent=4, sort_keys=True)
+
+        directory = self.get_directory(run_hash)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(partial_directory, directory)
+        logging.info("Results stored in {}".format(directory))
+        return directory
@@ -0,0 +1,189 @@
+from .sysctl import run_in_netns
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE, STDOUT
+
+import functools
+import re
+import shlex
+import subprocess
+
+
+class CommandResult(object):
+    """
+    Outcome of a command run in a batch
+
+    Attributes:
+        cmd         the command
+        output      the output (stdout and stderr) of the command
+        exit_code   the exit code of the command, or None if it could not be retrieved
+        end_time    wall clock time when the command ended, or None if unknown
+    """
+    def __init__(self, cmd, output, exit_code, end_time=None):
+        self.cmd = cmd
+        self.output = output
+        self.exit_code = exit_code
+        self.end_time = end_time
+
+    def __str__(self):
+        return "{} -> {}".format(self.cmd, self.exit_code)
+
+
+# Printed after each command of a batch, followed by its exit code and by the
+# time it ended (bash >= 5 provides it without spawning a process)
+BATCH_MARKER = "__minitopo_rc__"
+BATCH_MARKER_RE = re.compile(r"\r?\n{}(\d+) ?([\d.,]*)\r?\n".format(BATCH_MARKER))
+
+
+# Builders without a persistent shell per node (see netns_builder) run each
+# command in a new shell, where $! is empty: they provide the PID of the last
+# command started in background in this variable instead
+LAST_BACKGROUND_PID_VARIABLE = "MINITOPO_LAST_PID"
+
+# Scripts are sent to the shells of the hosts as a single line: through a pty
+# (e.g., Mininet), longer lines than about 4 KB get truncated
+MAX_SCRIPT_SIZE = 3072
+
+
+def build_batch_script(cmds):
+    """
+    Return a single-line bash script running all the commands of `cmds` one after
+    the other in the current shell, printing a marker with the exit code and the
+    end time after each of them.
+
+    Commands are run in the current shell (and not in a subshell), so that e.g.,
+    `cd` keeps having an effect on the next commands. Commands ending with `&` are
+    started in background and their exit code is 0. Each command is quoted and
+    run by `eval`, so that e.g., a `#` in it does not comment out the rest of the
+    line.
+    """
+    parts = []
+    for cmd in cmds:
+        if "\n" in cmd:
+            raise ValueError("Cannot batch multi-line command: {}".format(cmd))
+        cmd = cmd.strip().rstrip(";").rstrip()
+        parts.append("{{ eval {}; }} 2>&1; printf '\\n{}%d %s\\n' $? \"$EPOCHREALTIME\"".format(
+            shlex.quote(cmd), BATCH_MARKER))
+
+    return "; ".join(parts)
+
+
+def split_batch(cmds, max_size=MAX_SCRIPT_SIZE):
+    """
+    Split the list of commands `cmds` in consecutive lists whose scripts (see
+    build_batch_script) hold in `max_size` bytes. A command too long by itself
+    makes a list on its own.
+    """
+    chunks, chunk, size = [], [], 0
+    for cmd in cmds:
+        cmd_size = len(build_batch_script([cmd]).encode()) + 2
+        if chunk and size + cmd_size > max_size:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(cmd)
+        size += cmd_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def parse_batch_output(cmds, output):
+    """
+    Split the output of a script built by `build_batch_script(cmds)` in a list of
+    CommandResult, one per command of `cmds`
+    """
+    if type(output) is bytes:
+        output = output.decode()
+
+    # pieces is made of (output, exit code, end time) triplets, the last piece
+    # being what follows the last marker
+    pieces = BATCH_MARKER_RE.split(output)
+    results = []
+    for i, cmd in enumerate(cmds):
+        if 3 * i + 2 < len(pieces):
+            end_time = pieces[3 * i + 2].replace(",", ".")
+            results.append(CommandResult(cmd, pieces[3 * i], int(pieces[3 * i + 1]),
+                float(end_time) if end_time else None))
+        elif 3 * i < len(pieces):
+            # The batch was interrupted during this command
+            results.append(CommandResult(cmd, pieces[3 * i], None))
+        else:
+            results.append(CommandResult(cmd, "", None))
+
+    return results
+
+
+class NetnsShell(object):
+    """
+    Stand-in for the shell of a host, running each command in a new bash process
+    entering the network namespace of the host (see sysctl.run_in_netns). It
+    serves commands that cannot wait for the shell of the host, e.g., link events
+    fired while the experiment holds it.
+
+    Attributes:
+        host        the host whose namespace is entered
+        netns_path  path of the network namespace of the host
+    """
+    def __init__(self, host, netns_path):
+        self.host = host
+        self.netns_path = netns_path
+
+    def cmd(self, cmd):
+        process = run_in_netns(self.netns_path, functools.partial(subprocess.run,
+            ["bash", "-c", cmd], stdout=PIPE, stderr=STDOUT))
+        return process.stdout.decode(errors="replace")
+
+    def __str__(self):
+        return "{}".format(self.host)
+
+
+class CommandBatch(object):
+    """
+    Queue commands for several hosts, and run all the commands of a host with a
+    single shell invocation when flushing the batch.
+
+    Commands of a given host are run in the order they were added. As hosts
+    are independent, no ordering is guaranteed between commands of different
+    hosts: when `parallel` is True, the hosts run their commands concurrently.
+    Dependencies between hosts must be expressed by flushing the batch (or
+    using another one) before adding the dependent commands.
+
+    Attributes:
+        topo        instance of Topo used to run the commands
+        parallel    if True, hosts are dispatched concurrently when flushing
+        commands    dictionary host -> list of commands to run on this host
+    """
+    MAX_WORKERS = 32
+
+    def __init__(self, topo, parallel=True):
+        self.topo = topo
+        self.parallel = parallel
+        self.commands = {}
+
+    def add(self, who, cmd):
+        self.commands.setdefault(who, []).append(cmd)
+
+    def flush(self, errors=None):
+        """
+        Run all the queued commands and return a dictionary host -> list of CommandResult
+
+        When `errors` is a dictionary, the exception raised while running the
+        commands of a host is stored in it under this host, which then has no
+        results, instead of being raised.
+        """
+        commands, self.commands = self.commands, {}
+
+        def run(who, cmds):
+            if errors is None:
+                return self.topo.command_batch_to(who, cmds)
+            try:
+                return self.topo.command_batch_to(who, cmds)
+            except Exception as e:
+                errors[who] = e
+                return []
+
+        if not self.parallel or len(commands) <= 1:
+            return {who: run(who, cmds) for who, cmds in commands.items()}
+
+        with ThreadPoolExecutor(max_workers=min(len(commands), CommandBatch.MAX_WORKERS)) as executor:
+            futures = {who: executor.submit(run, who, cmds) for who, cmds in commands.items()}
+            return {who: f.result() for who, f in futures.items()}
@@ -0,0 +1,192 @@
+from .sysctl import run_in_netns
+from .telemetry import PeriodicSampler
+
+import json
+import logging
+import time
+
+
+# Read through /proc/thread-self, as /proc/self/net is the namespace of the main
+# thread, not the one entered by run_in_netns
+COUNTER_FILES = ("snmp", "netstat", "snmp6", "mptcp_net/snmp")
+PROC_NET_DIR = "/proc/thread-self/net"
+
+
+def parse_counters(text):
+    """
+    Return a dictionary counter -> value of the counters in `text`, in the formats
+    of /proc/net/snmp and /proc/net/netstat (pairs of "{Group}: {names}" and
+    "{Group}: {values}" lines, giving e.g. "Tcp.RetransSegs") or of
+    /proc/net/snmp6 and the MPTCP MIB (lines "{name} {value}")
+    """
+    counters = {}
+    headers = {}
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) < 2:
+            continue
+        if words[0].endswith(":"):
+            group = words[0][:-1]
+            if group not in headers:
+                headers[group] = words[1:]
+                continue
+            for name, value in zip(headers.pop(group), words[1:]):
+                try:
+                    counters["{}.{}".format(group, name)] = int(value)
+                except ValueError:
+                    pass
+        elif len(words) == 2:
+            try:
+                counters[words[0]] = int(words[1])
+            except ValueError:
+                pass
+    return counters
+
+
+def read_counters(proc_net_dir=PROC_NET_DIR):
+    """
+    Return the counters (see parse_counters) of the network namespace of the
+    calling thread
+    """
+    counters = {}
+    for filename in COUNTER_FILES:
+        try:
+            with open("{}/{}".format(proc_net_dir, filename)) as f:
+                counters.update(parse_counters(f.read()))
+        except (IOError, OSError):
+            pass
+    return counters
+
+
+def get_counter_deltas(before, after):
+    """
+    Return the counters that changed from `before` to `after`, with their change
+    """
+    return {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+
+
+class CounterCollector(PeriodicSampler):
+    """
+    Collect the SNMP, netstat and MPTCP MIB counters of the hosts of the
+    topology, in-process (see sysctl.run_in_netns) or through the shell of the
+    host when its namespace cannot be entered.
+
+    Snapshots are taken at the phase boundaries of the experiment (see
+    `snapshot()`), and the changes of the counters between consecutive
+    snapshots are written in FILENAME by `write()`, per phase and host. With an
+    `interval`, the changes are also recorded every `interval` seconds while the
+    experiment runs.
+
+    Attributes:
+        topo        instance of Topo
+        hosts       list of the hosts whose counters are collected
+        snapshots   list of (phase, monotonic time, dictionary host name -> counters)
+        intervals   list of the periodic records, as dictionaries
+    """
+    NAME = "counters"
+    FILENAME = "counters.json"
+    SHELL_CMD = "cat {}".format(" ".join(["/proc/net/{}".format(f) for f in COUNTER_FILES])) + \
+        " 2>/dev/null"
+
+    def __init__(self, topo, hosts, interval=0):
+        super(CounterCollector, self).__init__(interval)
+        self.topo = topo
+        self.hosts = hosts
+        self.snapshots = []
+        self.intervals = []
+        self.last_sample = None
+
+    def read_host_counters(self, who, shell=True):
+        """
+        Return the counters of `who`, or None if its namespace cannot be entered
+        and `shell` is False
+        """
+        netns_path = self.topo.get_netns_path(who)
+        if netns_path is not None:
+            try:
+                return run_in_netns(netns_path, read_counters)
+            except OSError as e:
+                if shell:
+                    logging.warning("Cannot enter namespace of {}, using its shell: {}".format(who, e))
+
+        if not shell:
+            return None
+        return parse_counters(self.topo.command_to(who, CounterCollector.SHELL_CMD))
+
+    def read_all_counters(self, shell=True):
+        counters = {}
+        for who in self.hosts:
+            host_counters = self.read_host_counters(who, shell=shell)
+            if host_counters is not None:
+                counters["{}".format(who)] = host_counters
+        return counters
+
+    def snapshot(self, phase):
+        """
+        Take a snapshot of the counters at the start of `phase` (or at the end of
+        the experiment, with "end")
+        """
+        self.snapshots.append((phase, time.monotonic(), self.read_all_counters()))
+
+    # The shells of the hosts are used by the experiment, so periodic samples are
+    # only taken in-process
+    def open(self):
+        self.last_sample = self.read_all_counters(shell=False)
+
+    def sample(self, now):
+        counters = self.read_all_counters(shell=False)
+        for host, host_counters in counters.items():
+            deltas = get_counter_deltas(self.last_sample.get(host, {}), host_counters)
+            if deltas:
+                self.intervals.append({"time": now, "host": host, "deltas": deltas})
+        self.last_sample = counters
+
+    def close(self):
+        pass
+
+    def get_phase_deltas(self):
+        """
+        Return a dictionary phase -> host name -> changed counters -> change
+        """
+        phases = {}
+        for (phase, _, before), (_, _, after) in zip(self.snapshots, self.snapshots[1:]):
+            phases[phase] = {host: get_counter_deltas(before.get(host, {}), counters)
+                for host, counters in after.items()}
+        return phases
+
+    def write(self, path=FILENAME):
+        start = self.snapshots[0][1] if self.snapshots else None
+        with open(path, "w") as f:
+            json.dump({
+                "phases": [{"phase": p, "time": t - start} for p, t, _ in self.snapshots],
+                "deltas": self.get_phase_deltas(),
+                "interval": self.interval if self.interval > 0 else None,
+                "intervals": self.intervals,
+            }, f, indent=4)
+
+
+def load_counter_deltas(path, phase="run"):
+    """
+    Return a dictionary host name -> changed counter -> change during `phase`
+    from the counters file `path`
+    """
+    with open(path) as f:
+        return json.load(f)["deltas"].get(phase, {})
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the counter changes of runs")
+    parser.add_argument("files", nargs="+", help="counters files of the runs")
+    parser.add_argument("--counter", "-c", action="append", required=True,
+        help="counter to show (e.g., Tcp.RetransSegs), can be repeated")
+    parser.add_argument("--phase", "-p", default="run", help="phase of the changes")
+    parser.add_argument("--host", help="only consider this host")
+
+    args = parser.parse_args()
+    print("\t".join(["file", "host"] + args.counter))
+    for path in args.files:
+        for host, deltas in sorted(load_counter_deltas(path, phase=args.phase).items()):
+            if args.host is None or host == args.host:
+                print("\t".join([path, host] + ["{}".format(deltas.get(c, 0)) for c in args.counter]))
@@ -1,6 +1,21 @@
+from .command import LAST_BACKGROUND_PID_VARIABLE
 from .parameter import Parameter
-
+from .scheduler import LinkEventScheduler
+from .sockstats import SocketStatsSampler
+from .telemetry import LinkTelemetrySampler
+from .counters import CounterCollector
+from .packetsummary import PacketSummaryRecorder
+from .pcapindex import build_indexes
+from . import sysctl
+
+import atexit
+import glob
+import json
 import logging
+import multiprocessing
+import os
+import re
+import shlex
 
 class ExperimentParameter(Parameter):
     """
@@ -28,7 +43,18 @@ class ExperimentParameter(Parameter):
     USERPMS_ARGS   = "upms_args"
     CLIENT_PCAP = "clientPcap"
     SERVER_PCAP = "serverPcap"
-    SNAPLEN_PCAP = "snaplen_pcap"
+    ROUTER_PCAP = "routerPcap"
+    # The following capture parameters can be set per host, by suffixing them
+    # with "_client", "_server" or "_router" (see get_capture_parameter)
+    SNAPLEN_PCAP = "snaplen_pcap"  # in bytes, or "headers" for HEADERS_SNAPLEN
+    PCAP_FILTER = "pcapFilter"  # BPF filter of the captured packets
+    PCAP_PORTS = "pcapPorts"  # comma-separated ports, only capturing their TCP/UDP packets
+    PCAP_FILE_SIZE = "pcapFileSize"  # in MB, rotating the capture files (-C), 0 for one file
+    PCAP_FILES = "pcapFiles"  # number of rotated files kept (-W), 0 for all
+    PCAP_BUFFER_SIZE = "pcapBufferSize"  # kernel buffer, in KiB (-B), 0 for the default
+    PCAP_IMMEDIATE = "pcapImmediate"  # write packets as they come, ready once the header is written
+    PCAP_INDEX = "pcapIndex"  # index the captures (see PcapIndex) in the background
+    CAPTURE_MODE = "captureMode"  # "pcap" (tcpdump) or "summary" (see PacketSummaryRecorder)
     XP_TYPE     = "xpType"
     PING_COUNT  = "pingCount"
     PRIO_PATH_0 = "priority_path_0"
@@ -36,6 +62,11 @@ class ExperimentParameter(Parameter):
     BACKUP_PATH_0 = "backup_path_0"
     BACKUP_PATH_1 = "backup_path_1"
     BUFFER_AUTOTUNING = "bufferAutotuning"
+    NAMESPACE_SYSCTL = "namespaceSysctl"
+    TELEMETRY_INTERVAL = "telemetryInterval"  # in ms, 0 to disable the link telemetry
+    SOCKET_STATS_INTERVAL = "socketStatsInterval"  # in ms, 0 to disable the socket sampling
+    COUNTERS = "counters"  # collect the SNMP/netstat/MPTCP counters of the hosts
+    COUNTERS_INTERVAL = "countersInterval"  # in ms, 0 to only collect them between phases
 
     # Global sysctl keys
     SYSCTL_KEY = {
@@ -77,13 +108,27 @@ class ExperimentParameter(Parameter):
         BUFFER_AUTOTUNING: "1",
         CLIENT_PCAP: "no",
         SERVER_PCAP: "no",
+        ROUTER_PCAP: "no",
         SNAPLEN_PCAP: "65535",  # Default snapping value of tcpdump
+        PCAP_FILTER: "",
+        PCAP_PORTS: "",
+        PCAP_FILE_SIZE: "0",
+        PCAP_FILES: "0",
+        PCAP_BUFFER_SIZE: "0",
+        PCAP_IMMEDIATE: "no",
+        PCAP_INDEX: "yes",
+        CAPTURE_MODE: "pcap",
         XP_TYPE: "none",
         PING_COUNT: "5",
         PRIO_PATH_0: "0",
         PRIO_PATH_1: "0",
         BACKUP_PATH_0: "0",
         BACKUP_PATH_1: "0",
+        NAMESPACE_SYSCTL: "no",
+        TELEMETRY_INTERVAL: "0",
+        SOCKET_STATS_INTERVAL: "0",
+        COUNTERS: "yes",
+        COUNTERS_INTERVAL: "0",
     }
 
     def __init__(self, parameter_filename):
@@ -113,6 +158,43 @@ class Experiment(object):
 
     IP_BIN = "ip"
     PING_OUTPUT = "ping.log"
+    # Captures, and the parameters enabling them, by host role
+    CAPTURES = {
+        "client": ExperimentParameter.CLIENT_PCAP,
+        "server": ExperimentParameter.SERVER_PCAP,
+        "router": ExperimentParameter.ROUTER_PCAP,
+    }
+    PCAP_FILE = "{}.pcap"
+    SUMMARY_FILE = "{}" + PacketSummaryRecorder.SUFFIX
+    PCAP_LOG = "{}_pcap.log"
+    CLIENT_PCAP_LOG = PCAP_LOG.format("client")
+    SERVER_PCAP_LOG = PCAP_LOG.format("server")
+    CAPTURE_STATS_FILE = "capture_stats.json"
+    # Statistics printed by tcpdump on exit
+    CAPTURE_STATS = {
+        "captured": "captured",
+        "received by filter": "received_by_filter",
+        "dropped by kernel": "dropped_by_kernel",
+        "dropped by interface": "dropped_by_interface",
+    }
+    # Enough for the link (Linux cooked v2), IPv6 and TCP headers with options
+    HEADERS_SNAPLEN = 128
+    # Process indexing the captures of the last run, if any (see index_captures)
+    index_process = None
+
+    # Readiness probes poll with this period (in seconds), and give up after
+    # WAIT_TIMEOUT seconds unless another timeout is provided
+    WAIT_POLL_INTERVAL = 0.05
+    WAIT_TIMEOUT = 30
+    # Size of the global header of a pcap file
+    PCAP_HEADER_SIZE = 24
+
+    # Commands giving the versions of the tools used by the experiment. Their
+    # outputs are part of the inputs identifying a run (see core.cache).
+    VERSION_COMMANDS = {
+        "kernel": "uname -r",
+        "tcpdump": "tcpdump --version",
+    }
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         """
@@ -121,6 +203,19 @@ class Experiment(object):
         self.experiment_parameter = self.__class__.PARAMETER_CLASS(experiment_parameter_filename)
         self.topo = topo
         self.topo_config = topo_config
+        self.link_event_scheduler = LinkEventScheduler(topo)
+        self.link_telemetry = LinkTelemetrySampler(topo, float(
+            self.experiment_parameter.get(ExperimentParameter.TELEMETRY_INTERVAL)) / 1000.0)
+        self.socket_stats = SocketStatsSampler(topo, topo.clients + topo.servers, float(
+            self.experiment_parameter.get(ExperimentParameter.SOCKET_STATS_INTERVAL)) / 1000.0)
+        # Role -> PID of its tcpdump (None if unknown), and role -> its
+        # PacketSummaryRecorder in the "summary" capture mode
+        self.captures = {}
+        self.recorders = {}
+        self.counters = None
+        if self.experiment_parameter.get(ExperimentParameter.COUNTERS) == "yes":
+            self.counters = CounterCollector(topo, topo.clients + topo.routers + topo.servers,
+                float(self.experiment_parameter.get(ExperimentParameter.COUNTERS_INTERVAL)) / 1000.0)
 
     def load_parameters(self):
         """
@@ -135,10 +230,54 @@ class Experiment(object):
         - A preparation phase through `prepare()` (generating experiment files,...)
         - A running phase through `run()` (where the actual experiment takes place)
         - A cleaning phase through `clean()` (stopping traffic, removing generated files,...)
+
+        Link events (see run_netem_at) are timed from the start of the running phase,
+        and the link telemetry (see LinkTelemetrySampler) and the TCP sockets of the
+        clients and servers (see SocketStatsSampler) are sampled from then on.
+
+        The counters of the hosts (see CounterCollector) are collected at each phase
+        boundary, their changes being written in CounterCollector.FILENAME.
+
+        The cleaning phase also runs when the preparation or running phase fails,
+        such that no link event, sampler or capture outlives the experiment; a
+        failure of the cleaning phase is then logged, the first error being raised.
+        """
+        failed = True
+        try:
+            with self.phase("prepare"):
+                self.snapshot_counters("prepare")
+                self.prepare()
+            with self.phase("run"):
+                self.snapshot_counters("run")
+                self.link_telemetry.start()
+                self.socket_stats.start()
+                if self.counters is not None:
+                    self.counters.start()
+                self.link_event_scheduler.start()
+                self.run()
+            failed = False
+        finally:
+            try:
+                with self.phase("clean"):
+                    self.snapshot_counters("clean")
+                    self.clean()
+            except Exception as e:
+                if not failed:
+                    raise
+                logging.error("Unable to clean the failed experiment: {}".format(e))
+        self.snapshot_counters("end")
+        if self.counters is not None:
+            self.counters.write()
+
+    def snapshot_counters(self, phase):
+        if self.counters is not None:
+            self.counters.snapshot(phase)
+
+    def phase(self, name):
+        """
+        Context manager recording the phase `name` in the manifest of the run
         """
-        self.prepare()
-        self.run()
-        self.clean()
+        return self.topo.manifest.phase(name)
 
     def prepare(self):
         """
@@ -148,7 +287,8 @@ class Experiment(object):
 
         TODO: split experiment traffic and protocol configuration
         """
-        self.setup_sysctl()
+        with self.phase("setup_sysctl"):
+            self.setup_sysctl()
         self.run_userspace_path_manager()  # TODO to move elsewhere
         self.put_priority_on_paths()  # TODO to move elsewhere
         self.run_tcpdump()
@@ -158,30 +298,32 @@ class Experiment(object):
         """
         Function only meaningful for MPTCP
         """
+        batch = self.topo.command_batch()
         priority_path_0 = self.experiment_parameter.get(ExperimentParameter.PRIO_PATH_0)
         priority_path_1 = self.experiment_parameter.get(ExperimentParameter.PRIO_PATH_1)
         if not priority_path_0 == priority_path_1:
-            self.topo.command_to(self.topo_config.client, "{} link set dev {} priority {}".format(
+            batch.add(self.topo_config.client, "{} link set dev {} priority {}".format(
                 Experiment.IP_BIN, self.topo_config.get_client_interface(0), priority_path_0))
-            self.topo.command_to(self.topo_config.router, "{} link set dev {} priority {}".format(
+            batch.add(self.topo_config.router, "{} link set dev {} priority {}".format(
                 Experiment.IP_BIN, self.topo_config.get_router_interface_to_client_switch(0), priority_path_0))
-            self.topo.command_to(self.topo_config.client, "{} link set dev {} priority {}".format(
+            batch.add(self.topo_config.client, "{} link set dev {} priority {}".format(
                 Experiment.IP_BIN, self.topo_config.get_client_interface(1), priority_path_1))
-            self.topo.command_to(self.topo_config.router, "{} link set dev {} priority {}".format(
+            batch.add(self.topo_config.router, "{} link set dev {} priority {}".format(
                 Experiment.IP_BIN, self.topo_config.get_router_interface_to_client_switch(1), priority_path_1))
 
         backup_path_0 = self.experiment_parameter.get(ExperimentParameter.BACKUP_PATH_0)
         if int(backup_path_0) > 0:
-            self.topo.command_to(self.topo_config.client,
+            batch.add(self.topo_config.client,
                 self.topo_config.interface_backup_command(self.topo_config.get_client_interface(0)))
-            self.topo.command_to(self.topo_config.router,
+            batch.add(self.topo_config.router,
                 self.topo_config.interface_backup_command(self.topo_config.get_router_interface_to_client_switch(0)))
         backup_path_1 = self.experiment_parameter.get(ExperimentParameter.BACKUP_PATH_1)
         if int(backup_path_1) > 0:
-            self.topo.command_to(self.topo_config.client,
+            batch.add(self.topo_config.client,
                 self.topo_config.interface_backup_command(self.topo_config.get_client_interface(1)))
-            self.topo.command_to(self.topo_config.router,
+            batch.add(self.topo_config.router,
                 self.topo_config.interface_backup_command(self.topo_config.get_router_interface_to_client_switch(1)))
+        batch.flush()
 
     def run_userspace_path_manager(self):
         """
@@ -211,7 +353,13 @@ class Experiment(object):
             self.topo.command_to(self.topo_config.client, "killall {}".format(upms))
 
     def run_netem_at(self):
-        self.topo_config.run_netem_at()
+        """
+        Schedule the netem changes of the links, the replay of their traces and
+        their failures, fired once the experiment runs
+        """
+        self.topo_config.schedule_netem_at(self.link_event_scheduler)
+        self.topo_config.schedule_traces(self.link_event_scheduler)
+        self.topo_config.schedule_link_events(self.link_event_scheduler)
 
     def run(self):
         """
@@ -227,11 +375,63 @@ class Experiment(object):
         Typically, when you inherit from this class, you want to extend this
         method, while still calling this parent function.
         """
-        self.topo.command_to(self.topo_config.client, "killall tcpdump")
-        self.topo.command_to(self.topo_config.server, "killall tcpdump")
+        self.link_event_scheduler.cancel()
+        if self.link_event_scheduler.start_time is not None:
+            self.link_event_scheduler.write()
+        self.link_telemetry.stop()
+        self.socket_stats.stop()
+        if self.counters is not None:
+            self.counters.stop()
+        self.stop_tcpdump()
+        batch = self.topo.command_batch()
+        batch.add(self.topo_config.client, "killall tcpdump")
+        batch.add(self.topo_config.server, "killall tcpdump")
+        batch.flush()
+        self.index_captures()
         self.restore_sysctl()
         self.clean_userspace_path_manager()
 
+    def index_captures(self):
+        """
+        Index the captures of the run (see PcapIndex) in a background process,
+        such that they get indexed while the next run boots
+        """
+        if self.experiment_parameter.get(ExperimentParameter.PCAP_INDEX) != "yes":
+            return
+
+        pcaps = []
+        for role in self.captures:
+            pcaps += self.get_capture_files(role)
+        if not pcaps:
+            return
+
+        # One run is indexed at a time
+        Experiment.join_index_process()
+        if multiprocessing.current_process().daemon:
+            # Workers of parallel campaigns cannot have children
+            build_indexes(pcaps)
+            return
+
+        # The process keeps the run directory as working directory, even once
+        # moved by the result cache
+        Experiment.index_process = multiprocessing.Process(target=build_indexes,
+            args=(pcaps,), name="pcap-index")
+        Experiment.index_process.start()
+
+    @staticmethod
+    def join_index_process():
+        """
+        Wait for the indexing of the captures of the last run, if any, and report
+        its failure. This is also done when the orchestrator exits.
+        """
+        process, Experiment.index_process = Experiment.index_process, None
+        if process is None:
+            return
+        process.join()
+        if process.exitcode != 0:
+            logging.error("Indexing of the captures failed with exit code {}".format(
+                process.exitcode))
+
     def setup_sysctl(self):
         """
         Record the current sysctls of the host and write the experiment ones
@@ -239,116 +439,381 @@ class Experiment(object):
         self.save_sysctl()
         self.write_sysctl()
 
-    def save_sysctl(self):
+    def load_sysctl_keys(self):
         """
-        Record the current sysctls
-        """
-        self.sysctl_to_restore = {}
-        self._save_sysctl(ExperimentParameter.SYSCTL_KEY, self.sysctl_to_restore)
-        self.client_sysctl_to_restore = {}
-        self._save_sysctl(ExperimentParameter.SYSCTL_KEY_CLIENT, self.client_sysctl_to_restore,
-                ns=True, who=self.topo_config.client)
-        self.server_sysctl_to_restore = {}
-        self._save_sysctl(ExperimentParameter.SYSCTL_KEY_SERVER, self.server_sysctl_to_restore,
-                ns=True, who=self.topo_config.server)
-
-    def _save_sysctl(self, sysctl_dict, sysctl_to_restore, ns=False, who=None):
-        for k in sysctl_dict:
-            sysctl_key = sysctl_dict[k]
-            cmd = self.read_sysctl_cmd(sysctl_key)
-            if not ns:
-                val = self.topo.command_global(cmd)
-            else:
-                val = self.topo.command_to(who, cmd)
-            if val == "Error":
-                logging.error("unable to get sysctl {}".format(sysctl_key))
-            else:
-                # For Python3 compatibility
-                if type(val) is bytes:
-                    val = val.decode()
-                sysctl_to_restore[k] = val.split(" ", 2)[2][:-1]
+        Select the sysctl keys to set globally and in the client and server namespaces.
 
-    def read_sysctl_cmd(self, key):
-        """
-        Return a bash command to read the sysctl key `key`
+        When the NAMESPACE_SYSCTL parameter is "yes", the global keys are set in
+        the client and server namespaces instead, leaving the host untouched. This
+        is needed when several experiments run concurrently on the same host, but
+        it requires a kernel where these keys are per network namespace.
         """
-        return "sysctl {}".format(key)
+        if self.experiment_parameter.get(ExperimentParameter.NAMESPACE_SYSCTL) == "yes":
+            self.sysctl_keys = {}
+            self.client_sysctl_keys = dict(ExperimentParameter.SYSCTL_KEY,
+                **ExperimentParameter.SYSCTL_KEY_CLIENT)
+            self.server_sysctl_keys = dict(ExperimentParameter.SYSCTL_KEY,
+                **ExperimentParameter.SYSCTL_KEY_SERVER)
+        else:
+            self.sysctl_keys = ExperimentParameter.SYSCTL_KEY
+            self.client_sysctl_keys = ExperimentParameter.SYSCTL_KEY_CLIENT
+            self.server_sysctl_keys = ExperimentParameter.SYSCTL_KEY_SERVER
 
-    def cmd_write_sysctl(self, key, value):
+    def save_sysctl(self):
         """
-        Return a bash command to write the sysctl key `key`with value `value`
+        Record the current sysctls
         """
-        return '{}="{}"'.format(self.read_sysctl_cmd(key), value)
+        self.load_sysctl_keys()
+        self.sysctl_to_restore = self._save_sysctl(self.sysctl_keys)
+        self.client_sysctl_to_restore = self._save_sysctl(self.client_sysctl_keys,
+                who=self.topo_config.client)
+        self.server_sysctl_to_restore = self._save_sysctl(self.server_sysctl_keys,
+                who=self.topo_config.server)
+
+    def _save_sysctl(self, sysctl_dict, who=None):
+        if not sysctl_dict:
+            return {}
+
+        values = self.read_sysctls(set(sysctl_dict.values()), who=who)
+        return {k: values[sysctl_dict[k]] for k in sysctl_dict if sysctl_dict[k] in values}
 
     def write_sysctl(self):
         """
         Write the experiment sysctls
         """
-        self._write_sysctl(ExperimentParameter.SYSCTL_KEY, self.sysctl_to_restore)
-        self._write_sysctl(ExperimentParameter.SYSCTL_KEY_CLIENT, self.client_sysctl_to_restore,
-                ns=True, who=self.topo_config.client)
-        self._write_sysctl(ExperimentParameter.SYSCTL_KEY_SERVER, self.server_sysctl_to_restore,
-                ns=True, who=self.topo_config.server)
-
-    def _write_sysctl(self, sysctl_dict, sysctl_to_restore, ns = False, who = None):
-        for k in sysctl_to_restore:
-            sysctl_key = sysctl_dict[k]
-            sysctl_value = self.experiment_parameter.get(k)
-            cmd = self.cmd_write_sysctl(sysctl_key, sysctl_value)
-            if not ns:
-                val = self.topo.command_global(cmd)
-            else:
-                val = self.topo.command_to(who, cmd)
-            if val == "Error":
-                logging.error("unable to set sysctl {}".format(sysctl_key))
+        self._write_sysctl(self.sysctl_keys, self.sysctl_to_restore)
+        self._write_sysctl(self.client_sysctl_keys, self.client_sysctl_to_restore,
+                who=self.topo_config.client)
+        self._write_sysctl(self.server_sysctl_keys, self.server_sysctl_to_restore,
+                who=self.topo_config.server)
+
+    def _write_sysctl(self, sysctl_dict, sysctl_to_restore, who=None):
+        values = {sysctl_dict[k]: self.experiment_parameter.get(k) for k in sysctl_to_restore}
+        self.write_sysctls(values, who=who)
 
     def restore_sysctl(self):
         """
         Restore back the sysctls that were present before running the experiment
         """
-        self._restore_sysctl(ExperimentParameter.SYSCTL_KEY, self.sysctl_to_restore)
-        self._restore_sysctl(ExperimentParameter.SYSCTL_KEY_CLIENT, self.client_sysctl_to_restore,
-                ns=True, who=self.topo_config.client)
-        self._restore_sysctl(ExperimentParameter.SYSCTL_KEY_SERVER, self.server_sysctl_to_restore,
-                ns=True, who=self.topo_config.server)
-
-    def _restore_sysctl(self, sysctl_dict, sysctl_to_restore, ns = False, who = None):
-        for k in sysctl_to_restore:
-            sysctl_key = sysctl_dict[k]
-            sysctl_value = sysctl_to_restore[k]
-            cmd = self.cmd_write_sysctl(sysctl_key, sysctl_value)
-            if not ns:
-                val = self.topo.command_global(cmd)
+        self._restore_sysctl(self.sysctl_keys, self.sysctl_to_restore)
+        self._restore_sysctl(self.client_sysctl_keys, self.client_sysctl_to_restore,
+                who=self.topo_config.client)
+        self._restore_sysctl(self.server_sysctl_keys, self.server_sysctl_to_restore,
+                who=self.topo_config.server)
+
+    def _restore_sysctl(self, sysctl_dict, sysctl_to_restore, who=None):
+        values = {sysctl_dict[k]: sysctl_to_restore[k] for k in sysctl_to_restore}
+        self.write_sysctls(values, who=who)
+
+    def read_sysctls(self, keys, who=None):
+        """
+        Return a dictionary key -> value with the sysctl `keys` of the host, or of
+        the namespace of `who` if provided
+        """
+        if who is None:
+            return sysctl.read_sysctls(keys)
+
+        netns_path = self.topo.get_netns_path(who)
+        if netns_path is not None:
+            try:
+                return sysctl.run_in_netns(netns_path, sysctl.read_sysctls, keys)
+            except OSError as e:
+                logging.warning("Cannot enter namespace of {}, using its shell: {}".format(who, e))
+
+        return self._shell_sysctls(who, keys)
+
+    def write_sysctls(self, values, who=None):
+        """
+        Write the sysctls of `values` (a dictionary key -> value) on the host, or in
+        the namespace of `who` if provided, and check the kernel holds them. Return
+        the list of keys that could not be set.
+        """
+        if not values:
+            return []
+
+        if who is None:
+            return sysctl.write_sysctls(values)
+
+        netns_path = self.topo.get_netns_path(who)
+        if netns_path is not None:
+            try:
+                return sysctl.run_in_netns(netns_path, sysctl.write_sysctls, values)
+            except OSError as e:
+                logging.warning("Cannot enter namespace of {}, using its shell: {}".format(who, e))
+
+        return sysctl.check_sysctls(values, self._shell_sysctls(who, values.keys(), values))
+
+    def _shell_sysctls(self, who, keys, values=None):
+        """
+        Write `values` then read `keys` through a single invocation of the shell of
+        `who`, and return a dictionary key -> value of the keys that were read
+        """
+        keys = list(keys)
+        values = values or {}
+        batch = self.topo.command_batch()
+        for key, value in values.items():
+            batch.add(who, sysctl.write_sysctl_command(key, value))
+        for key in keys:
+            batch.add(who, sysctl.read_sysctl_command(key))
+
+        results = batch.flush().get(who, [])[len(values):]
+        read_values = {}
+        for key, result in zip(keys, results):
+            if result.exit_code == 0:
+                read_values[key] = sysctl.normalize_sysctl_value(result.output)
             else:
-                val = self.topo.command_to(who, cmd)
+                logging.error("unable to get sysctl {} on {}".format(key, who))
+
+        return read_values
+
+    def get_capture_parameter(self, key, role):
+        """
+        Return the capture parameter `key` for the host `role`, the value of
+        "{key}_{role}" overriding the one of `key`
+        """
+        value = self.experiment_parameter.parameters.get("{}_{}".format(key, role))
+        return value if value is not None else self.experiment_parameter.get(key)
 
-            if val == "Error":
-                logging.error("unable to set sysctl {}".format(sysctl_key))
+    def get_capture_host(self, role):
+        return getattr(self.topo_config, role)
+
+    def get_first_capture_file(self, role):
+        """
+        Return the first capture file written for `role`. When rotating more than
+        one file with -W, tcpdump numbers all of them from 0, with as many digits
+        as the highest number; otherwise, the first file is not numbered.
+        """
+        pcap = Experiment.PCAP_FILE.format(role)
+        files = int(self.get_capture_parameter(ExperimentParameter.PCAP_FILES, role))
+        if int(self.get_capture_parameter(ExperimentParameter.PCAP_FILE_SIZE, role)) > 0 and files > 1:
+            return pcap + "0" * len("{}".format(files - 1))
+        return pcap
+
+    def get_capture_files(self, role):
+        """
+        Return the capture files written for `role`, in the order they were written
+        """
+        pcap = Experiment.PCAP_FILE.format(role)
+        files = [f for f in glob.glob(pcap + "*") if f == pcap or f[len(pcap):].isdigit()]
+        return sorted(files, key=os.path.getmtime)
+
+    def get_capture_filter(self, role):
+        ports = [p.strip() for p in
+            self.get_capture_parameter(ExperimentParameter.PCAP_PORTS, role).split(",") if p.strip()]
+        bpf_filter = self.get_capture_parameter(ExperimentParameter.PCAP_FILTER, role).strip()
+        filters = []
+        if ports:
+            filters.append("(tcp or udp) and ({})".format(" or ".join(["port {}".format(p) for p in ports])))
+        if bpf_filter:
+            filters.append("({})".format(bpf_filter) if ports else bpf_filter)
+        return " and ".join(filters)
+
+    def build_tcpdump_cmd(self, role):
+        snaplen = self.get_capture_parameter(ExperimentParameter.SNAPLEN_PCAP, role)
+        if snaplen == "headers":
+            snaplen = Experiment.HEADERS_SNAPLEN
+        options = ["-i any", "-s {}".format(snaplen)]
+        file_size = int(self.get_capture_parameter(ExperimentParameter.PCAP_FILE_SIZE, role))
+        if file_size > 0:
+            options.append("-C {}".format(file_size))
+            files = int(self.get_capture_parameter(ExperimentParameter.PCAP_FILES, role))
+            if files > 0:
+                options.append("-W {}".format(files))
+        buffer_size = int(self.get_capture_parameter(ExperimentParameter.PCAP_BUFFER_SIZE, role))
+        if buffer_size > 0:
+            options.append("-B {}".format(buffer_size))
+        if self.get_capture_parameter(ExperimentParameter.PCAP_IMMEDIATE, role) == "yes":
+            options.append("--immediate-mode -U")
+        options.append("-w {}".format(Experiment.PCAP_FILE.format(role)))
+        bpf_filter = self.get_capture_filter(role)
+        if bpf_filter:
+            options.append(shlex.quote(bpf_filter))
+        return "tcpdump {} 2> {} &".format(" ".join(options), Experiment.PCAP_LOG.format(role))
 
     def run_tcpdump(self):
-        client_pcap = self.experiment_parameter.get(ExperimentParameter.CLIENT_PCAP)
-        server_pcap = self.experiment_parameter.get(ExperimentParameter.SERVER_PCAP)
-        snaplen_pcap = self.experiment_parameter.get(ExperimentParameter.SNAPLEN_PCAP)
-        if client_pcap == "yes":
-            self.topo.command_to(self.topo_config.client,
-                "tcpdump -i any -s {} -w client.pcap &".format(snaplen_pcap))
-        if server_pcap == "yes":
-            self.topo.command_to(self.topo_config.server,
-                "tcpdump -i any -s {} -w server.pcap &".format(snaplen_pcap))
-        if server_pcap == "yes" or client_pcap == "yes":
-            logging.info("Activating tcpdump, waiting for it to run")
-            self.topo.command_to(self.topo_config.client,"sleep 5")
+        """
+        Start the captures enabled by CAPTURES, and wait for them to run
+        """
+        roles = []
+        for role, parameter in Experiment.CAPTURES.items():
+            if self.experiment_parameter.get(parameter) != "yes":
+                continue
+            if self.get_capture_parameter(ExperimentParameter.CAPTURE_MODE, role) == "summary":
+                self.start_recorder(role)
+            else:
+                roles.append(role)
+        if not roles:
+            return
+
+        batch = self.topo.command_batch()
+        for role in roles:
+            batch.add(self.get_capture_host(role), self.build_tcpdump_cmd(role))
+        batch.flush()
+        for role in roles:
+            self.captures[role] = self.get_background_pid(self.get_capture_host(role))
+        logging.info("Activating tcpdump, waiting for it to run")
+        # tcpdump reports on stderr when the capture starts. The pcap header itself
+        # stays in its output buffer until enough packets are captured, unless
+        # packets are written as they come.
+        for role in roles:
+            who = self.get_capture_host(role)
+            self.wait_for_log(who, Experiment.PCAP_LOG.format(role), "listening on")
+            if self.get_capture_parameter(ExperimentParameter.PCAP_IMMEDIATE, role) == "yes":
+                self.wait_for_pcap(who, self.get_first_capture_file(role))
+
+    def start_recorder(self, role):
+        """
+        Start recording the packet summaries of `role` (see PacketSummaryRecorder)
+        """
+        ports = [int(p) for p in
+            self.get_capture_parameter(ExperimentParameter.PCAP_PORTS, role).split(",") if p.strip()]
+        recorder = PacketSummaryRecorder(self.topo, self.get_capture_host(role),
+            Experiment.SUMMARY_FILE.format(role), ports=ports, buffer_size=int(
+                self.get_capture_parameter(ExperimentParameter.PCAP_BUFFER_SIZE, role)) * 1024)
+        try:
+            recorder.start()
+        except OSError as e:
+            logging.error("Unable to record the packets of {}: {}".format(role, e))
+            return
+        self.recorders[role] = recorder
+
+    def stop_tcpdump(self):
+        """
+        Stop the captures, and record in CAPTURE_STATS_FILE the number of packets
+        they captured and dropped, as reported by tcpdump when it exits (or by
+        the packet summary recorders)
+        """
+        if not self.captures and not self.recorders:
+            return
+
+        batch = self.topo.command_batch()
+        for role, pid in self.captures.items():
+            batch.add(self.get_capture_host(role), "kill {}".format(pid) if pid is not None
+                else "killall tcpdump")
+        batch.flush()
+        stats = {}
+        for role, pid in self.captures.items():
+            self.wait_for_process_exit(self.get_capture_host(role), pid)
+            stats[role] = self.read_capture_stats(role)
+            stats[role]["files"] = self.get_capture_files(role)
+        for role, recorder in self.recorders.items():
+            stats[role] = recorder.stop()
+            stats[role]["files"] = [recorder.path]
+        self.recorders = {}
+        for role in stats:
+            who = self.get_capture_host(role)
+            stats[role]["host"] = "{}".format(who)
+            dropped = (stats[role].get("dropped_by_kernel") or 0) + \
+                (stats[role].get("dropped_by_interface") or 0)
+            if dropped > 0:
+                logging.warning("The capture of {} dropped {} packets".format(who, dropped))
+        with open(Experiment.CAPTURE_STATS_FILE, "w") as f:
+            json.dump(stats, f, indent=4)
+
+    def read_capture_stats(self, role):
+        """
+        Return the statistics printed by the tcpdump of `role` when it exited (None
+        for those missing)
+        """
+        stats = {k: None for k in Experiment.CAPTURE_STATS.values()}
+        try:
+            with open(Experiment.PCAP_LOG.format(role)) as f:
+                for line in f:
+                    match = re.match(r"\s*(\d+) packets? (.+?)\s*$", line)
+                    if match and match.group(2) in Experiment.CAPTURE_STATS:
+                        stats[Experiment.CAPTURE_STATS[match.group(2)]] = int(match.group(1))
+        except (IOError, OSError) as e:
+            logging.error("Cannot read the statistics of the capture of {}: {}".format(role, e))
+        return stats
+
+    def wait_until(self, who, condition, description, timeout=None):
+        """
+        Wait until the bash `condition` succeeds in the namespace of `who`, for at
+        most `timeout` seconds (WAIT_TIMEOUT by default). The polling loop runs in
+        the shell of `who`, so that waiting only costs a single command. Return
+        True if the condition was met, False on timeout.
+        """
+        timeout = Experiment.WAIT_TIMEOUT if timeout is None else timeout
+        script = "until {}; do sleep {}; done".format(condition, Experiment.WAIT_POLL_INTERVAL)
+        cmd = "timeout {} sh -c {}".format(timeout, shlex.quote(script))
+        result = self.topo.command_batch_to(who, [cmd])[0]
+        if result.exit_code != 0:
+            logging.warning("Timeout after {} s waiting for {} on {}".format(timeout,
+                description, who))
+            return False
+
+        return True
+
+    def wait_for_port(self, who, port, protocol="tcp", timeout=None):
+        """
+        Wait until a `protocol` (tcp or udp) socket listens on `port` in the
+        namespace of `who`
+        """
+        cmd = "ss -Hln{} 'sport = :{}' | grep -q .".format(protocol[0], port)
+        return self.wait_until(who, cmd, "{} port {}".format(protocol, port), timeout=timeout)
+
+    def wait_for_connections_closed(self, who, port, timeout=2):
+        """
+        Wait until no TCP connection from or to `port` is open or closing in the
+        namespace of `who`, e.g., so that the captures see the end of the
+        connections before the experiment is cleaned
+        """
+        cmd = "! ss -Htn state established state syn-sent state syn-recv state fin-wait-1 " \
+            "state closing state last-ack state close-wait " \
+            "'( sport = :{} or dport = :{} )' | grep -q .".format(port, port)
+        return self.wait_until(who, cmd, "connections on port {} to close".format(port),
+            timeout=timeout)
+
+    def wait_for_pcap(self, who, path, timeout=None):
+        """
+        Wait until the pcap file `path` of `who` has its header written
+        """
+        cmd = "[ $(stat -c %s {} 2>/dev/null || echo 0) -ge {} ]".format(path,
+            Experiment.PCAP_HEADER_SIZE)
+        return self.wait_until(who, cmd, "pcap header of {}".format(path), timeout=timeout)
+
+    def wait_for_log(self, who, path, pattern, timeout=None):
+        """
+        Wait until a line of the file `path` of `who` matches the extended regular
+        expression `pattern`
+        """
+        cmd = "grep -qE -- {} {} 2>/dev/null".format(shlex.quote(pattern), path)
+        return self.wait_until(who, cmd, "'{}' in {}".format(pattern, path), timeout=timeout)
+
+    def get_background_pid(self, who):
+        """
+        Return the PID of the last command started in background by `who`
+        """
+        output = self.topo.command_to(who, "echo ${{!:-${}}}".format(LAST_BACKGROUND_PID_VARIABLE))
+        if type(output) is bytes:
+            output = output.decode()
+        try:
+            return int(output.strip())
+        except ValueError:
+            logging.error("Cannot get the PID of the background process of {}".format(who))
+            return None
+
+    def wait_for_process_exit(self, who, pid, timeout=None):
+        """
+        Wait until the process `pid` of `who` exits
+        """
+        if pid is None:
+            return False
+
+        cmd = "! kill -0 {} 2>/dev/null".format(pid)
+        return self.wait_until(who, cmd, "process {} to exit".format(pid), timeout=timeout)
 
     def ping(self):
-        self.topo.command_to(self.topo_config.client,
-                        "rm {}".format(Experiment.PING_OUTPUT))
+        batch = self.topo.command_batch()
+        batch.add(self.topo_config.client, "rm {}".format(Experiment.PING_OUTPUT))
         count = self.experiment_parameter.get(ExperimentParameter.PING_COUNT)
         for j in range(0, self.topo_config.server_interface_count()):
             for i in range(0, self.topo_config.client_interface_count()):
                 cmd = self.ping_command(self.topo_config.get_client_ip(i),
                     self.topo_config.get_server_ip(interface_index=j), n=count)
                 logging.info(cmd)
-                self.topo.command_to(self.topo_config.client, cmd)
+                batch.add(self.topo_config.client, cmd)
+        batch.flush()
 
     def ping_command(self, from_ip, to_ip, n=5):
         return "ping -c {} -I {} {} >> {}".format(n, from_ip, to_ip, Experiment.PING_OUTPUT)
@@ -380,7 +845,8 @@ class RandomFileExperiment(Experiment):
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(RandomFileExperiment, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         super(RandomFileExperiment, self).load_parameters()
@@ -397,3 +863,6 @@ class RandomFileExperiment(Experiment):
         super(RandomFileExperiment, self).clean()
         if self.file  == "random":
             self.topo.command_to(self.topo_config.client, "rm random*")
+
+
+atexit.register(Experiment.join_index_process)
@@ -0,0 +1,28 @@
+import hashlib
+import mmap
+import os
+
+
+def map_file(path):
+    """
+    Return a read-only memory map of the file `path` (empty bytes for an empty
+    file, which cannot be mapped)
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def get_file_digest(path):
+    """
+    Return the SHA-256 of the file `path`, or None if it cannot be read
+    """
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except (IOError, OSError):
+        return None
+    return h.hexdigest()
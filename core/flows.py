@@ -0,0 +1,298 @@
+from .npy import NpyWriter
+from .packetsummary import PacketSummaryReader, PacketSummaryRecorder
+from .pcap import PcapReader, TCP_ACK, TCP_FIN, TCP_SYN
+
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import socket
+
+
+def unwrap(value, reference):
+    """
+    Return the 64-bit sequence number closest to `reference` whose 32 lower bits
+    are `value`
+    """
+    return reference + ((value - reference + (1 << 31)) & 0xffffffff) - (1 << 31)
+
+
+def format_address(address):
+    return socket.inet_ntop(socket.AF_INET if len(address) == 4 else socket.AF_INET6, address)
+
+
+class FlowState(object):
+    """
+    Sender-side state of one direction of a TCP connection, as seen at the
+    capture point. Sequence numbers are unwrapped, and relative to the first
+    sequence number seen.
+    """
+    def __init__(self, number, packet):
+        self.number = number
+        self.key = (packet.src, packet.sport, packet.dst, packet.dport)
+        self.base = packet.seq
+        # Highest sequence number sent, and highest one acknowledged by the peer
+        self.snd_nxt = 0
+        self.snd_una = None
+        # (end sequence number, time) of the segments whose acknowledgment gives an
+        # RTT sample; cleared on retransmissions (Karn's algorithm)
+        self.unacked = collections.deque()
+        self.first_time = packet.time
+        self.last_time = packet.time
+        self.totals = {"packets": 0, "bytes": 0, "goodput_bytes": 0, "retransmissions": 0,
+            "retransmitted_bytes": 0, "rtt_samples": 0}
+        self.reset_bin()
+
+    def reset_bin(self):
+        self.packets = 0
+        self.bytes = 0
+        self.goodput_bytes = 0
+        self.retransmissions = 0
+        self.retransmitted_bytes = 0
+        self.rtt_sum = 0.0
+        self.rtt_samples = 0
+
+    def get_inflight(self):
+        return self.snd_nxt - self.snd_una if self.snd_una is not None else float("nan")
+
+    def add_totals(self):
+        for name in ("packets", "bytes", "goodput_bytes", "retransmissions", "retransmitted_bytes",
+                "rtt_samples"):
+            self.totals[name] += getattr(self, name)
+
+    def get_metadata(self, start_time):
+        return dict(self.totals, flow=self.number,
+            src=format_address(self.key[0]), sport=self.key[1],
+            dst=format_address(self.key[2]), dport=self.key[3],
+            first_time=self.first_time - start_time, last_time=self.last_time - start_time)
+
+
+class FlowAnalyzer(object):
+    """
+    Compute per-flow time series from the TCP segments of a capture, in one pass
+    and bounded memory (the state of a flow being bounded by its window).
+
+    Each direction of each TCP connection (i.e., each MPTCP subflow) is a flow.
+    Segments are binned by `resolution` seconds, and for each bin where a flow
+    is active, a row of BIN_COLUMNS is written in BINS_FILE:
+        packets, bytes          segments and payload bytes sent
+        goodput_bytes           new payload bytes (above the highest sequence
+                                number seen)
+        retransmissions         segments carrying already seen payload, and
+        retransmitted_bytes     their payload
+        inflight                highest sequence number sent minus highest
+                                acknowledged one, at the end of the bin
+        rtt, rtt_samples        mean and number of the RTT samples
+    RTT samples (time from a segment to its first acknowledgment, seen from the
+    capture point, so the RTT of the path beyond it when capturing on the
+    sender) are also written one per row in RTT_FILE. Times are offsets in
+    seconds from the first packet of the capture. Arrays are float64 .npy files
+    (see NpyWriter), METADATA_FILE giving the flows and their totals.
+
+    Attributes:
+        resolution  width of the bins, in seconds
+        flows       dictionary (src, sport, dst, dport) -> FlowState
+        start_time  time of the first packet, None before
+    """
+    NAME = "flows"
+    BINS_FILE = "{}.flows.npy"
+    RTT_FILE = "{}.rtt.npy"
+    METADATA_FILE = "{}.flows.json"
+    BIN_COLUMNS = ("time", "flow", "packets", "bytes", "goodput_bytes", "retransmissions",
+        "retransmitted_bytes", "inflight", "rtt", "rtt_samples")
+    RTT_COLUMNS = ("time", "flow", "rtt")
+    DEFAULT_RESOLUTION = 0.1
+
+    def __init__(self, prefix, resolution=DEFAULT_RESOLUTION):
+        if resolution <= 0:
+            raise ValueError("Invalid resolution {}".format(resolution))
+        self.prefix = prefix
+        self.resolution = resolution
+        self.flows = {}
+        self.active_flows = set()
+        self.start_time = None
+        self.bin = 0
+        self.packets = 0
+        self.bins_writer = NpyWriter(FlowAnalyzer.BINS_FILE.format(prefix), FlowAnalyzer.BIN_COLUMNS)
+        self.rtt_writer = NpyWriter(FlowAnalyzer.RTT_FILE.format(prefix), FlowAnalyzer.RTT_COLUMNS)
+
+    def add(self, packet):
+        """
+        Account the Packet `packet`; packets must come in capture order
+        """
+        if self.start_time is None:
+            self.start_time = packet.time
+        now = packet.time - self.start_time
+        # Captures of several interfaces (-i any) are not strictly ordered
+        packet_bin = int(now / self.resolution)
+        if packet_bin > self.bin:
+            self.flush_bin()
+            self.bin = packet_bin
+        self.packets += 1
+
+        key = (packet.src, packet.sport, packet.dst, packet.dport)
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = FlowState(len(self.flows), packet)
+        self.add_segment(flow, packet, now)
+        if packet.flags & TCP_ACK:
+            peer = self.flows.get((packet.dst, packet.dport, packet.src, packet.sport))
+            if peer is not None:
+                self.add_ack(peer, packet, now)
+
+    def add_segment(self, flow, packet, now):
+        flow.last_time = packet.time
+        flow.packets += 1
+        self.active_flows.add(flow)
+        if packet.length == 0 and not packet.flags & (TCP_SYN | TCP_FIN):
+            return
+
+        seq = unwrap(packet.seq, flow.base + flow.snd_nxt) - flow.base
+        # SYN and FIN use one sequence number
+        end = seq + packet.length + (1 if packet.flags & (TCP_SYN | TCP_FIN) else 0)
+        flow.bytes += packet.length
+        if seq < flow.snd_nxt:
+            flow.retransmissions += 1
+            flow.retransmitted_bytes += min(flow.snd_nxt - seq, packet.length)
+            flow.unacked.clear()
+        elif end > flow.snd_nxt:
+            flow.unacked.append((end, now))
+        if end > flow.snd_nxt:
+            flow.goodput_bytes += min(end - max(seq, flow.snd_nxt), packet.length)
+            flow.snd_nxt = end
+
+    def add_ack(self, flow, packet, now):
+        ack = unwrap(packet.ack, flow.base + flow.snd_nxt) - flow.base
+        if flow.snd_una is not None and ack <= flow.snd_una:
+            return
+        flow.snd_una = ack
+        self.active_flows.add(flow)
+        sent = None
+        while flow.unacked and flow.unacked[0][0] <= ack:
+            sent = flow.unacked.popleft()[1]
+        if sent is not None:
+            rtt = now - sent
+            flow.rtt_sum += rtt
+            flow.rtt_samples += 1
+            self.rtt_writer.append((now, flow.number, rtt))
+
+    def flush_bin(self):
+        time = self.bin * self.resolution
+        for flow in sorted(self.active_flows, key=lambda f: f.number):
+            self.bins_writer.append((time, flow.number, flow.packets, flow.bytes, flow.goodput_bytes,
+                flow.retransmissions, flow.retransmitted_bytes, flow.get_inflight(),
+                flow.rtt_sum / flow.rtt_samples if flow.rtt_samples else float("nan"),
+                flow.rtt_samples))
+            flow.add_totals()
+            flow.reset_bin()
+        self.active_flows.clear()
+
+    def close(self):
+        """
+        Write the last bin, the arrays and their metadata, and return the metadata
+        """
+        self.flush_bin()
+        self.bins_writer.close()
+        self.rtt_writer.close()
+        metadata = {
+            "start_time": self.start_time,
+            "resolution": self.resolution,
+            "packets": self.packets,
+            "files": {
+                FlowAnalyzer.BINS_FILE.format(self.prefix): FlowAnalyzer.BIN_COLUMNS,
+                FlowAnalyzer.RTT_FILE.format(self.prefix): FlowAnalyzer.RTT_COLUMNS,
+            },
+            "flows": [f.get_metadata(self.start_time or 0) for f in
+                sorted(self.flows.values(), key=lambda f: f.number)],
+        }
+        with open(FlowAnalyzer.METADATA_FILE.format(self.prefix), "w") as f:
+            json.dump(metadata, f, indent=4)
+        return metadata
+
+
+def get_prefix(pcap_path):
+    """
+    Return the prefix of the analysis files of `pcap_path` (e.g., "client" for
+    "client.pcap" or "client.summary.npy")
+    """
+    if pcap_path.endswith(PacketSummaryRecorder.SUFFIX):
+        return pcap_path[:-len(PacketSummaryRecorder.SUFFIX)]
+    root, extension = os.path.splitext(pcap_path)
+    return root if extension == ".pcap" else pcap_path
+
+
+def open_capture(pcap_path):
+    if pcap_path.endswith(PacketSummaryRecorder.SUFFIX):
+        return PacketSummaryReader(pcap_path)
+    return PcapReader(pcap_path)
+
+
+def analyze_pcap(pcap_path, resolution=FlowAnalyzer.DEFAULT_RESOLUTION, analyzers=(FlowAnalyzer,)):
+    """
+    Analyze the capture `pcap_path` (a pcap, or packet summaries, see
+    PacketSummaryRecorder) in a single pass with each class of `analyzers`
+    (e.g., FlowAnalyzer), writing the results next to it, and return a
+    dictionary analyzer NAME -> metadata of the analysis
+    """
+    with open_capture(pcap_path) as reader:
+        instances = [a(get_prefix(pcap_path), resolution=resolution) for a in analyzers]
+        adds = [a.add for a in instances]
+        for packet in reader.packets():
+            for add in adds:
+                add(packet)
+    return {a.NAME: a.close() for a in instances}
+
+
+def _analyze_pcap_task(task):
+    pcap_path, resolution, analyzers = task
+    try:
+        results = analyze_pcap(pcap_path, resolution=resolution, analyzers=analyzers)
+    except (IOError, OSError, ValueError) as e:
+        return {"pcap": pcap_path, "status": "{}".format(e)}
+    return dict({name: len(metadata[name]) for name, metadata in results.items()},
+        pcap=pcap_path, status="ok", packets=next(iter(results.values()))["packets"])
+
+
+def analyze_pcaps(pcap_paths, resolution=FlowAnalyzer.DEFAULT_RESOLUTION, jobs=None,
+        analyzers=(FlowAnalyzer,)):
+    """
+    Analyze the captures `pcap_paths` (see analyze_pcap), one per process of a
+    pool of `jobs` processes (by default, one per available CPU), and return
+    their status
+    """
+    tasks = [(p, resolution, analyzers) for p in pcap_paths]
+    jobs = min(jobs or len(os.sched_getaffinity(0)), len(tasks))
+    if jobs <= 1:
+        return [_analyze_pcap_task(t) for t in tasks]
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(_analyze_pcap_task, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def log_results(results):
+    for result in results:
+        if result["status"] != "ok":
+            logging.error("{pcap}: {status}".format(**result))
+            continue
+        counts = ["{} {}".format(v, k) for k, v in sorted(result.items())
+            if k not in ("pcap", "status", "packets")]
+        logging.info("{}: {} packets, {}".format(result["pcap"], result["packets"], ", ".join(counts)))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute per-flow time series from captures")
+    parser.add_argument("pcaps", nargs="+", help="pcap (or .summary.npy) files to analyze")
+    parser.add_argument("--resolution", "-r", type=float, default=FlowAnalyzer.DEFAULT_RESOLUTION * 1000,
+        help="width of the bins, in ms")
+    parser.add_argument("--jobs", "-j", type=int, help="number of captures analyzed in parallel")
+
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)-15s %(message)s", level=logging.INFO)
+    log_results(analyze_pcaps(args.pcaps, resolution=args.resolution / 1000.0, jobs=args.jobs))
@@ -0,0 +1,148 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+class CommandJournal(object):
+    """
+    Journal of the commands run in a topology, stored as JSON lines.
+
+    Each record holds the host (or "Global"), the command, its start and end
+    times (monotonic clock, in seconds), its duration, its exit code (None if
+    unknown), the size of its output and the first `max_output` characters of it.
+    Records are queued by `record()` and written by a background thread, so that
+    journaling stays out of the path of the commands; the file is flushed when
+    no record arrived for FLUSH_INTERVAL seconds and when the journal is closed.
+
+    Attributes:
+        path        path of the journal file
+        max_output  number of output characters kept per command (0 for none,
+                    negative for the whole output)
+    """
+    FILENAME = "commands.jsonl"
+    MAX_OUTPUT = 256
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path, max_output=MAX_OUTPUT):
+        self.path = os.path.abspath(path)
+        self.max_output = max_output
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_records, name="journal")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, who, cmd, start, end, exit_code=None, output=None):
+        if type(output) is bytes:
+            output = output.decode(errors="replace")
+
+        output = output or ""
+        self.queue.put({
+            "host": "{}".format(who),
+            "cmd": cmd,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "exit_code": exit_code,
+            "output_size": len(output),
+            "output": output if self.max_output < 0 else output[:self.max_output],
+        })
+
+    def record_results(self, who, results, start, end):
+        """
+        Record the CommandResult `results` of a batch that ran between `start` and
+        `end`. When the end times of the commands are known, each command starts
+        when the previous one ended.
+        """
+        # Convert the wall clock end times reported by the shell
+        offset = time.monotonic() - time.time()
+        for result in results:
+            if result.end_time is None:
+                command_end = end
+            else:
+                command_end = min(max(result.end_time + offset, start), end)
+            self.record(who, result.cmd, start, command_end, result.exit_code, result.output)
+            start = command_end
+
+    def _write_records(self):
+        with open(self.path, "w") as f:
+            while True:
+                try:
+                    record = self.queue.get(timeout=CommandJournal.FLUSH_INTERVAL)
+                except queue.Empty:
+                    f.flush()
+                    continue
+
+                if record is None:
+                    break
+
+                f.write(json.dumps(record) + "\n")
+
+    def close(self):
+        """
+        Write all the pending records and close the journal file
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+
+def load_journal(path):
+    """
+    Return the list of the records of the journal file `path`
+    """
+    with open(path) as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+def slowest_commands(records, count=20, host=None):
+    """
+    Return the `count` slowest commands of `records`, optionally only those of
+    the host `host`
+    """
+    if host is not None:
+        records = [r for r in records if r["host"] == host]
+
+    return sorted(records, key=lambda r: r["duration"], reverse=True)[:count]
+
+
+def time_per_program(records):
+    """
+    Return a list of (program, number of commands, total duration) sorted by
+    decreasing total duration, where program is the first word of the command
+    (e.g., tc, ip or ethtool)
+    """
+    programs = {}
+    for r in records:
+        words = r["cmd"].split()
+        program = words[0] if words else ""
+        count, duration = programs.get(program, (0, 0.0))
+        programs[program] = (count + 1, duration + r["duration"])
+
+    return sorted([(p, c, d) for p, (c, d) in programs.items()], key=lambda e: e[2],
+        reverse=True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query a command journal of a run")
+    parser.add_argument("journal", nargs="?", default=CommandJournal.FILENAME,
+        help="path to the journal file")
+    parser.add_argument("--count", "-n", type=int, default=20,
+        help="number of commands to show")
+    parser.add_argument("--host", help="only consider the commands of this host")
+    parser.add_argument("--programs", "-p", action="store_true",
+        help="show the total time spent per program instead of the slowest commands")
+
+    args = parser.parse_args()
+    records = load_journal(args.journal)
+    if args.programs:
+        if args.host is not None:
+            records = [r for r in records if r["host"] == args.host]
+        for program, count, duration in time_per_program(records)[:args.count]:
+            print("{:10.3f} s {:6d} {}".format(duration, count, program))
+    else:
+        for r in slowest_commands(records, count=args.count, host=args.host):
+            print("{:10.3f} s {:>4} {:<12} {}".format(r["duration"],
+                "" if r["exit_code"] is None else r["exit_code"], r["host"], r["cmd"]))
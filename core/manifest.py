@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+
+import json
+import threading
+import time
+
+
+class RunManifest(object):
+    """
+    Record where the wall time of a run goes: the start and end of its phases,
+    and the number and duration of the commands run during each of them.
+
+    Phases may be nested; a command is accounted in all the phases open when it
+    runs. Times are in seconds, relative to the creation of the manifest, and
+    measured with a monotonic clock. As hosts can be configured concurrently,
+    the total duration of the commands of a phase may exceed the phase duration.
+
+    Attributes:
+        start_time      wall clock time when the manifest was created
+        phases          list of the phases, in the order they started
+        open_phases     phases started but not ended yet
+    """
+    FILENAME = "manifest.json"
+    COMMAND_KINDS = ("command_to", "command_global")
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.start = time.monotonic()
+        self.phases = []
+        self.open_phases = []
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic() - self.start
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager recording the phase `name`
+        """
+        entry = {
+            "name": name,
+            "parent": self.open_phases[-1]["name"] if self.open_phases else None,
+            "start": self.now(),
+            "end": None,
+            "duration": None,
+            "commands": {kind: {"count": 0, "duration": 0.0}
+                for kind in RunManifest.COMMAND_KINDS},
+        }
+        with self.lock:
+            self.phases.append(entry)
+            self.open_phases.append(entry)
+        try:
+            yield entry
+        finally:
+            entry["end"] = self.now()
+            entry["duration"] = entry["end"] - entry["start"]
+            with self.lock:
+                self.open_phases.remove(entry)
+
+    @contextmanager
+    def command(self, kind):
+        """
+        Context manager accounting a command of type `kind` (one of COMMAND_KINDS)
+        in the open phases
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            with self.lock:
+                for entry in self.open_phases:
+                    counter = entry["commands"][kind]
+                    counter["count"] += 1
+                    counter["duration"] += duration
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "start_time": self.start_time,
+                "duration": self.now(),
+                "phases": [dict(p) for p in self.phases],
+            }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
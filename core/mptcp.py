@@ -0,0 +1,462 @@
+from .flows import analyze_pcaps, format_address, log_results, unwrap
+from .npy import NpyWriter
+from .pcap import TCP_SYN, TCP_ACK, get_mptcp_options
+
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import struct
+
+
+MPTCP_CAPABLE = 0
+MPTCP_JOIN = 1
+MPTCP_DSS = 2
+DSS_DATA_ACK = 0x01
+DSS_DATA_ACK_8 = 0x02
+DSS_MAPPING = 0x04
+DSS_DSN_8 = 0x08
+
+
+def parse_dss_mapping(option):
+    """
+    Return (data sequence number, its size in bytes, relative subflow sequence
+    number, data-level length) of the mapping of a DSS option, or None
+    """
+    if len(option) < 4:
+        return None
+    flags = option[3]
+    if not flags & DSS_MAPPING:
+        return None
+    offset = 4
+    if flags & DSS_DATA_ACK:
+        offset += 8 if flags & DSS_DATA_ACK_8 else 4
+    dsn_size = 8 if flags & DSS_DSN_8 else 4
+    if len(option) < offset + dsn_size + 6:
+        return None
+    dsn, = struct.unpack_from("!Q" if dsn_size == 8 else "!I", option, offset)
+    ssn, length = struct.unpack_from("!IH", option, offset + dsn_size)
+    return dsn, dsn_size, ssn, length
+
+
+def get_key_token(key, version=1):
+    """
+    Return the token and the initial data sequence number derived from a key,
+    hashed with SHA-256 for MPTCP v1 (RFC 8684) and SHA-1 for v0 (RFC 6824)
+    """
+    digest = (hashlib.sha256 if version >= 1 else hashlib.sha1)(key).digest()
+    return struct.unpack("!I", digest[:4])[0], struct.unpack("!Q", digest[-8:])[0]
+
+
+class RangeSet(object):
+    """
+    Set of the byte ranges seen in a sequence space, held as the contiguous
+    prefix [0, nxt) and the sorted disjoint ranges beyond it
+    """
+    def __init__(self):
+        self.nxt = 0
+        self.ranges = []
+
+    def add(self, start, end):
+        """
+        Add the range [start, end), and return the number of bytes it added
+        """
+        start = max(start, self.nxt)
+        if end <= start:
+            return 0
+        added = end - start
+        ranges = self.ranges
+        i = bisect.bisect_left(ranges, (start,))
+        if i > 0 and ranges[i - 1][1] >= start:
+            i -= 1
+        j, merged_start, merged_end = i, start, end
+        while j < len(ranges) and ranges[j][0] <= end:
+            added -= max(min(end, ranges[j][1]) - max(start, ranges[j][0]), 0)
+            merged_start, merged_end = min(merged_start, ranges[j][0]), max(merged_end, ranges[j][1])
+            j += 1
+        ranges[i:j] = [(merged_start, merged_end)]
+        if ranges[0][0] <= self.nxt:
+            self.nxt = ranges.pop(0)[1]
+        return added
+
+
+class SubflowState(object):
+    """
+    One direction of a subflow: the relative subflow sequence numbers (1 for the
+    first data byte) are computed from the sequence number of the SYN, and data
+    sequence numbers from the last DSS mapping.
+    """
+    def __init__(self, number, direction, isn):
+        self.number = number
+        self.direction = direction
+        self.base = isn
+        self.snd_nxt = 1
+        self.mapping = None
+        self.reset_bin()
+        self.totals = {"bytes": 0, "reinjected_bytes": 0}
+
+    def reset_bin(self):
+        self.bytes = 0
+        self.reinjected_bytes = 0
+
+
+class DataDirection(object):
+    """
+    One direction of the data-level byte stream of an MPTCP connection, with a
+    model of the receiver reassembling it at the capture point. Data sequence
+    numbers are relative to the first data byte.
+    """
+    def __init__(self):
+        self.base = None
+        # Highest data sequence number sent, data sent, and in-order reassembly point
+        self.data_nxt = 0
+        self.sent = RangeSet()
+        self.rcv_nxt = 0
+        # Heap of the (start, end, arrival time) of the out-of-order segments
+        self.ooo = []
+        self.ooo_bytes = 0
+        self.hol_start = None
+        self.totals = {"bytes": 0, "reinjections": 0, "reinjected_bytes": 0, "delivered_bytes": 0,
+            "ooo_segments": 0, "ooo_delay_total": 0.0, "ooo_delay_max": 0.0, "hol_time": 0.0}
+        self.reset_bin()
+
+    def reset_bin(self):
+        self.bytes = 0
+        self.reinjected_bytes = 0
+        self.delivered_bytes = 0
+        self.hol_time = 0.0
+
+    def get_hol_time(self, now):
+        """
+        Return the head-of-line blocking time since the last call, up to `now`
+        """
+        if self.hol_start is None:
+            return 0.0
+        hol_time, self.hol_start = now - self.hol_start, now
+        return hol_time
+
+    def receive(self, start, end, now, ooo_writer, connection, direction):
+        """
+        Reassemble the data segment [start, end) arrived at `now`
+        """
+        if end <= self.rcv_nxt:
+            return
+        if start > self.rcv_nxt:
+            if not self.ooo:
+                self.hol_start = now
+            heapq.heappush(self.ooo, (start, end, now))
+            self.ooo_bytes += end - start
+            return
+
+        delivered = self.rcv_nxt
+        self.rcv_nxt = end
+        while self.ooo and self.ooo[0][0] <= self.rcv_nxt:
+            ooo_start, ooo_end, arrival = heapq.heappop(self.ooo)
+            self.ooo_bytes -= ooo_end - ooo_start
+            self.rcv_nxt = max(self.rcv_nxt, ooo_end)
+            delay = now - arrival
+            self.totals["ooo_segments"] += 1
+            self.totals["ooo_delay_total"] += delay
+            self.totals["ooo_delay_max"] = max(self.totals["ooo_delay_max"], delay)
+            ooo_writer.append((now, connection, direction, delay))
+        if not self.ooo and self.hol_start is not None:
+            self.hol_time += self.get_hol_time(now)
+            self.hol_start = None
+        self.delivered_bytes += self.rcv_nxt - delivered
+
+
+class ConnectionState(object):
+    """
+    MPTCP connection, with the keys and tokens of its two sides (None until
+    seen), its subflows and its data directions (0 from the initiator)
+    """
+    def __init__(self, number, version):
+        self.number = number
+        self.version = version
+        self.keys = [None, None]
+        self.tokens = [None, None]
+        self.subflow_count = 0
+        # List of ((src, sport, dst, dport), SubflowState)
+        self.subflows = []
+        self.directions = [DataDirection(), DataDirection()]
+
+    def get_metadata(self):
+        directions = []
+        for direction in self.directions:
+            totals = dict(direction.totals)
+            totals["ooo_delay_mean"] = totals["ooo_delay_total"] / totals["ooo_segments"] \
+                if totals["ooo_segments"] else None
+            del totals["ooo_delay_total"]
+            directions.append(totals)
+        subflows = []
+        for key, subflow in self.subflows:
+            sent = directions[subflow.direction]["bytes"]
+            subflows.append(dict(subflow.totals, subflow=subflow.number, direction=subflow.direction,
+                src=format_address(key[0]), sport=key[1], dst=format_address(key[2]), dport=key[3],
+                share=subflow.totals["bytes"] / float(sent) if sent else None))
+        return {
+            "connection": self.number,
+            "version": self.version,
+            "tokens": self.tokens,
+            "directions": directions,
+            "subflows": subflows,
+        }
+
+
+class MptcpAnalyzer(object):
+    """
+    Compute connection-level metrics of the MPTCP connections of a capture, in
+    one pass and bounded memory (the state of a connection being bounded by its
+    windows). It runs on the same packet stream as FlowAnalyzer (see
+    flows.analyze_pcap).
+
+    Subflows are grouped by token: initial subflows are recognized by their
+    MP_CAPABLE options (whose keys give the tokens of the connection), joining
+    ones by the token of their MP_JOIN SYN. The data sequence numbers of the
+    segments are derived from the DSS mappings, and for each direction of each
+    connection:
+        - data bytes are new, or reinjected when already sent by another subflow
+          (subflow-level retransmissions not being reinjections);
+        - the share of each subflow is the part of the new data bytes it sent;
+        - a receiver located at the capture point reassembles the byte stream:
+          the out-of-order delay of a segment is the time it waits for the
+          segments preceding it, and the head-of-line blocking time is the time
+          during which out-of-order data waits.
+
+    Binned by `resolution` seconds, these are written as float64 .npy files (see
+    NpyWriter), times being offsets in seconds from the first packet:
+        CONNECTIONS_FILE    CONNECTION_COLUMNS, one row per active direction and bin
+        SUBFLOWS_FILE       SUBFLOW_COLUMNS, one row per active subflow direction and bin
+        OOO_FILE            OOO_COLUMNS, one row per out-of-order segment
+    METADATA_FILE gives the connections, their subflows and their totals.
+    Connections whose handshake is not captured are ignored.
+
+    Attributes:
+        resolution  width of the bins, in seconds
+        connections list of ConnectionState
+        start_time  time of the first packet, None before
+    """
+    NAME = "connections"
+    CONNECTIONS_FILE = "{}.mptcp.npy"
+    SUBFLOWS_FILE = "{}.subflows.npy"
+    OOO_FILE = "{}.ooo.npy"
+    METADATA_FILE = "{}.mptcp.json"
+    CONNECTION_COLUMNS = ("time", "connection", "direction", "bytes", "reinjected_bytes",
+        "delivered_bytes", "ooo_bytes", "hol_time")
+    SUBFLOW_COLUMNS = ("time", "connection", "direction", "subflow", "bytes", "reinjected_bytes")
+    OOO_COLUMNS = ("time", "connection", "direction", "delay")
+
+    def __init__(self, prefix, resolution):
+        if resolution <= 0:
+            raise ValueError("Invalid resolution {}".format(resolution))
+        self.prefix = prefix
+        self.resolution = resolution
+        self.connections = []
+        # (src, sport, dst, dport) -> (ConnectionState, SubflowState)
+        self.subflows = {}
+        self.tokens = {}
+        self.active_subflows = set()
+        self.active_directions = set()
+        self.start_time = None
+        self.bin = 0
+        self.packets = 0
+        self.connections_writer = NpyWriter(MptcpAnalyzer.CONNECTIONS_FILE.format(prefix),
+            MptcpAnalyzer.CONNECTION_COLUMNS)
+        self.subflows_writer = NpyWriter(MptcpAnalyzer.SUBFLOWS_FILE.format(prefix),
+            MptcpAnalyzer.SUBFLOW_COLUMNS)
+        self.ooo_writer = NpyWriter(MptcpAnalyzer.OOO_FILE.format(prefix), MptcpAnalyzer.OOO_COLUMNS)
+
+    def add(self, packet):
+        """
+        Account the Packet `packet`; packets must come in capture order
+        """
+        if self.start_time is None:
+            self.start_time = packet.time
+        now = packet.time - self.start_time
+        packet_bin = int(now / self.resolution)
+        if packet_bin > self.bin:
+            self.flush_bin()
+            self.bin = packet_bin
+        self.packets += 1
+
+        key = (packet.src, packet.sport, packet.dst, packet.dport)
+        if packet.flags & TCP_SYN:
+            self.add_handshake(key, packet)
+        elif packet.options and key in self.subflows:
+            self.add_keys(key, packet)
+        if packet.length > 0 and key in self.subflows:
+            self.add_data(key, packet, now)
+
+    def add_handshake(self, key, packet):
+        """
+        Create the subflow of a SYN carrying MP_CAPABLE or MP_JOIN, and the
+        reverse direction of the subflow on its SYN/ACK
+        """
+        reverse = (key[2], key[3], key[0], key[1])
+        if packet.flags & TCP_ACK:
+            if reverse in self.subflows and key not in self.subflows:
+                connection, subflow = self.subflows[reverse]
+                self.add_subflow(connection, key, subflow.number, 1 - subflow.direction, packet.seq)
+                self.add_keys(key, packet)
+            return
+
+        for subtype, option in get_mptcp_options(packet.options):
+            if subtype == MPTCP_CAPABLE and key not in self.subflows:
+                connection = ConnectionState(len(self.connections), option[2] & 0x0f)
+                self.connections.append(connection)
+                self.add_subflow(connection, key, None, 0, packet.seq)
+                self.add_keys(key, packet)
+            elif subtype == MPTCP_JOIN and len(option) >= 12 and key not in self.subflows:
+                token, = struct.unpack_from("!I", option, 4)
+                if token not in self.tokens:
+                    continue
+                connection, side = self.tokens[token]
+                # The token is the one of the receiver of the SYN
+                self.add_subflow(connection, key, None, 1 - side, packet.seq)
+
+    def add_subflow(self, connection, key, number, direction, isn):
+        """
+        Add a direction of a subflow to `connection`, in a new subflow if `number` is None
+        """
+        if number is None:
+            number = connection.subflow_count
+            connection.subflow_count += 1
+        subflow = SubflowState(number, direction, isn)
+        connection.subflows.append((key, subflow))
+        self.subflows[key] = (connection, subflow)
+
+    def add_keys(self, key, packet):
+        """
+        Record the keys of the MP_CAPABLE options of a packet of an initial subflow
+        """
+        connection, subflow = self.subflows[key]
+        if subflow.number != 0 or None not in connection.keys:
+            return
+        for subtype, option in get_mptcp_options(packet.options):
+            if subtype != MPTCP_CAPABLE:
+                continue
+            # Keys of the sender of the packet, then of its receiver
+            side = subflow.direction
+            if len(option) >= 12:
+                self.set_key(connection, side, option[4:12])
+            if len(option) >= 20:
+                self.set_key(connection, 1 - side, option[12:20])
+
+    def set_key(self, connection, side, key):
+        if connection.keys[side] is not None:
+            return
+        connection.keys[side] = key
+        token, idsn = get_key_token(key, connection.version)
+        connection.tokens[side] = token
+        self.tokens[token] = (connection, side)
+        # The first data byte follows the initial data sequence number
+        if connection.directions[side].base is None:
+            connection.directions[side].base = idsn + 1
+
+    def add_data(self, key, packet, now):
+        connection, subflow = self.subflows[key]
+        seq = unwrap(packet.seq, subflow.base + subflow.snd_nxt) - subflow.base
+        retransmission = seq < subflow.snd_nxt
+        subflow.snd_nxt = max(subflow.snd_nxt, seq + packet.length)
+
+        direction = connection.directions[subflow.direction]
+        for subtype, option in get_mptcp_options(packet.options):
+            if subtype == MPTCP_DSS:
+                mapping = parse_dss_mapping(option)
+                if mapping is not None:
+                    dsn, dsn_size, ssn, length = mapping
+                    if dsn_size == 4:
+                        reference = direction.base + direction.data_nxt if direction.base is not None else dsn
+                        dsn = unwrap(dsn, reference)
+                    if direction.base is None:
+                        direction.base = dsn
+                    subflow.mapping = (dsn - direction.base, ssn, length)
+        if subflow.mapping is None:
+            return
+        data_start, ssn, length = subflow.mapping
+        if not ssn <= seq < ssn + length:
+            return
+
+        start = data_start + seq - ssn
+        end = start + min(packet.length, ssn + length - seq)
+        if not retransmission:
+            new = direction.sent.add(start, end)
+            reinjected = end - start - new
+            subflow.bytes += new
+            direction.bytes += new
+            if reinjected:
+                subflow.reinjected_bytes += reinjected
+                direction.reinjected_bytes += reinjected
+                direction.totals["reinjections"] += 1
+            direction.data_nxt = max(direction.data_nxt, end)
+            self.active_subflows.add((connection.number, subflow.number, subflow.direction, subflow))
+        direction.receive(start, end, now, self.ooo_writer, connection.number, subflow.direction)
+        self.active_directions.add((connection.number, subflow.direction))
+
+    def flush_bin(self):
+        time = self.bin * self.resolution
+        end = time + self.resolution
+        for number, _, direction, subflow in sorted(self.active_subflows, key=lambda s: s[:3]):
+            self.subflows_writer.append((time, number, direction, subflow.number, subflow.bytes,
+                subflow.reinjected_bytes))
+            subflow.totals["bytes"] += subflow.bytes
+            subflow.totals["reinjected_bytes"] += subflow.reinjected_bytes
+            subflow.reset_bin()
+        self.active_subflows.clear()
+
+        directions, self.active_directions = sorted(self.active_directions), set()
+        for connection, number in directions:
+            direction = self.connections[connection].directions[number]
+            direction.hol_time += direction.get_hol_time(end)
+            self.connections_writer.append((time, connection, number, direction.bytes,
+                direction.reinjected_bytes, direction.delivered_bytes, direction.ooo_bytes,
+                direction.hol_time))
+            for name in ("bytes", "reinjected_bytes", "delivered_bytes", "hol_time"):
+                direction.totals[name] += getattr(direction, name)
+            direction.reset_bin()
+            # Directions waiting for missing data stay active
+            if direction.ooo:
+                self.active_directions.add((connection, number))
+
+    def close(self):
+        """
+        Write the last bin, the arrays and their metadata, and return the metadata
+        """
+        self.flush_bin()
+        self.connections_writer.close()
+        self.subflows_writer.close()
+        self.ooo_writer.close()
+        metadata = {
+            "start_time": self.start_time,
+            "resolution": self.resolution,
+            "packets": self.packets,
+            "files": {
+                MptcpAnalyzer.CONNECTIONS_FILE.format(self.prefix): MptcpAnalyzer.CONNECTION_COLUMNS,
+                MptcpAnalyzer.SUBFLOWS_FILE.format(self.prefix): MptcpAnalyzer.SUBFLOW_COLUMNS,
+                MptcpAnalyzer.OOO_FILE.format(self.prefix): MptcpAnalyzer.OOO_COLUMNS,
+            },
+            "connections": [c.get_metadata() for c in self.connections],
+        }
+        with open(MptcpAnalyzer.METADATA_FILE.format(self.prefix), "w") as f:
+            json.dump(metadata, f, indent=4)
+        return metadata
+
+
+if __name__ == '__main__':
+    import argparse
+    from .flows import FlowAnalyzer
+
+    parser = argparse.ArgumentParser(description="Compute MPTCP connection metrics from captures")
+    parser.add_argument("pcaps", nargs="+", help="pcap (or .summary.npy) files to analyze")
+    parser.add_argument("--resolution", "-r", type=float, default=FlowAnalyzer.DEFAULT_RESOLUTION * 1000,
+        help="width of the bins, in ms")
+    parser.add_argument("--jobs", "-j", type=int, help="number of captures analyzed in parallel")
+    parser.add_argument("--flows", action="store_true",
+        help="also compute the per-flow time series (see core.flows) in the same pass")
+
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)-15s %(message)s", level=logging.INFO)
+    analyzers = (MptcpAnalyzer, FlowAnalyzer) if args.flows else (MptcpAnalyzer,)
+    log_results(analyze_pcaps(args.pcaps, resolution=args.resolution / 1000.0, jobs=args.jobs,
+        analyzers=analyzers))
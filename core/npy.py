@@ -0,0 +1,131 @@
+from .files import map_file
+
+import ast
+import struct
+
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# Room for the header of any 2-dimensional array, so that the number of rows can
+# be written once all of them are known
+NPY_HEADER_SIZE = 128
+# numpy types of the struct format codes used by NpyRecordWriter
+NPY_TYPES = {"d": "<f8", "f": "<f4", "Q": "<u8", "I": "<u4", "H": "<u2", "B": "|u1", "s": "|S"}
+
+
+class NpyWriter(object):
+    """
+    Write a 2-dimensional array of float64 (one row at a time) in the .npy
+    format, readable with numpy.load, without requiring numpy.
+
+    Rows are written as they come, so that the array is never held in memory;
+    the header giving the number of rows is rewritten by `close()`.
+
+    Attributes:
+        path        path of the .npy file
+        columns     names of the columns
+        rows        number of rows written
+    """
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        self.row_format = struct.Struct("<{}d".format(len(self.columns)))
+        self.file = open(path, "wb")
+        self.file.write(self.get_header())
+
+    def get_header(self):
+        header = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({}, {}), }}".format(
+            self.rows, len(self.columns))
+        header = header.ljust(NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - 1) + "\n"
+        return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+    def append(self, row):
+        self.file.write(self.row_format.pack(*row))
+        self.rows += 1
+
+    def extend(self, rows):
+        """
+        Append the rows of the list `rows`, with a single write
+        """
+        self.file.write(b"".join([self.row_format.pack(*row) for row in rows]))
+        self.rows += len(rows)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self.get_header())
+        self.file.close()
+
+
+class NpyRecordWriter(NpyWriter):
+    """
+    Write a 1-dimensional array of fixed-width records (a numpy structured
+    array, readable with numpy.load(path, mmap_mode="r") or iter_npy_records) in
+    the .npy format, one record at a time.
+
+    `fields` is a list of (name, struct format code) pairs, the codes being
+    those of NPY_TYPES (with a size for strings, e.g., "16s").
+    """
+    def __init__(self, path, fields):
+        self.fields = list(fields)
+        descr = []
+        for name, code in self.fields:
+            npy_type = NPY_TYPES[code[-1]]
+            descr.append((name, npy_type + code[:-1] if code.endswith("s") else npy_type))
+        self.descr = descr
+        # Room for any number of rows in the header
+        self.header_size = (len(NPY_MAGIC) + 2 + len(self.get_header_text(1 << 63)) + 1 + 63) // 64 * 64
+        super(NpyRecordWriter, self).__init__(path, [name for name, _ in self.fields])
+        self.row_format = struct.Struct("<" + "".join(code for _, code in self.fields))
+
+    def get_header_text(self, rows):
+        return "{{'descr': {}, 'fortran_order': False, 'shape': ({},), }}".format(self.descr, rows)
+
+    def get_header(self):
+        header = self.get_header_text(self.rows)
+        header = header.ljust(self.header_size - len(NPY_MAGIC) - 2 - 1) + "\n"
+        return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def read_npy_header(data, path):
+    """
+    Return the header dictionary of the .npy file `data`, and the offset of its data
+    """
+    if data[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError("{} is not a version 1.0 .npy file".format(path))
+    header_length, = struct.unpack_from("<H", data, len(NPY_MAGIC))
+    start = len(NPY_MAGIC) + 2
+    return ast.literal_eval(bytes(data[start:start + header_length]).decode("latin1")), \
+        start + header_length
+
+
+def iter_npy_records(path):
+    """
+    Generate the records (as tuples) of a .npy file written by NpyRecordWriter,
+    memory-mapping it, without requiring numpy
+    """
+    data = map_file(path)
+    header, offset = read_npy_header(data, path)
+    codes = []
+    for _, npy_type in header["descr"]:
+        code = [c for c, t in NPY_TYPES.items() if npy_type.startswith(t)][0]
+        codes.append(npy_type[len(NPY_TYPES[code]):] + code if code == "s" else code)
+    record = struct.Struct("<" + "".join(codes))
+    end = offset + header["shape"][0] * record.size
+    return struct.iter_unpack(record.format, memoryview(data)[offset:end])
+
+
+def load_npy(path):
+    """
+    Return the rows (as tuples) of a 2-dimensional float64 .npy file written by
+    NpyWriter, without requiring numpy
+    """
+    with open(path, "rb") as f:
+        if f.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError("{} is not a version 1.0 .npy file".format(path))
+        header_length, = struct.unpack("<H", f.read(2))
+        header = ast.literal_eval(f.read(header_length).decode("latin1"))
+        if header["descr"] != "<f8" or header["fortran_order"] or len(header["shape"]) != 2:
+            raise ValueError("{} is not a 2-dimensional float64 array".format(path))
+        rows, columns = header["shape"]
+        data = f.read(rows * columns * 8)
+    return list(struct.iter_unpack("<{}d".format(columns), data))
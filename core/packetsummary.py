@@ -0,0 +1,311 @@
+from .npy import NpyRecordWriter, iter_npy_records
+from .pcap import IPPROTO_TCP, TCPOPT_MPTCP, Packet, decode_ip, get_mptcp_options
+from .sysctl import run_in_netns
+
+import ctypes
+import json
+import logging
+import mmap
+import multiprocessing
+import select
+import socket
+import struct
+
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+# struct tpacket_req3: block size and count, frame size and count, block timeout
+# (in ms), private size and features
+TPACKET_REQ3 = struct.Struct("@7I")
+# struct tpacket_stats_v3: packets received (drops included), dropped, and
+# times the queue was frozen
+TPACKET_STATS = struct.Struct("@III")
+# struct tpacket_block_desc: status, number of packets and offset of the first
+# packet of a block of the ring
+BLOCK_HEADER = struct.Struct("@8xIII")
+BLOCK_STATUS = struct.Struct("@I")
+BLOCK_STATUS_OFFSET = 8
+# struct tpacket3_hdr: offset of the next packet, time, captured length and
+# offset of the network header, followed (48 bytes from its start) by a struct
+# sockaddr_ll giving the protocol (in network order) and the type of the packet
+PACKET_HEADER = struct.Struct("@IIII10xH22xH6xB")
+# IPv4 header without options and TCP header up to the window, decoded at once
+# for the common case: version and header length, total length, fragment offset,
+# protocol, addresses, ports, sequence and acknowledgment numbers, data offset,
+# flags and window
+IPV4_TCP_HEADERS = struct.Struct("!BxH2xHxB2x4s4sHHIIBBH")
+IPV4_NO_OPTIONS = 0x45
+NETWORK_IPV4 = socket.htons(0x0800)
+SO_ATTACH_FILTER = getattr(socket, "SO_ATTACH_FILTER", 26)
+# Classic BPF instructions (see filter(7)): code, jump if true, jump if false, k
+BPF_INSTRUCTION = struct.Struct("@HBBI")
+BPF_LD_W_ABS, BPF_LD_H_ABS, BPF_LD_B_ABS, BPF_LD_H_IND = 0x20, 0x28, 0x30, 0x48
+BPF_LDX_IMM, BPF_LDX_MSH = 0x01, 0xb1
+BPF_JA, BPF_JEQ, BPF_JSET, BPF_RET = 0x05, 0x15, 0x45, 0x06
+SKF_AD_PROTOCOL = 0xfffff000
+# Bytes kept of each segment: the largest IPv4 and TCP headers
+SUMMARY_SNAPLEN = 120
+
+
+def build_filter(ports=()):
+    """
+    Return the classic BPF program (as a list of (code, jt, jf, k)) of a packet
+    socket of type SOCK_DGRAM keeping the TCP segments (over IPv4, or IPv6
+    without extension headers) from or to one of `ports` (any if empty),
+    truncated to SUMMARY_SNAPLEN
+    """
+    ports = sorted(ports)
+    # Instructions whose jumps go to "drop", "tcp" or "accept" are given as labels,
+    # resolved once the program is complete
+    program = [
+        (BPF_LD_W_ABS, 0, 0, SKF_AD_PROTOCOL),
+        (BPF_JEQ, "ipv4", 0, 0x0800),
+        (BPF_JEQ, 0, "drop", 0x86dd),
+        (BPF_LD_B_ABS, 0, 0, 6),
+        (BPF_JEQ, 0, "drop", 6),
+        (BPF_LDX_IMM, 0, 0, 40),
+        (BPF_JA, 0, 0, "tcp"),
+        ("ipv4", BPF_LD_B_ABS, 0, 0, 9),
+        (BPF_JEQ, 0, "drop", 6),
+        (BPF_LD_H_ABS, 0, 0, 6),
+        # Only the first fragment holds the TCP header
+        (BPF_JSET, "drop", 0, 0x1fff),
+        (BPF_LDX_MSH, 0, 0, 0),
+        ("tcp",),
+    ]
+    for offset in (0, 2) if ports else ():
+        program.append((BPF_LD_H_IND, 0, 0, offset))
+        program += [(BPF_JEQ, "accept", 0, p) for p in ports]
+    if ports:
+        program.append(("drop", BPF_RET, 0, 0, 0))
+    program.append(("accept", BPF_RET, 0, 0, SUMMARY_SNAPLEN))
+    program.append(("drop", BPF_RET, 0, 0, 0))
+
+    labels, instructions = {}, []
+    for instruction in program:
+        if isinstance(instruction[0], str):
+            if instruction[0] not in labels:
+                labels[instruction[0]] = len(instructions)
+            instruction = instruction[1:]
+        if instruction:
+            instructions.append(instruction)
+    resolved = []
+    for index, (code, jt, jf, k) in enumerate(instructions):
+        jt, jf = [labels[j] - index - 1 if isinstance(j, str) else j for j in (jt, jf)]
+        resolved.append((code, jt, jf, labels[k] - index - 1 if isinstance(k, str) else k))
+    return resolved
+
+
+def attach_filter(sock, program):
+    """
+    Attach the classic BPF `program` (see build_filter) to the socket `sock`
+    """
+    instructions = ctypes.create_string_buffer(b"".join(BPF_INSTRUCTION.pack(*i) for i in program))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER,
+        struct.pack("@HP", len(program), ctypes.addressof(instructions)))
+
+
+class PacketSummaryRecorder(object):
+    """
+    Record a summary of each TCP segment sent or received by a host, instead of
+    capturing full packets with tcpdump.
+
+    A packet socket is opened in the network namespace of the host (all its
+    interfaces, as with `tcpdump -i any`), filtering the segments in the kernel
+    (see build_filter). As with tcpdump, the kernel copies the first
+    SUMMARY_SNAPLEN bytes of each segment in a memory-mapped ring of blocks
+    (TPACKET_V3), which a forked process reads one block at a time, without a
+    system call per segment, writing one fixed-width record per TCP segment
+    (see FIELDS) in a .npy structured array (see NpyRecordWriter). Such files
+    are a fraction of the size of pcaps, and memory-mappable for analysis (see
+    PacketSummaryReader, or numpy.load(path, mmap_mode="r")).
+
+    `stop()` ends the recording, and writes the statistics of the capture (in
+    the format of the tcpdump ones) next to the records, in STATS_FILE.
+
+    Attributes:
+        topo        instance of Topo
+        who         host whose packets are recorded
+        path        path of the records
+        ports       set of the ports of the segments recorded (any if empty)
+        buffer_size size of the ring, in bytes (DEFAULT_BUFFER_SIZE if 0)
+    """
+    SUFFIX = ".summary.npy"
+    STATS_FILE = "{}.json"
+    # mptcp holds the MPTCP options of the segment, concatenated
+    FIELDS = (("time", "d"), ("family", "B"), ("pkttype", "B"), ("src", "16s"), ("dst", "16s"),
+        ("sport", "H"), ("dport", "H"), ("seq", "I"), ("ack", "I"), ("length", "I"),
+        ("flags", "B"), ("window", "H"), ("mptcp", "40s"))
+    DEFAULT_BUFFER_SIZE = 32 << 20
+    BLOCK_SIZE = 1 << 18
+    # Only used by the kernel to check the ring, segments are packed in the blocks
+    FRAME_SIZE = 1 << 11
+    # A block is handed to the recording process once full, or after BLOCK_TIMEOUT ms
+    BLOCK_TIMEOUT = 50
+    # Period at which the recording process checks whether it is stopped, in
+    # seconds; longer than BLOCK_TIMEOUT, so that the last block is read
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, topo, who, path, ports=(), buffer_size=0):
+        self.topo = topo
+        self.who = who
+        self.path = path
+        self.ports = set(ports)
+        self.blocks = max((buffer_size or PacketSummaryRecorder.DEFAULT_BUFFER_SIZE) //
+            PacketSummaryRecorder.BLOCK_SIZE, 2)
+        self.stopped = None
+        self.process = None
+
+    def open_socket(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_ALL))
+        attach_filter(sock, build_filter(self.ports))
+        sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        size = self.blocks * PacketSummaryRecorder.BLOCK_SIZE
+        sock.setsockopt(SOL_PACKET, PACKET_RX_RING, TPACKET_REQ3.pack(
+            PacketSummaryRecorder.BLOCK_SIZE, self.blocks, PacketSummaryRecorder.FRAME_SIZE,
+            size // PacketSummaryRecorder.FRAME_SIZE, PacketSummaryRecorder.BLOCK_TIMEOUT, 0, 0))
+        return sock
+
+    def start(self):
+        """
+        Start recording; raise OSError if the packet socket cannot be opened in
+        the namespace of the host
+        """
+        netns_path = self.topo.get_netns_path(self.who)
+        if netns_path is None:
+            raise OSError("Unknown network namespace for {}".format(self.who))
+
+        sock = run_in_netns(netns_path, self.open_socket)
+        self.stopped = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=self._record, args=(sock,),
+            name="summary-{}".format(self.who))
+        self.process.start()
+        sock.close()
+
+    def _record(self, sock):
+        writer = NpyRecordWriter(self.path, PacketSummaryRecorder.FIELDS)
+        ring = mmap.mmap(sock.fileno(), self.blocks * PacketSummaryRecorder.BLOCK_SIZE)
+        poller = select.poll()
+        poller.register(sock, select.POLLIN | select.POLLERR)
+        block, stopping = 0, False
+        while True:
+            offset = block * PacketSummaryRecorder.BLOCK_SIZE
+            status, count, first = BLOCK_HEADER.unpack_from(ring, offset)
+            if not status & TP_STATUS_USER:
+                # Once stopped, wait for the block being filled to be handed over
+                if stopping:
+                    break
+                stopping = self.stopped.is_set()
+                poller.poll(PacketSummaryRecorder.POLL_INTERVAL * 1000)
+                continue
+
+            writer.extend(self.read_block(ring, offset + first, count))
+            BLOCK_STATUS.pack_into(ring, offset + BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+            block = (block + 1) % self.blocks
+
+        # Counters since the socket was opened, as they are only read here
+        received, dropped, _ = TPACKET_STATS.unpack(
+            sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, TPACKET_STATS.size))
+        writer.close()
+        ring.close()
+        with open(PacketSummaryRecorder.STATS_FILE.format(self.path), "w") as f:
+            json.dump({"captured": writer.rows, "received_by_filter": received,
+                "dropped_by_kernel": dropped, "dropped_by_interface": None}, f, indent=4)
+
+    def read_block(self, ring, offset, count):
+        """
+        Return the records of the `count` segments of a block of the ring, the
+        first one being at `offset`
+        """
+        records = []
+        append = records.append
+        ports = self.ports
+        for _ in range(count):
+            next_offset, seconds, nanoseconds, captured, network, protocol, pkttype = \
+                PACKET_HEADER.unpack_from(ring, offset)
+            start = offset + network
+            offset += next_offset
+            if protocol == NETWORK_IPV4 and ring[start] == IPV4_NO_OPTIONS and \
+                    captured >= IPV4_TCP_HEADERS.size:
+                # Most segments, decoded without building a Packet
+                _, total_length, fragment, ip_protocol, src, dst, sport, dport, seq, ack, \
+                    data_offset, flags, window = IPV4_TCP_HEADERS.unpack_from(ring, start)
+                if ip_protocol != IPPROTO_TCP or fragment & 0x1fff:
+                    continue
+                data_offset = (data_offset >> 4) * 4
+                length = max(total_length - 20 - data_offset, 0)
+                options = ring[start + 40:start + min(20 + data_offset, captured)] \
+                    if data_offset > 20 else b""
+                family = 4
+            else:
+                packet = decode_ip(None, 0, ring[start:start + captured], 0, socket.ntohs(protocol))
+                if packet is None:
+                    continue
+                src, sport, dst, dport, seq, ack, flags, length, window, options = packet[2:]
+                family = 4 if len(src) == 4 else 6
+            # Packets queued before the filter was attached are not filtered
+            if ports and sport not in ports and dport not in ports:
+                continue
+            append((seconds + nanoseconds * 1e-9, family, pkttype, src, dst, sport, dport, seq, ack,
+                length, flags, window, b"".join(o for _, o in get_mptcp_options(options))
+                if TCPOPT_MPTCP in options else b""))
+        return records
+
+    def stop(self):
+        """
+        Stop recording, and return the statistics of the capture (None for those
+        missing)
+        """
+        if self.process is None:
+            return None
+
+        self.stopped.set()
+        self.process.join()
+        self.process = None
+        try:
+            with open(PacketSummaryRecorder.STATS_FILE.format(self.path)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logging.error("Cannot read the statistics of the packets of {}: {}".format(self.who, e))
+            return {"captured": None, "received_by_filter": None, "dropped_by_kernel": None,
+                "dropped_by_interface": None}
+
+
+class PacketSummaryReader(object):
+    """
+    Streaming reader of the TCP segments recorded by PacketSummaryRecorder,
+    interchangeable with PcapReader for the analyzers (e.g., FlowAnalyzer). The
+    offset of each Packet is the index of its record, and its options are only
+    its MPTCP options.
+
+    Attributes:
+        path        path of the records
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = iter_npy_records(path)
+
+    def packets(self):
+        """
+        Generate the recorded TCP segments, as Packet
+        """
+        for index, (t, family, _, src, dst, sport, dport, seq, ack, length, flags, window,
+                mptcp) in enumerate(self.records):
+            if family == 4:
+                src, dst = src[:4], dst[:4]
+            yield Packet(index, t, src, sport, dst, dport, seq, ack, flags, length, window, mptcp)
+
+    def close(self):
+        self.records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
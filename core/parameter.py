@@ -52,5 +52,22 @@ class Parameter(object):
         else:
             return val
 
+    def as_dict(self):
+        """
+        Return all the parameter values, including the default ones
+        """
+        d = dict(self.default_parameters)
+        d.update(self.parameters)
+        return d
+
+    def content_key(self):
+        """
+        Return a hashable representation of the parameters read from the file.
+        Two parameter files with the same content give the same key, whatever
+        the order of their lines.
+        """
+        return tuple(sorted(
+            (k, tuple(v) if isinstance(v, list) else v) for k, v in self.parameters.items()))
+
     def __str__(self):
         return self.parameters.__str__()
@@ -0,0 +1,219 @@
+from .files import map_file
+
+import collections
+import mmap
+import struct
+
+
+PCAP_HEADER = struct.Struct("IHHiIII")
+RECORD_HEADER_SIZE = 16
+# Magic numbers of microsecond and nanosecond pcap files
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = 0x8100
+IPPROTO_TCP = 6
+# IPv6 extension headers skipped to find the TCP header
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+TCPOPT_MPTCP = 30
+
+UINT16 = struct.Struct("!H")
+IPV4_HEADER = struct.Struct("!H2xH")
+TCP_HEADER = struct.Struct("!HHIIBBH")
+
+# Bytes of each record decoded, enough for the link, IP and TCP headers
+HEADERS_SIZE = 256
+
+Packet = collections.namedtuple("Packet", ("offset", "time", "src", "sport", "dst", "dport",
+    "seq", "ack", "flags", "length", "window", "options"))
+Packet.__doc__ = """
+TCP segment of a capture: offset of its record in the file, capture time (in
+seconds since the epoch), packed source and destination addresses (4 or 16
+bytes) and ports, sequence and acknowledgment numbers, flags, payload length
+(from the IP header, whatever the snaplen), window and raw TCP options (possibly
+truncated by the snaplen)
+"""
+
+
+def get_mptcp_options(options):
+    """
+    Generate (subtype, option) for the MPTCP options in the raw TCP `options`
+    """
+    offset = 0
+    while offset < len(options):
+        kind = options[offset]
+        if kind == 0:
+            return
+        if kind == 1:
+            offset += 1
+            continue
+        if offset + 1 >= len(options) or options[offset + 1] < 2:
+            return
+        length = options[offset + 1]
+        if kind == TCPOPT_MPTCP and length >= 3:
+            yield options[offset + 2] >> 4, options[offset:offset + length]
+        offset += length
+
+
+def decode_ip(offset, time, headers, ip, ethertype):
+    """
+    Return the Packet of the IP packet starting at `ip` in `headers`, of the
+    protocol `ethertype`, or None if it is not a TCP segment
+    """
+    if ethertype == ETHERTYPE_IPV4:
+        if len(headers) < ip + 20:
+            return None
+        ihl = (headers[ip] & 0x0f) * 4
+        total_length, fragment = IPV4_HEADER.unpack_from(headers, ip + 2)
+        # Only the first fragment holds the TCP header
+        if headers[ip + 9] != IPPROTO_TCP or fragment & 0x1fff:
+            return None
+        src, dst = headers[ip + 12:ip + 16], headers[ip + 16:ip + 20]
+        tcp, ip_payload = ip + ihl, total_length - ihl
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(headers) < ip + 40:
+            return None
+        ip_payload, = UINT16.unpack_from(headers, ip + 4)
+        next_header, tcp = headers[ip + 6], ip + 40
+        while next_header in IPV6_EXTENSION_HEADERS and len(headers) >= tcp + 2:
+            extension_length = (headers[tcp + 1] + 1) * 8
+            next_header, tcp, ip_payload = headers[tcp], tcp + extension_length, \
+                ip_payload - extension_length
+        if next_header != IPPROTO_TCP:
+            return None
+        src, dst = headers[ip + 8:ip + 24], headers[ip + 24:ip + 40]
+    else:
+        return None
+
+    if len(headers) < tcp + 20:
+        return None
+    sport, dport, seq, ack, data_offset, flags, window = TCP_HEADER.unpack_from(headers, tcp)
+    data_offset = (data_offset >> 4) * 4
+    return Packet(offset, time, src, sport, dst, dport, seq, ack, flags,
+        max(ip_payload - data_offset, 0), window, headers[tcp + 20:tcp + data_offset])
+
+
+class PcapReader(object):
+    """
+    Streaming reader of the TCP segments of a pcap file (as written by tcpdump,
+    with Ethernet, raw IP or Linux cooked headers, e.g., for `-i any`).
+
+    The file is memory-mapped and read sequentially, and only the headers of
+    each record are decoded, so that captures of any size are read in bounded
+    memory. A record truncated by the end of the file (e.g., tcpdump being
+    killed) ends the capture.
+
+    Attributes:
+        path        path of the pcap file
+        linktype    link type of the capture
+        snaplen     snapshot length of the capture
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = map_file(path)
+        if len(self.data) < PCAP_HEADER.size:
+            raise ValueError("{} is not a pcap file".format(path))
+
+        for endian in ("<", ">"):
+            magic, _, _, _, _, self.snaplen, self.linktype = struct.unpack_from(
+                endian + PCAP_HEADER.format, self.data)
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                break
+        else:
+            raise ValueError("{} is not a pcap file (pcapng is not supported)".format(path))
+
+        self.record_header = struct.Struct(endian + "IIII")
+        self.resolution = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        self.link_header_size, self.ethertype_offset = self.get_link_header()
+        if hasattr(self.data, "madvise"):
+            self.data.madvise(mmap.MADV_SEQUENTIAL)
+
+    def get_link_header(self):
+        """
+        Return the size of the link header and the offset of the protocol field in
+        it (None when there is no link header)
+        """
+        if self.linktype == LINKTYPE_ETHERNET:
+            return 14, 12
+        if self.linktype == LINKTYPE_LINUX_SLL:
+            return 16, 14
+        if self.linktype == LINKTYPE_LINUX_SLL2:
+            return 20, 0
+        if self.linktype == LINKTYPE_RAW:
+            return 0, None
+        raise ValueError("Unsupported link type {} in {}".format(self.linktype, self.path))
+
+    def records(self, start=PCAP_HEADER.size, end=None):
+        """
+        Generate (offset, time, headers) for the records between the offsets
+        `start` and `end`, `headers` being the first HEADERS_SIZE bytes of the record
+        """
+        data, record_header, resolution = self.data, self.record_header, self.resolution
+        end = len(data) if end is None else min(end, len(data))
+        offset = start
+        while offset + RECORD_HEADER_SIZE <= end:
+            seconds, fraction, captured, _ = record_header.unpack_from(data, offset)
+            body = offset + RECORD_HEADER_SIZE
+            if body + captured > len(data):
+                return
+            yield offset, seconds + fraction * resolution, data[body:body + min(captured, HEADERS_SIZE)]
+            offset = body + captured
+
+    def packets(self, start=PCAP_HEADER.size, end=None):
+        """
+        Generate the TCP segments (as Packet) of the records between the offsets
+        `start` and `end`, other records being skipped
+        """
+        for offset, time, headers in self.records(start, end):
+            packet = self.decode(offset, time, headers)
+            if packet is not None:
+                yield packet
+
+    def packet_at(self, offset):
+        """
+        Return the Packet of the record at `offset`, or None if it is not a TCP
+        segment
+        """
+        for offset, time, headers in self.records(offset, offset + RECORD_HEADER_SIZE):
+            return self.decode(offset, time, headers)
+        return None
+
+    def decode(self, offset, time, headers):
+        """
+        Return the Packet of a record, or None if it is not a TCP segment
+        """
+        ip = self.link_header_size
+        if self.ethertype_offset is None:
+            if len(headers) < 1:
+                return None
+            ethertype = ETHERTYPE_IPV4 if headers[0] >> 4 == 4 else ETHERTYPE_IPV6
+        else:
+            if len(headers) < ip:
+                return None
+            ethertype, = UINT16.unpack_from(headers, self.ethertype_offset)
+            if ethertype == ETHERTYPE_VLAN and self.linktype == LINKTYPE_ETHERNET:
+                ip += 4
+                ethertype, = UINT16.unpack_from(headers, ip - 2)
+
+        return decode_ip(offset, time, headers, ip, ethertype)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,269 @@
+from .files import map_file
+from .flows import format_address
+from .pcap import PcapReader, PCAP_HEADER
+
+import array
+import bisect
+import json
+import logging
+import os
+import struct
+import sys
+import time
+
+
+class PcapIndex(object):
+    """
+    Sidecar index of a pcap file (at the path of the capture followed by SUFFIX),
+    giving random access to the packets of a capture by time and by TCP
+    connection (e.g., an MPTCP subflow, both directions included).
+
+    The index holds, for each connection, the offsets of the records of its
+    packets in the capture, and for each time bucket of `bucket` seconds, the
+    offset of the first record of the bucket (or of a later one). It is built
+    in one pass over the capture by `build()`, and is stale once the capture
+    changes (see `is_stale()`).
+
+    The file starts with MAGIC, the length of a JSON header (describing the
+    capture, the connections and where their arrays are) and this header; then
+    come the arrays of offsets, as native 64-bit unsigned integers, memory-mapped
+    when the index is loaded.
+
+    Attributes:
+        pcap_path   path of the capture
+        header      dictionary of the JSON header
+        flows       list of the connections, as dictionaries
+    """
+    SUFFIX = ".idx"
+    MAGIC = b"MTPIDX01"
+    DEFAULT_BUCKET = 1.0
+    # Tolerated disorder of the timestamps of a capture (e.g., of `-i any`), in buckets
+    BUCKET_MARGIN = 1
+
+    def __init__(self, pcap_path):
+        self.pcap_path = pcap_path
+        self.data = map_file(PcapIndex.get_path(pcap_path))
+        if self.data[:len(PcapIndex.MAGIC)] != PcapIndex.MAGIC:
+            raise ValueError("{} is not a pcap index".format(PcapIndex.get_path(pcap_path)))
+        header_length, = struct.unpack_from("<I", self.data, len(PcapIndex.MAGIC))
+        start = len(PcapIndex.MAGIC) + 4
+        self.header = json.loads(self.data[start:start + header_length].decode())
+        self.arrays_offset = start + header_length
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError("{} was built on a {} endian machine".format(
+                PcapIndex.get_path(pcap_path), self.header["byteorder"]))
+        self.flows = self.header["flows"]
+        # Views of the arrays handed out, by offset, released on close
+        self.arrays = {}
+        self.buckets = self.get_array(self.header["buckets"])
+        self.reader = None
+
+    @staticmethod
+    def get_path(pcap_path):
+        return pcap_path + PcapIndex.SUFFIX
+
+    def get_array(self, description):
+        if description["offset"] not in self.arrays:
+            start = self.arrays_offset + description["offset"]
+            self.arrays[description["offset"]] = \
+                memoryview(self.data)[start:start + description["count"] * 8].cast("Q")
+        return self.arrays[description["offset"]]
+
+    def is_stale(self):
+        try:
+            st = os.stat(self.pcap_path)
+        except OSError:
+            return True
+        return st.st_size != self.header["pcap_size"] or st.st_mtime != self.header["pcap_mtime"]
+
+    def find_flows(self, host=None, port=None):
+        """
+        Return the connections having `host` (an address) and `port` as one of their
+        endpoints, None matching any
+        """
+        return [f for f in self.flows if
+            any((host is None or f[a] == host) and (port is None or f[p] == port)
+                for a, p in (("src", "sport"), ("dst", "dport")))]
+
+    def get_offset(self, t):
+        """
+        Return the offset from which the records captured from `t` (in seconds from
+        the first record) are found
+        """
+        bucket = int(t // self.header["bucket"]) - PcapIndex.BUCKET_MARGIN
+        if bucket < 0 or len(self.buckets) == 0:
+            return PCAP_HEADER.size
+        if bucket >= len(self.buckets):
+            return self.header["pcap_size"]
+        return self.buckets[bucket]
+
+    def packets(self, flow=None, start=None, end=None):
+        """
+        Generate the TCP segments (as Packet) captured between `start` and `end` (in
+        seconds from the first record, None for no limit), of the connection
+        number `flow` if not None, seeking directly to them
+        """
+        if self.reader is None:
+            self.reader = PcapReader(self.pcap_path)
+        start_offset = self.get_offset(start) if start is not None else PCAP_HEADER.size
+        end_offset = self.get_offset(end + (PcapIndex.BUCKET_MARGIN + 1) * self.header["bucket"]) \
+            if end is not None else None
+        start_time = self.header["start_time"]
+        if flow is None:
+            packets = self.reader.packets(start_offset, end_offset)
+        else:
+            offsets = self.get_array(self.flows[flow]["offsets"])
+            first = bisect.bisect_left(offsets, start_offset)
+            last = bisect.bisect_left(offsets, end_offset) if end_offset is not None else len(offsets)
+            packets = (self.reader.packet_at(offsets[i]) for i in range(first, last))
+        for packet in packets:
+            t = packet.time - start_time
+            if (start is None or t >= start) and (end is None or t < end):
+                yield packet
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+        for view in self.arrays.values():
+            view.release()
+        self.arrays = {}
+        if not isinstance(self.data, bytes):
+            self.data.close()
+
+    @staticmethod
+    def build(pcap_path, bucket=DEFAULT_BUCKET):
+        """
+        Build the index of the capture `pcap_path`, and return the number of
+        packets indexed. The index is written atomically.
+        """
+        st = os.stat(pcap_path)
+        flows, flow_offsets, buckets = {}, [], array.array("Q")
+        start_time, packets = None, 0
+        with PcapReader(pcap_path) as reader:
+            for offset, t, headers in reader.records():
+                if start_time is None:
+                    start_time = t
+                while len(buckets) <= int((t - start_time) // bucket):
+                    buckets.append(offset)
+                packet = reader.decode(offset, t, headers)
+                if packet is None:
+                    continue
+                packets += 1
+                key = (packet.src, packet.sport, packet.dst, packet.dport)
+                if key not in flows:
+                    reverse = (packet.dst, packet.dport, packet.src, packet.sport)
+                    if reverse in flows:
+                        flows[key] = flows[reverse]
+                    else:
+                        flows[key] = len(flow_offsets)
+                        flow_offsets.append((key, [t, t], array.array("Q")))
+                _, times, offsets = flow_offsets[flows[key]]
+                times[1] = t
+                offsets.append(offset)
+
+        header = {
+            "pcap_size": st.st_size,
+            "pcap_mtime": st.st_mtime,
+            "byteorder": sys.byteorder,
+            "bucket": bucket,
+            "start_time": start_time,
+            "packets": packets,
+            "flows": [],
+            "buckets": {"count": len(buckets)},
+        }
+        arrays = [(header["buckets"], buckets)]
+        for number, (key, times, offsets) in enumerate(flow_offsets):
+            flow = {"flow": number, "src": format_address(key[0]), "sport": key[1],
+                "dst": format_address(key[2]), "dport": key[3], "packets": len(offsets),
+                "first_time": times[0] - start_time, "last_time": times[1] - start_time,
+                "offsets": {"count": len(offsets)}}
+            header["flows"].append(flow)
+            arrays.append((flow["offsets"], offsets))
+
+        # Offsets of the arrays are relative to the end of the header, aligned on 8 bytes
+        offset = 0
+        for description, values in arrays:
+            description["offset"] = offset
+            offset += len(values) * 8
+        encoded_header = json.dumps(header).encode()
+        encoded_header += b" " * (-(len(PcapIndex.MAGIC) + 4 + len(encoded_header)) % 8)
+
+        path = PcapIndex.get_path(pcap_path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(PcapIndex.MAGIC + struct.pack("<I", len(encoded_header)) + encoded_header)
+            for _, values in arrays:
+                values.tofile(f)
+        os.rename(path + ".tmp", path)
+        return packets
+
+
+def get_index(pcap_path, bucket=PcapIndex.DEFAULT_BUCKET):
+    """
+    Return the PcapIndex of `pcap_path`, building it if missing or stale
+    """
+    try:
+        index = PcapIndex(pcap_path)
+        if not index.is_stale():
+            return index
+        index.close()
+    except (IOError, OSError, ValueError):
+        pass
+    PcapIndex.build(pcap_path, bucket=bucket)
+    return PcapIndex(pcap_path)
+
+
+def wait_for_capture(pcap_path, timeout=10.0, interval=0.2):
+    """
+    Wait until the size of the capture `pcap_path` stops changing (i.e., until
+    tcpdump flushed it), for at most `timeout` seconds
+    """
+    size, deadline = None, time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        current = os.path.getsize(pcap_path)
+        if current == size:
+            return
+        size = current
+        time.sleep(interval)
+
+
+def build_indexes(pcap_paths, bucket=PcapIndex.DEFAULT_BUCKET):
+    """
+    Build the indexes of the captures `pcap_paths` once they are complete, at a
+    low priority so as not to disturb the runs going on meanwhile
+    """
+    os.nice(10)
+    for pcap_path in pcap_paths:
+        try:
+            wait_for_capture(pcap_path)
+            start = time.monotonic()
+            packets = PcapIndex.build(pcap_path, bucket=bucket)
+            logging.info("Indexed {} packets of {} in {:.1f} s".format(packets, pcap_path,
+                time.monotonic() - start))
+        except (IOError, OSError, ValueError) as e:
+            logging.error("Unable to index {}: {}".format(pcap_path, e))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index captures and query their packets")
+    parser.add_argument("pcap", help="pcap file, indexed if needed")
+    parser.add_argument("--bucket", "-b", type=float, default=PcapIndex.DEFAULT_BUCKET,
+        help="width of the time buckets of a new index, in seconds")
+    parser.add_argument("--flow", "-f", type=int, help="only show the packets of this connection")
+    parser.add_argument("--start", "-s", type=float, help="show the packets from this time, in seconds")
+    parser.add_argument("--end", "-e", type=float, help="show the packets until this time, in seconds")
+
+    args = parser.parse_args()
+    index = get_index(args.pcap, bucket=args.bucket)
+    if args.flow is None and args.start is None and args.end is None:
+        print("\t".join(["flow", "src", "sport", "dst", "dport", "packets", "first_time", "last_time"]))
+        for f in index.flows:
+            print("\t".join(["{}".format(f[k]) for k in ("flow", "src", "sport", "dst", "dport",
+                "packets", "first_time", "last_time")]))
+    else:
+        for p in index.packets(flow=args.flow, start=args.start, end=args.end):
+            print("{:.6f}\t{}:{} > {}:{}\tseq {} ack {} len {} flags 0x{:02x}".format(
+                p.time - index.header["start_time"], format_address(p.src), p.sport,
+                format_address(p.dst), p.dport, p.seq, p.ack, p.length, p.flags))
+    index.close()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+
+
+class ConfigPlan(object):
+    """
+    Configuration of a topology compiled in per-node `ip -batch` and `tc -batch`
+    files, stored in `directory`.
+
+    The plan is recorded by queuing commands in PlanBatch instances instead of
+    running them. Commands are split on `;`; consecutive `ip` (resp. `tc`)
+    commands of a node are gathered in a batch file applied with a single
+    `ip -batch` (resp. `tc -batch`) invocation, and other commands (e.g.,
+    ethtool) are kept as is. When applied, all the steps of a node run in a
+    single shell invocation, the nodes being configured concurrently.
+
+    Once written, the plan only depends on the topology parameters (node
+    interfaces have deterministic MAC addresses, see Topo.add_link), so that it
+    can be replayed on the next boots of the same topology. VERSION must be
+    bumped whenever the commands generated for a topology change; in any case, a
+    plan whose recorded steps differ from the ones compiled for the current boot
+    is not replayed (see `load()`).
+
+    Attributes:
+        directory   directory holding the batch files of the plan
+        steps       dictionary node name -> list of (tool, line), with tool being
+                    "ip", "tc", or None for other commands
+    """
+    VERSION = 4
+    PLAN_FILENAME = "plan.json"
+    BATCH_TOOLS = ("ip", "tc")
+    # Commands with these characters are kept as a whole
+    SHELL_CHARACTERS = "\"'|&<>`$()"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.steps = {}
+
+    def add(self, who, cmd):
+        steps = self.steps.setdefault("{}".format(who), [])
+        if any(c in cmd for c in ConfigPlan.SHELL_CHARACTERS):
+            steps.append((None, cmd.strip()))
+            return
+
+        for part in cmd.split(";"):
+            words = part.split(None, 1)
+            if len(words) == 0:
+                continue
+            if words[0] in ConfigPlan.BATCH_TOOLS and len(words) == 2 \
+                    and not words[1].startswith("-"):
+                steps.append((words[0], words[1].strip()))
+            else:
+                steps.append((None, part.strip()))
+
+    def get_steps_hash(self):
+        return hashlib.sha256(json.dumps(self.steps, sort_keys=True).encode()).hexdigest()
+
+    def get_batch_filename(self, node_name, index, tool):
+        return os.path.join(self.directory, "{}.{}.{}".format(node_name, index, tool))
+
+    def compile(self):
+        """
+        Return a dictionary node name -> list of the commands applying the plan
+        on the node, and a dictionary batch filename -> lines of the batch file
+        """
+        commands = {}
+        batch_files = {}
+        for node_name, steps in self.steps.items():
+            node_commands = commands.setdefault(node_name, [])
+            previous_tool = None
+            for tool, line in steps:
+                if tool is None:
+                    node_commands.append(line)
+                elif tool == previous_tool:
+                    batch_files[filename].append(line)
+                else:
+                    filename = self.get_batch_filename(node_name, len(node_commands), tool)
+                    batch_files[filename] = [line]
+                    node_commands.append("{} -force -batch {}".format(tool, filename))
+                previous_tool = tool
+
+        return commands, batch_files
+
+    def write(self):
+        """
+        Write the batch files of the plan, and return the commands applying it
+        """
+        commands, batch_files = self.compile()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        for filename, lines in batch_files.items():
+            with open(filename, "w") as f:
+                f.write("\n".join(lines) + "\n")
+
+        # The plan file is written last, as it marks a complete plan
+        plan_filename = os.path.join(self.directory, ConfigPlan.PLAN_FILENAME)
+        with open(plan_filename + ".tmp", "w") as f:
+            json.dump({"version": ConfigPlan.VERSION, "steps": self.get_steps_hash(),
+                "commands": commands}, f, indent=4)
+        os.rename(plan_filename + ".tmp", plan_filename)
+        return commands
+
+    def load(self):
+        """
+        Return the commands of the plan previously written in `directory`, or None
+        if there is no such plan, or if it was written from other steps than the
+        ones recorded (e.g., by another version of the code)
+        """
+        try:
+            with open(os.path.join(self.directory, ConfigPlan.PLAN_FILENAME)) as f:
+                plan = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if plan.get("version") != ConfigPlan.VERSION or plan.get("steps") != self.get_steps_hash():
+            logging.warning("Stale configuration plan in {}, rewriting it".format(self.directory))
+            return None
+
+        return plan["commands"]
+
+
+class PlanBatch(object):
+    """
+    Drop-in replacement of CommandBatch recording its commands in a ConfigPlan
+    instead of running them
+    """
+    def __init__(self, plan):
+        self.plan = plan
+
+    def add(self, who, cmd):
+        self.plan.add(who, cmd)
+
+    def flush(self):
+        return {}
+
+
+def apply_plan_commands(topo, commands):
+    """
+    Run the plan `commands` (as returned by ConfigPlan.write or ConfigPlan.load)
+    with a single shell invocation per node
+    """
+    batch = topo.command_batch()
+    for node_name, node_commands in commands.items():
+        node = topo.get_host(node_name)
+        for cmd in node_commands:
+            batch.add(node, cmd)
+
+    for who, results in batch.flush().items():
+        for result in results:
+            if result.exit_code != 0:
+                logging.error("{} failed on {}: {}".format(result.cmd, who,
+                    result.output.strip()))
@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+
+class LinkEventScheduler(object):
+    """
+    Run commands changing the links (e.g., netem changes) at given times, from
+    a thread of the orchestrator.
+
+    Times are offsets in seconds from the start of the scheduler, measured with
+    a monotonic clock. All the events due at the same time (or already late when
+    the scheduler wakes up) are fired together, with one CommandBatch dispatching
+    them concurrently to their hosts. The planned and actual firing times of each
+    event, as well as the wall clock time at which it was fired (e.g., to match
+    packet captures), are recorded and written by `write()`.
+
+    Long series of events (e.g., trace replays) are added as sources, pulled one
+    event at a time (see add_source).
+
+    A failing event (a command exiting with an error, or raising while being
+    run) is logged and recorded, and the next events are still fired. A source
+    raising while being pulled is dropped.
+
+    Attributes:
+        topo        instance of Topo used to run the commands
+        events      heap of the pending events, as (time, sequence number, host,
+                    command, label, source), source being None for events added
+                    by `add()`
+        records     list of the fired events not coming from sources, in firing order
+        sources     dictionary source name -> summary of its fired events
+        start_time  wall clock time when the scheduler started, None before
+    """
+    FILENAME = "link_events.json"
+
+    def __init__(self, topo):
+        self.topo = topo
+        self.events = []
+        self.sequence = itertools.count()
+        self.records = []
+        self.sources = {}
+        self.max_lateness = None
+        self.start_time = None
+        self.anchor = None
+        self.thread = None
+        self.cancelled = threading.Event()
+
+    def add(self, at, who, cmd, label=None):
+        """
+        Run `cmd` on `who` `at` seconds after the start of the scheduler. `label`
+        describes the event in the records.
+        """
+        heapq.heappush(self.events, (float(at), next(self.sequence), who, cmd, label, None))
+
+    def add_source(self, name, events):
+        """
+        Add the events of the iterable `events`, as (time, host, command) in time
+        order. They are pulled one at a time, when the previous one is fired, so
+        that long sources are never held in memory. Instead of being recorded one
+        by one, they are summarized under `name`.
+        """
+        self.sources[name] = {"fired": 0, "failed": 0, "max_lateness": None}
+        self.pull(name, iter(events))
+
+    def pull(self, name, source):
+        try:
+            event = next(source, None)
+        except Exception as e:
+            logging.error("Dropped the remaining link events of {}: {}".format(name, e))
+            return
+        if event is not None:
+            at, who, cmd = event
+            heapq.heappush(self.events, (float(at), next(self.sequence), who, cmd, name,
+                (name, source)))
+
+    def __len__(self):
+        return len(self.events)
+
+    def start(self):
+        if len(self.events) == 0:
+            return
+
+        logging.info("Start scheduling {} link events".format(len(self.events)))
+        self.start_time = time.time()
+        self.anchor = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="link-events")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def now(self):
+        return time.monotonic() - self.anchor
+
+    def _run(self):
+        while len(self.events) > 0:
+            delay = self.events[0][0] - self.now()
+            if self.cancelled.wait(max(delay, 0)):
+                return
+
+            now = self.now()
+            due = []
+            while len(self.events) > 0 and self.events[0][0] <= now:
+                event = heapq.heappop(self.events)
+                due.append(event)
+                if event[5] is not None:
+                    self.pull(*event[5])
+            try:
+                self.fire(due)
+            except Exception as e:
+                logging.error("Failed to fire {} link events: {}".format(len(due), e))
+
+    def fire(self, due):
+        batch = self.topo.command_batch()
+        for _, _, who, cmd, _, _ in due:
+            batch.add(who, cmd)
+
+        fired = self.now()
+        fired_time = time.time()
+        errors = {}
+        results = {who: iter(host_results) for who, host_results in batch.flush(errors=errors).items()}
+        completed = self.now()
+        for at, _, who, cmd, label, source in due:
+            result = next(results[who], None)
+            error = errors.get(who)
+            failed = error is not None or (result is not None and result.exit_code != 0)
+            if error is not None:
+                logging.error("Link event at {} failed on {}: {}: {}".format(at, who, cmd, error))
+            elif failed:
+                logging.error("Link event at {} failed on {}: {}".format(at, who, cmd))
+            self.max_lateness = max(fired - at, self.max_lateness or 0.0)
+            if source is not None:
+                summary = self.sources[source[0]]
+                summary["fired"] += 1
+                summary["failed"] += int(failed)
+                summary["max_lateness"] = max(fired - at, summary["max_lateness"] or 0.0)
+                continue
+
+            self.records.append({
+                "at": at,
+                "fired": fired,
+                "completed": completed,
+                "lateness": fired - at,
+                "time": fired_time,
+                "label": label,
+                "host": "{}".format(who),
+                "cmd": cmd,
+                "exit_code": result.exit_code if result is not None else None,
+                "error": "{}".format(error) if error is not None else None,
+            })
+
+    def cancel(self):
+        """
+        Stop the scheduler, dropping the events not fired yet. Events being fired
+        are waited for.
+        """
+        self.cancelled.set()
+        if self.thread is not None:
+            self.thread.join()
+        if len(self.events) > 0:
+            logging.info("Cancelled {} link events".format(len(self.events)))
+
+    def write(self, path=FILENAME):
+        """
+        Write the records of the fired events. Events of sources not pulled yet
+        are not counted as cancelled.
+        """
+        with open(path, "w") as f:
+            json.dump({
+                "start_time": self.start_time,
+                "fired": len(self.records) + sum(s["fired"] for s in self.sources.values()),
+                "cancelled": len(self.events),
+                "max_lateness": self.max_lateness,
+                "events": self.records,
+                "sources": self.sources,
+            }, f, indent=4)
@@ -0,0 +1,234 @@
+from .npy import NpyWriter
+from .sysctl import run_in_netns
+from .telemetry import NetlinkSocket, PeriodicSampler, parse_attributes
+
+import json
+import logging
+import socket
+import struct
+
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+# struct inet_diag_req_v2 and struct inet_diag_msg, with their struct inet_diag_sockid
+INET_DIAG_REQ = struct.Struct("=BBBxI48x")
+INET_DIAG_MSG = struct.Struct("=BBBB2s2s16s16sI8sIIIII")
+INET_DIAG_INFO = 2
+INET_DIAG_ULP_INFO = 19
+INET_DIAG_ULP_INFO_MPTCP = 3
+MPTCP_SUBFLOW_ATTR_TOKEN_REM = 1
+MPTCP_SUBFLOW_ATTR_TOKEN_LOC = 2
+TCP_LISTEN = 10
+# MPTCP connections of the out-of-tree kernel, read through /proc/thread-self
+# (see counters.PROC_NET_DIR)
+MPTCP_CONNECTIONS_FILE = "/proc/thread-self/net/mptcp_net/mptcp"
+# All states but LISTEN
+TCP_STATES = 0xffffffff & ~(1 << TCP_LISTEN)
+
+# struct tcp_info, up to snd_wnd (Linux 5.4); older kernels send less of it,
+# the missing fields being 0
+TCP_INFO_FIELDS = (
+    ("state", "B"), ("ca_state", "B"), ("retransmits", "B"), ("probes", "B"),
+    ("backoff", "B"), ("options", "B"), ("wscale", "B"), ("flags", "B"),
+    ("rto", "I"), ("ato", "I"), ("snd_mss", "I"), ("rcv_mss", "I"),
+    ("unacked", "I"), ("sacked", "I"), ("lost", "I"), ("retrans", "I"), ("fackets", "I"),
+    ("last_data_sent", "I"), ("last_ack_sent", "I"), ("last_data_recv", "I"), ("last_ack_recv", "I"),
+    ("pmtu", "I"), ("rcv_ssthresh", "I"), ("rtt", "I"), ("rttvar", "I"),
+    ("snd_ssthresh", "I"), ("snd_cwnd", "I"), ("advmss", "I"), ("reordering", "I"),
+    ("rcv_rtt", "I"), ("rcv_space", "I"), ("total_retrans", "I"),
+    ("pacing_rate", "Q"), ("max_pacing_rate", "Q"), ("bytes_acked", "Q"), ("bytes_received", "Q"),
+    ("segs_out", "I"), ("segs_in", "I"), ("notsent_bytes", "I"), ("min_rtt", "I"),
+    ("data_segs_in", "I"), ("data_segs_out", "I"),
+    ("delivery_rate", "Q"), ("busy_time", "Q"), ("rwnd_limited", "Q"), ("sndbuf_limited", "Q"),
+    ("delivered", "I"), ("delivered_ce", "I"), ("bytes_sent", "Q"), ("bytes_retrans", "Q"),
+    ("dsack_dups", "I"), ("reord_seen", "I"), ("rcv_ooopack", "I"), ("snd_wnd", "I"),
+)
+TCP_INFO = struct.Struct("=" + "".join(f for _, f in TCP_INFO_FIELDS))
+TCP_INFO_NAMES = [n for n, _ in TCP_INFO_FIELDS]
+
+
+def parse_proc_address(address):
+    """
+    Return the (address, port) of `address`, as written in /proc/net files (the
+    32 bits words of the address in host order, then the port, in hexadecimal)
+    """
+    words, port = address.split(":")
+    packed = b"".join(struct.pack("=I", int(words[i:i + 8], 16)) for i in range(0, len(words), 8))
+    family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, packed), int(port, 16)
+
+
+def parse_mptcp_connections(text):
+    """
+    Return a dictionary (src, sport, dst, dport) -> (local token, remote token) of
+    the MPTCP connections of the out-of-tree kernel in `text`, the content of
+    /proc/net/mptcp_net/mptcp. The addresses are the ones of the initial subflow
+    of each connection.
+    """
+    connections = {}
+    for line in text.splitlines()[1:]:
+        words = line.split()
+        if len(words) < 6 or not words[0].endswith(":"):
+            continue
+        try:
+            src, sport = parse_proc_address(words[4])
+            dst, dport = parse_proc_address(words[5])
+            connections[(src, sport, dst, dport)] = (int(words[1], 16), int(words[2], 16))
+        except (ValueError, struct.error):
+            continue
+    return connections
+
+
+class SockDiagSocket(NetlinkSocket):
+    """
+    sock_diag client dumping the TCP sockets of a network namespace with their
+    tcp_info (what `ss -ti` shows)
+    """
+    def __init__(self, netns_path=None):
+        super(SockDiagSocket, self).__init__(NETLINK_SOCK_DIAG, netns_path=netns_path)
+        # Opened in the namespace, then read from any thread
+        try:
+            if netns_path is None:
+                self.mptcp_file = open(MPTCP_CONNECTIONS_FILE)
+            else:
+                self.mptcp_file = run_in_netns(netns_path, open, MPTCP_CONNECTIONS_FILE)
+        except (IOError, OSError):
+            self.mptcp_file = None
+
+    def get_mptcp_connections(self):
+        """
+        Return the MPTCP connections of the out-of-tree kernel (see
+        parse_mptcp_connections), or an empty dictionary
+        """
+        if self.mptcp_file is None:
+            return {}
+        self.mptcp_file.seek(0)
+        return parse_mptcp_connections(self.mptcp_file.read())
+
+    def get_tcp_sockets(self):
+        """
+        Generate, for each TCP socket (but listening ones), a tuple (cookie,
+        address dictionary, (local, remote) MPTCP tokens or None, receive queue,
+        send queue, tcp_info values in the order of TCP_INFO_FIELDS)
+
+        With the out-of-tree kernel, the tokens are only known for the initial
+        subflow of each connection (see get_mptcp_connections).
+        """
+        connections = self.get_mptcp_connections()
+        for family in (socket.AF_INET, socket.AF_INET6):
+            request = INET_DIAG_REQ.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), TCP_STATES)
+            for _, payload in self.dump(SOCK_DIAG_BY_FAMILY, request):
+                _, _, _, _, sport, dport, src, dst, _, cookie, _, rqueue, wqueue, _, _ = \
+                    INET_DIAG_MSG.unpack_from(payload)
+                attributes = parse_attributes(payload, INET_DIAG_MSG.size)
+                info = attributes.get(INET_DIAG_INFO, b"")[:TCP_INFO.size]
+                info = TCP_INFO.unpack(info.ljust(TCP_INFO.size, b"\0"))
+                address_size = 4 if family == socket.AF_INET else 16
+                addresses = {
+                    "src": socket.inet_ntop(family, src[:address_size]),
+                    "sport": struct.unpack("!H", sport)[0],
+                    "dst": socket.inet_ntop(family, dst[:address_size]),
+                    "dport": struct.unpack("!H", dport)[0],
+                }
+                tokens = self.get_mptcp_tokens(attributes) or connections.get((addresses["src"],
+                    addresses["sport"], addresses["dst"], addresses["dport"]))
+                yield cookie, addresses, tokens, rqueue, wqueue, info
+
+    def get_mptcp_tokens(self, attributes):
+        """
+        Return the (local, remote) tokens of the MPTCP connection of a subflow, from
+        the ULP information of the socket (upstream MPTCP), or None
+        """
+        ulp = parse_attributes(attributes.get(INET_DIAG_ULP_INFO, b""))
+        mptcp = parse_attributes(ulp.get(INET_DIAG_ULP_INFO_MPTCP, b""))
+        if MPTCP_SUBFLOW_ATTR_TOKEN_LOC not in mptcp:
+            return None
+        return tuple(struct.unpack_from("=I", mptcp[a])[0]
+            for a in (MPTCP_SUBFLOW_ATTR_TOKEN_LOC, MPTCP_SUBFLOW_ATTR_TOKEN_REM))
+
+    def close(self):
+        if self.mptcp_file is not None:
+            self.mptcp_file.close()
+        super(SockDiagSocket, self).close()
+
+
+class SocketStatsSampler(PeriodicSampler):
+    """
+    Sample the tcp_info of all the TCP sockets (e.g., MPTCP subflows) of some
+    hosts, read in-process with one sock_diag dump per address family, host and
+    sample.
+
+    Samples are written as they come in a float64 .npy array (see NpyWriter),
+    one row per socket and sample, with the columns COLUMNS (times are offsets
+    in seconds from the start of the sampler). METADATA_FILE maps the socket
+    numbers of the array to the host, addresses and MPTCP connection (local and
+    remote tokens, when the kernel reports them: for all the subflows with
+    upstream MPTCP, only for the initial subflows with the out-of-tree kernel)
+    of the sockets.
+
+    Attributes:
+        topo        instance of Topo
+        hosts       list of the sampled hosts
+        sockets     list of the sampled sockets, as dictionaries
+    """
+    NAME = "socket-stats"
+    FILE = "socket_stats.npy"
+    METADATA_FILE = "socket_stats.json"
+    COLUMNS = ("time", "socket", "rqueue", "wqueue") + tuple(TCP_INFO_NAMES)
+
+    def __init__(self, topo, hosts, interval):
+        super(SocketStatsSampler, self).__init__(interval)
+        self.topo = topo
+        self.hosts = hosts
+        self.sockets = []
+        self.socket_numbers = {}
+        self.diag_sockets = []
+
+    def open(self):
+        for who in self.hosts:
+            netns_path = self.topo.get_netns_path(who)
+            try:
+                if netns_path is None:
+                    raise OSError("unknown network namespace")
+                self.diag_sockets.append(("{}".format(who), SockDiagSocket(netns_path)))
+            except OSError as e:
+                logging.warning("Cannot sample the sockets of {}: {}".format(who, e))
+
+        logging.info("Sample the sockets of {} hosts every {} s".format(len(self.diag_sockets),
+            self.interval))
+        self.writer = NpyWriter(SocketStatsSampler.FILE, SocketStatsSampler.COLUMNS)
+
+    def get_socket_number(self, host, cookie, addresses, tokens):
+        key = (host, cookie)
+        if key not in self.socket_numbers:
+            self.socket_numbers[key] = len(self.sockets)
+            self.sockets.append(dict(addresses, host=host,
+                mptcp_local_token=tokens[0] if tokens else None,
+                mptcp_remote_token=tokens[1] if tokens else None))
+        return self.socket_numbers[key]
+
+    def sample(self, now):
+        for host, diag_socket in self.diag_sockets:
+            for cookie, addresses, tokens, rqueue, wqueue, info in diag_socket.get_tcp_sockets():
+                number = self.get_socket_number(host, cookie, addresses, tokens)
+                self.writer.append((now, number, rqueue, wqueue) + info)
+
+    def close(self):
+        """
+        Write the array and its metadata
+        """
+        for _, diag_socket in self.diag_sockets:
+            diag_socket.close()
+        self.writer.close()
+        if self.sockets and all(s["mptcp_local_token"] is None for s in self.sockets):
+            logging.warning("No MPTCP token found for the {} sampled sockets, their MPTCP "
+                "connections are unknown in {}".format(len(self.sockets),
+                SocketStatsSampler.METADATA_FILE))
+        with open(SocketStatsSampler.METADATA_FILE, "w") as f:
+            json.dump({
+                "start_time": self.start_time,
+                "interval": self.interval,
+                "samples": self.samples,
+                "columns": SocketStatsSampler.COLUMNS,
+                "sockets": self.sockets,
+            }, f, indent=4)
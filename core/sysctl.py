@@ -0,0 +1,128 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import threading
+
+
+PROC_SYS = "/proc/sys"
+CLONE_NEWNET = 0x40000000
+
+
+def get_sysctl_path(key):
+    """
+    Return the file in /proc/sys holding the sysctl key `key`
+    """
+    return os.path.join(PROC_SYS, *key.split("."))
+
+
+def normalize_sysctl_value(value):
+    """
+    Return `value` as it should be read from /proc/sys. Vector sysctls (e.g.,
+    net.ipv4.tcp_rmem) are separated by tabs there, and followed by a newline.
+    """
+    return " ".join(str(value).split())
+
+
+def read_sysctl_command(key):
+    """
+    Return a bash command printing the value of the sysctl key `key`
+    """
+    return "cat {}".format(get_sysctl_path(key))
+
+
+def write_sysctl_command(key, value):
+    """
+    Return a bash command writing `value` in the sysctl key `key`
+    """
+    return "echo '{}' > {}".format(normalize_sysctl_value(value), get_sysctl_path(key))
+
+
+def read_sysctls(keys):
+    """
+    Return a dictionary key -> value for the sysctl `keys` of the current network
+    namespace. Keys that cannot be read are not in the dictionary.
+    """
+    values = {}
+    for key in keys:
+        try:
+            with open(get_sysctl_path(key)) as f:
+                values[key] = normalize_sysctl_value(f.read())
+        except (IOError, OSError) as e:
+            logging.error("unable to get sysctl {}: {}".format(key, e))
+
+    return values
+
+
+def check_sysctls(values, current_values):
+    """
+    Compare the sysctls that were written (`values`) with the ones read back from
+    the kernel (`current_values`), and return the list of keys that differ
+    """
+    failed = []
+    for key, value in values.items():
+        current_value = current_values.get(key)
+        if current_value != normalize_sysctl_value(value):
+            logging.error("unable to set sysctl {} to {} (current value: {})".format(
+                key, value, current_value))
+            failed.append(key)
+
+    return failed
+
+
+def write_sysctls(values):
+    """
+    Write all the sysctls of `values` (a dictionary key -> value) in the current
+    network namespace, and read them back to check the kernel took them. Return
+    the list of keys that could not be set.
+    """
+    for key, value in values.items():
+        try:
+            with open(get_sysctl_path(key), "w") as f:
+                f.write(normalize_sysctl_value(value) + "\n")
+        except (IOError, OSError) as e:
+            logging.error("unable to write sysctl {}: {}".format(key, e))
+
+    return check_sysctls(values, read_sysctls(values.keys()))
+
+
+def _setns(fd, nstype):
+    if hasattr(os, "setns"):
+        os.setns(fd, nstype)
+        return
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if libc.setns(fd, nstype) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def run_in_netns(netns_path, function, *args):
+    """
+    Call `function(*args)` in the network namespace `netns_path` (e.g.,
+    /proc/{pid}/ns/net) and return its result.
+
+    setns() only moves the calling thread, so the call is done in a dedicated
+    thread that is discarded afterwards, leaving the rest of the process in its
+    namespace. Raise OSError if the namespace cannot be entered.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            fd = os.open(netns_path, os.O_RDONLY)
+            try:
+                _setns(fd, CLONE_NEWNET)
+            finally:
+                os.close(fd)
+            outcome["result"] = function(*args)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+
+    return outcome["result"]
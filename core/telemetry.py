@@ -0,0 +1,305 @@
+from .npy import NpyWriter
+from .sysctl import run_in_netns
+
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTATTR_HEADER = struct.Struct("=HH")
+
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWQDISC = 36
+RTM_GETQDISC = 38
+IFINFOMSG = struct.Struct("=BxHiII")
+TCMSG = struct.Struct("=BxxxiIII")
+IFLA_STATS64 = 23
+TCA_KIND = 1
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+# rx_packets, tx_packets, rx_bytes, tx_bytes, rx_errors, tx_errors, rx_dropped,
+# tx_dropped (first fields of struct rtnl_link_stats64)
+LINK_STATS = struct.Struct("=8Q")
+QDISC_STATS_BASIC = struct.Struct("=QI")
+QDISC_STATS_QUEUE = struct.Struct("=5I")
+
+
+def parse_attributes(data, offset=0):
+    """
+    Return a dictionary type -> payload of the netlink attributes in `data`
+    """
+    attributes = {}
+    while offset + RTATTR_HEADER.size <= len(data):
+        length, attribute_type = RTATTR_HEADER.unpack_from(data, offset)
+        if length < RTATTR_HEADER.size:
+            break
+        attributes[attribute_type & 0x3fff] = data[offset + RTATTR_HEADER.size:offset + length]
+        offset += (length + 3) & ~3
+    return attributes
+
+
+class NetlinkSocket(object):
+    """
+    Minimal netlink client sending dump requests of the netlink `protocol`.
+
+    With `netns_path`, the socket is opened in this network namespace (see
+    sysctl.run_in_netns); it can then be used from any thread of the
+    orchestrator.
+    """
+    RECV_SIZE = 1 << 16
+
+    def __init__(self, protocol, netns_path=None):
+        if netns_path is None:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol)
+        else:
+            self.socket = run_in_netns(netns_path, socket.socket, socket.AF_NETLINK,
+                socket.SOCK_RAW, protocol)
+        self.socket.bind((0, 0))
+        self.sequence = 0
+
+    def dump(self, message_type, body):
+        """
+        Generate the payloads of the messages answering the dump request
+        `message_type`
+        """
+        self.sequence += 1
+        self.socket.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body), message_type,
+            NLM_F_REQUEST | NLM_F_DUMP, self.sequence, 0) + body)
+        while True:
+            data = self.socket.recv(RtnetlinkSocket.RECV_SIZE)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, reply_type, _, sequence, _ = NLMSG_HEADER.unpack_from(data, offset)
+                if length < NLMSG_HEADER.size:
+                    return
+                payload = data[offset + NLMSG_HEADER.size:offset + length]
+                offset += (length + 3) & ~3
+                if sequence != self.sequence:
+                    continue
+                if reply_type == NLMSG_DONE:
+                    return
+                if reply_type == NLMSG_ERROR:
+                    error, = struct.unpack_from("=i", payload)
+                    raise OSError(-error, os.strerror(-error))
+                yield reply_type, payload
+
+    def close(self):
+        self.socket.close()
+
+
+class RtnetlinkSocket(NetlinkSocket):
+    """
+    rtnetlink client dumping the links and qdiscs of a network namespace, by
+    default the one of the orchestrator (i.e., the one of the bottleneck switches)
+    """
+    def __init__(self, netns_path=None):
+        super(RtnetlinkSocket, self).__init__(socket.NETLINK_ROUTE, netns_path=netns_path)
+
+    def get_link_stats(self):
+        """
+        Return a dictionary ifindex -> (rx_packets, tx_packets, rx_bytes, tx_bytes,
+        rx_errors, tx_errors, rx_dropped, tx_dropped)
+        """
+        stats = {}
+        for reply_type, payload in self.dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            if reply_type != RTM_NEWLINK:
+                continue
+            _, _, ifindex, _, _ = IFINFOMSG.unpack_from(payload)
+            attributes = parse_attributes(payload, IFINFOMSG.size)
+            if IFLA_STATS64 in attributes:
+                stats[ifindex] = LINK_STATS.unpack_from(attributes[IFLA_STATS64])
+        return stats
+
+    def get_qdisc_stats(self):
+        """
+        Return a list of (ifindex, handle, parent, kind, bytes, packets, qlen,
+        backlog, drops, requeues, overlimits), one per qdisc
+        """
+        stats = []
+        for reply_type, payload in self.dump(RTM_GETQDISC, TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            if reply_type != RTM_NEWQDISC:
+                continue
+            _, ifindex, handle, parent, _ = TCMSG.unpack_from(payload)
+            attributes = parse_attributes(payload, TCMSG.size)
+            kind = attributes.get(TCA_KIND, b"").rstrip(b"\0").decode()
+            stats2 = parse_attributes(attributes.get(TCA_STATS2, b""))
+            basic = QDISC_STATS_BASIC.unpack_from(stats2[TCA_STATS_BASIC]) \
+                if TCA_STATS_BASIC in stats2 else (0, 0)
+            queue = QDISC_STATS_QUEUE.unpack_from(stats2[TCA_STATS_QUEUE]) \
+                if TCA_STATS_QUEUE in stats2 else (0, 0, 0, 0, 0)
+            stats.append((ifindex, handle, parent, kind) + basic + queue)
+        return stats
+
+
+class PeriodicSampler(object):
+    """
+    Base class of the samplers taking a sample every `interval` seconds from a
+    thread of the orchestrator, samples being aligned on the interval (those
+    already missed are skipped). Child classes implement `open()`, `sample(now)`
+    (with `now` the offset in seconds from the start of the sampler, measured
+    with a monotonic clock) and `close()`.
+
+    Attributes:
+        interval    sampling interval, in seconds (0 or less to disable sampling)
+        samples     number of samples taken
+        start_time  wall clock time when the sampler started, None before
+    """
+    NAME = "sampler"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = 0
+        self.start_time = None
+        self.anchor = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+
+        self.open()
+        self.start_time = time.time()
+        self.anchor = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=self.NAME)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample(time.monotonic() - self.anchor)
+            except OSError as e:
+                logging.error("Unable to sample {}: {}".format(self.NAME, e))
+                return
+            self.samples += 1
+            delay = self.interval - (time.monotonic() - self.anchor) % self.interval
+            if self.stopped.wait(delay):
+                return
+
+    def open(self):
+        raise NotImplementedError("Trying to open a PeriodicSampler")
+
+    def sample(self, now):
+        raise NotImplementedError("Trying to sample a PeriodicSampler")
+
+    def close(self):
+        raise NotImplementedError("Trying to close a PeriodicSampler")
+
+    def stop(self):
+        """
+        Stop sampling, and close the sampler
+        """
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.thread.join()
+        self.close()
+        logging.info("Took {} {} samples".format(self.samples, self.NAME))
+
+
+class LinkTelemetrySampler(PeriodicSampler):
+    """
+    Sample the counters of all the interfaces of the bottleneck links (those of
+    /sys/class/net/*/statistics) and the statistics of their qdiscs (those of
+    `tc -s qdisc`).
+
+    Both are read in-process with one rtnetlink dump each per sample, and
+    written as they come in two float64 .npy arrays (see NpyWriter), one row per
+    interface (resp. qdisc) and sample:
+        LINKS_FILE      LINK_COLUMNS
+        QDISCS_FILE     QDISC_COLUMNS
+    Times are offsets in seconds from the start of the sampler (monotonic clock).
+    METADATA_FILE maps the interface numbers of the arrays to the interfaces and
+    links, with the kind of the qdiscs of each interface by handle.
+
+    Attributes:
+        topo        instance of Topo whose bottleneck links are sampled
+        interfaces  list of the sampled interfaces, as dictionaries
+    """
+    NAME = "link-telemetry"
+    LINKS_FILE = "telemetry_links.npy"
+    QDISCS_FILE = "telemetry_qdiscs.npy"
+    METADATA_FILE = "telemetry.json"
+    LINK_COLUMNS = ("time", "interface", "rx_packets", "tx_packets", "rx_bytes", "tx_bytes",
+        "rx_errors", "tx_errors", "rx_dropped", "tx_dropped")
+    QDISC_COLUMNS = ("time", "interface", "handle", "parent", "bytes", "packets", "qlen",
+        "backlog", "drops", "requeues", "overlimits")
+
+    def __init__(self, topo, interval):
+        super(LinkTelemetrySampler, self).__init__(interval)
+        self.topo = topo
+        self.interfaces = []
+        self.interface_numbers = {}
+
+    def get_interfaces(self):
+        """
+        Return the interfaces of the bottleneck links, as dictionaries
+        """
+        interfaces = []
+        for b in self.topo.bottleneck_links:
+            link = "{}_{}".format(b.link_characteristics.link_type, b.link_characteristics.id)
+            for index in range(4 if not b.compact else 2):
+                bs = self.topo.get_host(b.get_bs_name(index))
+                for ifname in self.topo.get_interface_names(bs):
+                    interfaces.append({"link": link, "switch": "{}".format(bs), "name": ifname,
+                        "qdiscs": {}})
+        return interfaces
+
+    def open(self):
+        names = {name: index for index, name in socket.if_nameindex()}
+        for interface in self.get_interfaces():
+            if interface["name"] not in names:
+                logging.warning("Interface {} not found, not sampled".format(interface["name"]))
+                continue
+            interface["ifindex"] = names[interface["name"]]
+            self.interface_numbers[interface["ifindex"]] = len(self.interfaces)
+            self.interfaces.append(interface)
+
+        logging.info("Sample {} link interfaces every {} s".format(len(self.interfaces), self.interval))
+        self.rtnetlink = RtnetlinkSocket()
+        self.links_writer = NpyWriter(LinkTelemetrySampler.LINKS_FILE, LinkTelemetrySampler.LINK_COLUMNS)
+        self.qdiscs_writer = NpyWriter(LinkTelemetrySampler.QDISCS_FILE, LinkTelemetrySampler.QDISC_COLUMNS)
+
+    def sample(self, now):
+        link_stats = self.rtnetlink.get_link_stats()
+        qdisc_stats = self.rtnetlink.get_qdisc_stats()
+        for ifindex, number in self.interface_numbers.items():
+            if ifindex in link_stats:
+                self.links_writer.append((now, number) + link_stats[ifindex])
+        for ifindex, handle, parent, kind, *counters in qdisc_stats:
+            if ifindex in self.interface_numbers:
+                number = self.interface_numbers[ifindex]
+                self.interfaces[number]["qdiscs"]["{:x}:".format(handle >> 16)] = kind
+                self.qdiscs_writer.append([now, number, handle, parent] + counters)
+
+    def close(self):
+        """
+        Write the arrays and their metadata
+        """
+        self.rtnetlink.close()
+        self.links_writer.close()
+        self.qdiscs_writer.close()
+        with open(LinkTelemetrySampler.METADATA_FILE, "w") as f:
+            json.dump({
+                "start_time": self.start_time,
+                "interval": self.interval,
+                "samples": self.samples,
+                "interfaces": self.interfaces,
+                "files": {
+                    LinkTelemetrySampler.LINKS_FILE: LinkTelemetrySampler.LINK_COLUMNS,
+                    LinkTelemetrySampler.QDISCS_FILE: LinkTelemetrySampler.QDISC_COLUMNS,
+                },
+            }, f, indent=4)
@@ -1,7 +1,18 @@
+from .command import CommandBatch, MAX_SCRIPT_SIZE, NetnsShell, build_batch_script, \
+    parse_batch_output, split_batch
+from .journal import CommandJournal
+from .manifest import RunManifest
 from .parameter import Parameter
+from .plan import ConfigPlan, PlanBatch, apply_plan_commands
+from .trace import LinkTrace
 
+import copy
+import hashlib
+import json
 import logging
 import math
+import os
+import time
 
 
 class NetemAt(object):
@@ -17,6 +28,28 @@ class NetemAt(object):
         return "netem at {} ({}) will be {}".format(self.at, self.delta, self.cmd)
 
 
+class LinkEvent(object):
+    """
+    Class representing a failure (or a recovery) of a link after some time:
+        - down/up: set both ends of the link down/up
+        - blackhole/unblackhole: silently drop/stop dropping all the packets
+          crossing the link
+        - rst/unrst: answer/stop answering the TCP segments crossing the link with
+          a RST, sent by the host receiving them
+    """
+    EVENTS = ("down", "up", "blackhole", "unblackhole", "rst", "unrst")
+
+    def __init__(self, at, event):
+        if event not in LinkEvent.EVENTS:
+            raise ValueError("Unknown link event {}, expected one of {}".format(
+                event, ", ".join(LinkEvent.EVENTS)))
+        self.at = at
+        self.event = event
+
+    def __str__(self):
+        return "link {} at {}".format(self.event, self.at)
+
+
 def get_bandwidth_delay_product_divided_by_mtu(delay, bandwidth):
     """
     With delay in ms, bandwidth in Mbps
@@ -26,6 +59,16 @@ def get_bandwidth_delay_product_divided_by_mtu(delay, bandwidth):
     return int(math.ceil(bandwidth_delay_product * 1.0 / 1500.0))
 
 
+def get_tbf_burst(bandwidth, timer, mtu=1500):
+    """
+    With bandwidth in Mbps, timer in ms
+
+    Return the number of bytes sent at `bandwidth` during `timer`, such that tbf
+    can keep up with the rate between two timer expirations (at least 10 MTUs)
+    """
+    return max(int(math.ceil(float(bandwidth) * 125000.0 * float(timer) / 1000.0)), 10 * mtu)
+
+
 class LinkCharacteristics(object):
     """
     Network characteristics associated to a link
@@ -39,9 +82,26 @@ class LinkCharacteristics(object):
         loss            the random loss rate in percentage
         queuing_delay   the maximum time that a packet can stay in the link buffer (computed over queue_size)
         netem_at        list of NetemAt instances applicable to the link
+        link_events     list of LinkEvent instances applicable to the link
         backup          integer indicating if this link is a backup one or not (useful for MPTCP)
+        burst           the size of the tbf bucket, in bytes
+        qdisc           the queue discipline implementing the bandwidth and the buffer
+                        of the link, one of QDISCS
+        qdisc_options   dictionary of qdisc parameters overriding the derived ones
+        trace           LinkTrace replayed on the link, or None
     """
-    def __init__(self, id, link_type, delay, queue_size, bandwidth, loss, backup=0):
+    DEFAULT_BURST = 15000
+    # Largest packet handed to the link when offloads are enabled
+    GSO_MAX_SIZE = 65536
+    # tbf shaping with a tail-drop buffer, tbf shaping with an AQM child (fq_codel,
+    # red, pie), cake (shaping itself), htb shaping with a fq leaf, and netem
+    # shaping with its rate option
+    QDISCS = ("tbf", "fq_codel", "cake", "red", "pie", "htb_fq", "netem_rate")
+    TBF_CHILD_QDISCS = ("fq_codel", "red", "pie")
+    DEFAULT_QDISC = "tbf"
+
+    def __init__(self, id, link_type, delay, queue_size, bandwidth, loss, backup=0,
+            burst=DEFAULT_BURST):
         self.id = id
         self.link_type = link_type
         self.delay = delay
@@ -50,7 +110,12 @@ class LinkCharacteristics(object):
         self.loss = loss
         self.queuing_delay = str(self.extract_queuing_delay(queue_size, bandwidth, delay))
         self.netem_at = []
+        self.link_events = []
         self.backup = backup
+        self.burst = burst
+        self.qdisc = LinkCharacteristics.DEFAULT_QDISC
+        self.qdisc_options = {}
+        self.trace = None
 
     def bandwidth_delay_product_divided_by_mtu(self):
         """
@@ -81,30 +146,128 @@ class LinkCharacteristics(object):
             else:
                 logging.error("{}: not taken into account because not specified in order in the topo param file".format(n))
 
+    def set_qdisc(self, qdisc, options=None):
+        """
+        Use `qdisc` (one of QDISCS) for the bandwidth and the buffer of the link.
+        `options` is a dictionary of qdisc parameters overriding the ones derived
+        from the link characteristics (e.g., {"target": "10ms"}); parameters
+        without value (e.g., {"ecn": ""}) are flags.
+        """
+        if qdisc not in LinkCharacteristics.QDISCS:
+            raise ValueError("Unknown qdisc {}, expected one of {}".format(
+                qdisc, ", ".join(LinkCharacteristics.QDISCS)))
+        self.qdisc = qdisc
+        self.qdisc_options = options or {}
+
+    def shapes_with_netem(self):
+        return self.qdisc == "netem_rate"
+
+    def get_qdisc_args(self, derived_args):
+        """
+        Return the parameters of the qdisc: `derived_args` (a list of (name,
+        value)) overridden and completed by qdisc_options
+        """
+        args = dict(derived_args)
+        args.update(self.qdisc_options)
+        return " ".join(["{} {}".format(k, v) if v != "" else k for k, v in args.items()])
+
+    def get_codel_interval(self):
+        """
+        Interval of CoDel (in ms), covering the RTT of the link (and at least
+        the default 100 ms); the target is 5% of it
+        """
+        return max(100.0, 2 * float(self.delay))
+
+    def get_netem_rate_limit(self):
+        """
+        With netem shaping, netem holds both the packets in the buffer and the
+        ones being delayed
+        """
+        return int(self.queue_size) + int(math.ceil(self.bandwidth_delay_product_divided_by_mtu() / 2.0))
+
+    def build_aqm_args(self):
+        if self.qdisc == "fq_codel":
+            interval = self.get_codel_interval()
+            return self.get_qdisc_args([("limit", int(self.queue_size)),
+                ("target", "{}ms".format(interval / 20)), ("interval", "{}ms".format(interval))])
+        if self.qdisc == "pie":
+            return self.get_qdisc_args([("limit", int(self.queue_size))])
+        if self.qdisc == "red":
+            # Usual RED setting: the maximum threshold at half the buffer, the
+            # minimum one at a third of the maximum
+            limit = int(self.buffer_size())
+            max_threshold = limit // 2
+            min_threshold = max_threshold // 3
+            return self.get_qdisc_args([("limit", limit), ("min", min_threshold),
+                ("max", max_threshold), ("avpkt", 1500),
+                ("burst", (2 * min_threshold + max_threshold) // (3 * 1500) + 1),
+                ("bandwidth", "{}mbit".format(self.bandwidth)), ("probability", 0.1)])
+        raise ValueError("No AQM child for qdisc {}".format(self.qdisc))
+
+    def build_shaping_cmds(self, ifname, replace=False, parent=None):
+        """
+        Return the commands implementing the bandwidth and the buffer of the link
+        on the egress of `ifname` with its qdisc. The root qdisc of these commands
+        (handle 1:) is the root qdisc of `ifname`, unless `parent` is given.
+        """
+        action = "replace" if replace else "add"
+        location = "parent {}".format(parent) if parent else "root"
+        rate = "{}mbit".format(self.bandwidth)
+        if self.qdisc == "cake":
+            return ["tc qdisc {} dev {} {} handle 1:0 cake {}".format(action, ifname, location,
+                self.get_qdisc_args([("bandwidth", rate), ("rtt", "{}ms".format(2 * float(self.delay))),
+                    ("memlimit", int(self.buffer_size()))]))]
+        if self.qdisc == "netem_rate":
+            return ["tc qdisc {} dev {} {} handle 1:0 netem {}".format(action, ifname, location,
+                self.get_qdisc_args([("rate", rate), ("limit", int(self.queue_size))]))]
+        if self.qdisc == "htb_fq":
+            # The htb qdisc itself cannot be changed, only its class
+            cmds = [] if replace else ["tc qdisc add dev {} {} handle 1:0 htb default 1".format(
+                ifname, location)]
+            return cmds + [
+                "tc class {} dev {} parent 1: classid 1:1 htb rate {} ceil {} burst {} cburst {} quantum 1514".format(
+                    action, ifname, rate, rate, self.burst, self.burst),
+                "tc qdisc {} dev {} parent 1:1 handle 2: fq {}".format(action, ifname,
+                    self.get_qdisc_args([("limit", int(self.queue_size))])),
+            ]
+
+        cmds = [self.build_bandwidth_cmd(ifname, replace=replace, parent=parent)]
+        if self.qdisc in LinkCharacteristics.TBF_CHILD_QDISCS:
+            cmds.append("tc qdisc {} dev {} parent 1:1 handle 2: {} {}".format(action, ifname,
+                self.qdisc, self.build_aqm_args()))
+        return cmds
+
     def build_delete_tc_cmd(self, ifname):
         return "tc qdisc del dev {} root; tc qdisc del dev {} ingress ".format(ifname, ifname)
 
-    def build_bandwidth_cmd(self, ifname, replace=False):
-        return "tc qdisc {} dev {} root handle 1:0 tbf rate {}mbit burst 15000 limit {}".format(
-            "replace" if replace else "add", ifname, self.bandwidth, self.buffer_size())
-
-    def build_changing_bandwidth_cmd(self, ifname):
-        return "&& ".join(
-            ["sleep {} && ({}) ".format(
-                n.delta, self.build_bandwidth_cmd(ifname, replace=True)) for n in self.netem_at]
-            + ["true &"]
-        )
+    def build_bandwidth_cmd(self, ifname, replace=False, parent=None):
+        """
+        The tbf qdisc is the root qdisc of `ifname`, unless `parent` is given
+        """
+        return "tc qdisc {} dev {} {} handle 1:0 tbf rate {}mbit burst {} limit {}".format(
+            "replace" if replace else "add", ifname,
+            "parent {}".format(parent) if parent else "root", self.bandwidth, self.burst,
+            self.buffer_size())
 
-    def build_netem_cmd(self, ifname, cmd, replace=False):
+    def build_netem_cmd(self, ifname, cmd, replace=False, rate=False):
+        """
+        With `rate`, the netem qdisc also shapes the traffic (see shapes_with_netem)
+        """
+        if rate:
+            cmd = "{} {}".format(cmd, self.get_qdisc_args([("rate", "{}mbit".format(self.bandwidth))]))
         return "tc qdisc {} dev {} root handle 10: netem {} {}".format(
-            "replace" if replace else "add", ifname, cmd, "delay {}ms limit 50000".format(self.delay) if not replace else "")
+            "replace" if replace else "add", ifname, cmd, "delay {}ms limit {}".format(self.delay,
+                self.get_netem_rate_limit() if rate else 50000) if not replace else "")
 
-    def build_changing_netem_cmd(self, ifname):
-        return "&& ".join(
-            ["sleep {} && {} ".format(
-                n.delta, self.build_netem_cmd(ifname, n.cmd, replace=True)) for n in self.netem_at]
-            + ["true &"]
-        )
+    def build_netem_change_cmd(self, ifname, rate=False):
+        """
+        Return the command setting the netem qdisc of `ifname` to the current delay
+        and loss of the link (e.g., when replaying its trace)
+        """
+        cmd = "delay {}ms limit {}".format(self.delay, self.get_netem_rate_limit() if rate else 50000)
+        if float(self.loss) > 0:
+            cmd = "{} loss {}".format(cmd, self.loss)
+        return self.build_netem_cmd(ifname, cmd, replace=True, rate=rate)
 
     def as_dict(self):
         """
@@ -128,20 +291,48 @@ Link id: {}
     Bandwidth: {}
     Loss: {}
     Backup: {}
-        """.format(self.link_type, self.id, self.delay, self.queue_size, self.bandwidth, self.loss, self.backup) + \
-            "".join(["\t {} \n".format(n) for n in self.netem_at])
+    Burst: {}
+    Qdisc: {} {}
+    Trace: {}
+        """.format(self.link_type, self.id, self.delay, self.queue_size, self.bandwidth, self.loss, self.backup,
+            self.burst, self.qdisc, self.qdisc_options, self.trace) + \
+            "".join(["\t {} \n".format(n) for n in self.netem_at]) + \
+            "".join(["\t {} \n".format(e) for e in self.link_events])
 
 
 class TopoParameter(Parameter):
     LEFT_SUBNET = "leftSubnet"
     RIGHT_SUBNET = "rightSubnet"
     NETEM_AT = "netemAt_"
+    LINK_EVENT = "linkEvent_"  # linkEvent_{link_type}_{link_id}:{time},{event}
+    QDISC = "qdisc_"  # qdisc_{link_type}_{link_id}:{qdisc}[,{name}={value}]*
     CHANGE_NETEM = "changeNetem"
+    NAME_PREFIX = "namePrefix"
+    JOURNAL_OUTPUT = "journalOutput"  # output characters kept per command, -1 for all
+    CONFIG_PLAN = "configPlan"  # compile the configuration in ip/tc batch files
+    CONFIG_PLAN_DIR = "configPlanDir"
+    BOTTLENECK_MODE = "bottleneckMode"  # "switches" or "compact", see BottleneckLink
+    HIGH_SPEED = "highSpeed"  # size tbf bursts from the link rate
+    SHAPING_TIMER = "shapingTimer"  # timer resolution of the shaping, in ms
+    KEEP_OFFLOADS = "keepOffloads"  # in high-speed mode, keep TSO/GSO/GRO if accurate
+    LINK_QUEUES = "linkQueues"  # number of queues of the veth interfaces
+    TRACE_INTERVAL = "traceInterval"  # decimation interval of the link traces, in ms
+    TRACE_OPTION = "trace"
 
     DEFAULT_PARAMETERS = {
         LEFT_SUBNET: "10.1.",
         RIGHT_SUBNET: "10.2.",
         CHANGE_NETEM: "false",
+        NAME_PREFIX: "",
+        JOURNAL_OUTPUT: "{}".format(CommandJournal.MAX_OUTPUT),
+        CONFIG_PLAN: "no",
+        CONFIG_PLAN_DIR: "~/.cache/minitopo/plans",
+        BOTTLENECK_MODE: "switches",
+        HIGH_SPEED: "no",
+        SHAPING_TIMER: "1",
+        KEEP_OFFLOADS: "no",
+        LINK_QUEUES: "1",
+        TRACE_INTERVAL: "{}".format(LinkTrace.DEFAULT_INTERVAL),
     }
 
     def __init__(self, parameter_filename):
@@ -149,7 +340,9 @@ class TopoParameter(Parameter):
         self.default_parameters.update(TopoParameter.DEFAULT_PARAMETERS)
         self.link_characteristics = []
         self.load_link_characteristics()
+        self.load_qdiscs()
         self.load_netem_at()
+        self.load_link_events()
         logging.info(self)
 
     def parse_netem_at(self, key):
@@ -169,12 +362,60 @@ class TopoParameter(Parameter):
                 link_type, link_id = self.parse_netem_at(k)
                 self.load_netem_at_value(link_type, link_id, self.parameters[k])
 
+    def load_link_events(self):
+        """
+        Load the linkEvent_{link_type}_{link_id} keys, of the form
+            {time},{event}
+        with event one of LinkEvent.EVENTS, happening {time} seconds after the
+        experiment starts running. A key can be given several times.
+        """
+        for k in sorted(self.parameters):
+            if not k.startswith(TopoParameter.LINK_EVENT):
+                continue
+            values = self.parameters[k]
+            for value in values if isinstance(values, list) else [values]:
+                try:
+                    _, link_type, link_id = k.split("_")
+                    at, event = value.split(",")
+                    l = self.find_link_characteristic(link_type, int(link_id))
+                    l.link_events.append(LinkEvent(float(at), event.strip()))
+                except ValueError as e:
+                    logging.error("Ignored link event {}:{}: {}".format(k, value, e))
+
     def find_link_characteristic(self, link_type, link_id):
         for l in self.link_characteristics:
             if l.link_type == link_type and l.id == link_id:
                 return l
 
-        return ValueError("No link with link_type {} and link_id {}".format(link_type, link_id))
+        raise ValueError("No link with link_type {} and link_id {}".format(link_type, link_id))
+
+    def load_qdiscs(self):
+        """
+        Load the qdisc_{link_type}_{link_id} keys, of the form
+            {qdisc}[,{name}={value}]*
+        with qdisc one of LinkCharacteristics.QDISCS, followed by parameters of the
+        qdisc overriding the derived ones (a name without value being a flag). A
+        key, or a parameter within a key, can only be given once.
+        """
+        for k in sorted(self.parameters):
+            if not k.startswith(TopoParameter.QDISC):
+                continue
+            try:
+                if isinstance(self.parameters[k], list):
+                    raise ValueError("given {} times: {}".format(len(self.parameters[k]),
+                        ", ".join(self.parameters[k])))
+                _, link_type, link_id = k.split("_")
+                values = self.parameters[k].split(",")
+                options = {}
+                for option in values[1:]:
+                    name, _, value = option.partition("=")
+                    if name.strip() in options:
+                        raise ValueError("parameter {} given twice".format(name.strip()))
+                    options[name.strip()] = value.strip()
+                l = self.find_link_characteristic(link_type, int(link_id))
+                l.set_qdisc(values[0].strip(), options)
+            except ValueError as e:
+                logging.error("Ignored qdisc {}: {}".format(k, e))
 
     def load_netem_at_value(self, link_type, link_id, n):
         try:
@@ -229,23 +470,85 @@ class TopoParameter(Parameter):
 
         raise ValueError("Invalid link characteristics: {}".format(value))
 
+    def parse_path_options(self, value):
+        """
+        Split the value of a path into its link characteristics (see
+        parse_link_characteristics) and its options, given as {name}={value}
+        after them (e.g., "20,100,12,trace=traces/lte.down")
+
+        Return
+            link characteristics, dictionary of the options
+        """
+        characteristics, options = [], {}
+        for field in value.split(","):
+            name, equal, option = field.partition("=")
+            if not equal:
+                characteristics.append(field)
+            elif name.strip() == TopoParameter.TRACE_OPTION:
+                options[TopoParameter.TRACE_OPTION] = option.strip()
+            else:
+                raise ValueError("Unknown path option {}".format(name))
+        return ",".join(characteristics), options
+
+    def parse_trace_characteristics(self, trace):
+        """
+        Characteristics of a path only given by its trace: the first change of the
+        trace, a null delay and loss when the trace does not give them, and a
+        buffer of the bandwidth-delay product (at least 10 packets)
+
+        Return
+            delay, bandwidth, queue_size, loss_perc, is_backup
+        """
+        change = trace.first_change()
+        if change is None or change[1] is None:
+            raise ValueError("No initial bandwidth in {}".format(trace))
+        _, bw, delay, loss_perc = change
+        delay = delay if delay is not None else 0.0
+        queue_size = max(get_bandwidth_delay_product_divided_by_mtu(delay, bw), 10)
+        return delay, bw, queue_size, loss_perc if loss_perc is not None else 0.0, 0
+
     def load_link_characteristics(self):
         """
         Load the path characteristics
+
+        In high-speed mode, the tbf burst of each link is sized from its rate
+        (see get_tbf_burst) instead of being fixed to LinkCharacteristics.DEFAULT_BURST.
+
+        A path with a trace option (see LinkTrace) replays the trace from the start
+        of the experiment. Relative trace paths are relative to the working
+        directory of the runner.
         """
+        high_speed = self.get(TopoParameter.HIGH_SPEED) == "yes"
+        timer = float(self.get(TopoParameter.SHAPING_TIMER))
+        interval = float(self.get(TopoParameter.TRACE_INTERVAL))
         for k in sorted(self.parameters):
             if k.startswith("path"):
                 try:
                     link_type, link_id = self.parse_link_id_and_type(k)
-                    delay, bw, queue_size, loss_perc, is_backup = self.parse_link_characteristics(
-                        self.parameters[k])
-                except ValueError as e:
+                    value, options = self.parse_path_options(self.parameters[k])
+                    trace = None
+                    if TopoParameter.TRACE_OPTION in options:
+                        trace = LinkTrace(os.path.abspath(os.path.expanduser(
+                            options[TopoParameter.TRACE_OPTION])), interval=interval)
+                    if value == "" and trace is not None:
+                        delay, bw, queue_size, loss_perc, is_backup = self.parse_trace_characteristics(trace)
+                    else:
+                        delay, bw, queue_size, loss_perc, is_backup = self.parse_link_characteristics(value)
+                except (ValueError, IOError, OSError) as e:
                     logging.error("Ignored path {}: {}".format(k, e))
                 else:
+                    burst = get_tbf_burst(bw, timer) if high_speed else LinkCharacteristics.DEFAULT_BURST
                     path = LinkCharacteristics(link_id, link_type, delay, queue_size,
-                            bw, loss_perc, backup=is_backup)
+                            bw, loss_perc, backup=is_backup, burst=burst)
+                    path.trace = trace
                     self.link_characteristics.append(path)
 
+    def get_trace_paths(self):
+        """
+        Return the paths of the trace files replayed on the links
+        """
+        return sorted(set(l.trace.path for l in self.link_characteristics if l.trace is not None))
+
     def __str__(self):
         s = "{}".format(super(TopoParameter, self).__str__())
         s += "".join(["{}".format(lc) for lc in self.link_characteristics])
@@ -266,21 +569,49 @@ class BottleneckLink(object):
         - Policing command to implement buffer on ingress of bs1 from bs0
         - Shaping command to implement bandwidth on egress of bs1 to bs2
         - Netem command to implement delay and loss on egress of bs2 to bs3
+
+    In compact mode (see TopoParameter.BOTTLENECK_MODE), the link is only made
+    of two switches:
+
+        bs0 -- bs1
+
+    Where bs0 (resp. bs1) is the left (resp. right) side of the link. Both
+    directions are emulated on the veth pair between them: the egress of each
+    end has a netem qdisc (delay and loss) with a tbf child (bandwidth and
+    buffer), so that packets are delayed then shaped as with four switches.
     """
     BOTTLENECK_SWITCH_NAME_PREFIX = "bs"
+    SWITCHES_MODE = "switches"
+    COMPACT_MODE = "compact"
+    # Parent of the tbf qdisc in compact mode, i.e., the class of the netem qdisc
+    NETEM_CLASS = "10:1"
 
     def __init__(self, topo_builder, topo, link_characteristics):
         self.link_characteristics = link_characteristics
         self.topo = topo
+        # (node name, MAC address of its interface) of the nodes connected to the
+        # link, see Topo.add_bottleneck_link
+        self.endpoints = []
+        self.compact = topo.topo_parameter.get(
+            TopoParameter.BOTTLENECK_MODE) == BottleneckLink.COMPACT_MODE
         self.bs0 = topo_builder.add_switch(self.get_bs_name(0))
         self.bs1 = topo_builder.add_switch(self.get_bs_name(1))
+        link_options = topo.get_link_options()
+        if self.compact:
+            topo_builder.add_link(self.bs0, self.bs1, **link_options)
+            return
+
         self.bs2 = topo_builder.add_switch(self.get_bs_name(2))
         self.bs3 = topo_builder.add_switch(self.get_bs_name(3))
-        topo_builder.add_link(self.bs0, self.bs1)
-        topo_builder.add_link(self.bs1, self.bs2)
-        topo_builder.add_link(self.bs2, self.bs3)
+        topo_builder.add_link(self.bs0, self.bs1, **link_options)
+        topo_builder.add_link(self.bs1, self.bs2, **link_options)
+        topo_builder.add_link(self.bs2, self.bs3, **link_options)
 
     def get_bs_name(self, index):
+        if self.topo.name_prefix:
+            # Compact form, see Topo.get_node_name
+            return "{}{}{}b{}".format(self.topo.name_prefix,
+                self.link_characteristics.link_type, self.link_characteristics.id, index)
         return "{}_{}_{}_{}".format(BottleneckLink.BOTTLENECK_SWITCH_NAME_PREFIX, 
             self.link_characteristics.link_type, self.link_characteristics.id, index)
 
@@ -288,66 +619,244 @@ class BottleneckLink(object):
         # Required to retrieve actual nodes
         self.bs0 = self.topo.get_host(self.get_bs_name(0))
         self.bs1 = self.topo.get_host(self.get_bs_name(1))
+        if self.compact:
+            return
         self.bs2 = self.topo.get_host(self.get_bs_name(2))
         self.bs3 = self.topo.get_host(self.get_bs_name(3))
 
-    def configure_bottleneck(self):
+    def get_compact_interface_names(self):
+        """
+        In compact mode, return the interfaces of bs0 and bs1 at both ends of the
+        link between them (their first ports, as this link is created first)
+        """
+        return self.topo.get_interface_names(self.bs0)[0], self.topo.get_interface_names(self.bs1)[0]
+
+    def configure_bottleneck(self, batch=None, clean=True):
+        """
+        Queue the commands configuring the link in `batch`. If no batch is
+        provided, the commands are run before returning. The qdiscs of the link
+        interfaces are deleted first, unless `clean` is False (on the new
+        interfaces of a booting topology, where the deletion would fail).
+        """
+        if self.compact:
+            self.configure_compact_bottleneck(batch=batch, clean=clean)
+            return
+
         bs1_interface_names = self.topo.get_interface_names(self.bs1)
         bs2_interface_names = self.topo.get_interface_names(self.bs2)
+        own_batch = batch is None
+        if own_batch:
+            batch = self.topo.command_batch()
 
         # Cleanup tc commands
-        for bs1_ifname in bs1_interface_names:
+        for bs1_ifname in bs1_interface_names if clean else []:
             clean_cmd = self.link_characteristics.build_delete_tc_cmd(bs1_ifname)
             logging.info(clean_cmd)
-            self.topo.command_to(self.bs1, clean_cmd)
+            batch.add(self.bs1, clean_cmd)
 
-        for bs2_ifname in bs2_interface_names:
+        for bs2_ifname in bs2_interface_names if clean else []:
             clean_cmd = self.link_characteristics.build_delete_tc_cmd(bs2_ifname)
             logging.info(clean_cmd)
-            self.topo.command_to(self.bs2, clean_cmd)
+            batch.add(self.bs2, clean_cmd)
 
         # Flow bs0 -> bs3
         netem_cmd = self.link_characteristics.build_netem_cmd(bs1_interface_names[-1],
             "loss {}".format(self.link_characteristics.loss) if float(self.link_characteristics.loss) > 0 else "")
         logging.info(netem_cmd)
-        self.topo.command_to(self.bs1, netem_cmd)
-        shaping_cmd = self.link_characteristics.build_bandwidth_cmd(bs2_interface_names[-1])
-        logging.info(shaping_cmd)
-        self.topo.command_to(self.bs2, shaping_cmd)
+        batch.add(self.bs1, netem_cmd)
+        for shaping_cmd in self.link_characteristics.build_shaping_cmds(bs2_interface_names[-1]):
+            logging.info(shaping_cmd)
+            batch.add(self.bs2, shaping_cmd)
 
         # Flow bs3 -> bs0
         netem_cmd = self.link_characteristics.build_netem_cmd(bs2_interface_names[0],
             "loss {}".format(self.link_characteristics.loss) if float(self.link_characteristics.loss) > 0 else "")
         logging.info(netem_cmd)
-        self.topo.command_to(self.bs2, netem_cmd)
-        shaping_cmd = self.link_characteristics.build_bandwidth_cmd(bs1_interface_names[0])
-        logging.info(shaping_cmd)
-        self.topo.command_to(self.bs1, shaping_cmd)
+        batch.add(self.bs2, netem_cmd)
+        for shaping_cmd in self.link_characteristics.build_shaping_cmds(bs1_interface_names[0]):
+            logging.info(shaping_cmd)
+            batch.add(self.bs1, shaping_cmd)
+        if own_batch:
+            batch.flush()
+
+    def configure_compact_bottleneck(self, batch=None, clean=True):
+        own_batch = batch is None
+        if own_batch:
+            batch = self.topo.command_batch()
+
+        loss = "loss {}".format(self.link_characteristics.loss) if float(self.link_characteristics.loss) > 0 else ""
+        # With netem shaping, the netem qdisc does it all
+        rate = self.link_characteristics.shapes_with_netem()
+        # Flow bs0 -> bs1 on the egress of bs0, flow bs1 -> bs0 on the egress of bs1
+        for bs, ifname in zip((self.bs0, self.bs1), self.get_compact_interface_names()):
+            cmds = [self.link_characteristics.build_delete_tc_cmd(ifname)] if clean else []
+            cmds.append(self.link_characteristics.build_netem_cmd(ifname, loss, rate=rate))
+            if not rate:
+                cmds += self.link_characteristics.build_shaping_cmds(ifname,
+                    parent=BottleneckLink.NETEM_CLASS)
+            for cmd in cmds:
+                logging.info(cmd)
+                batch.add(bs, cmd)
+        if own_batch:
+            batch.flush()
+
+    def get_netem_interfaces(self):
+        """
+        Return the (switch, interface name) holding the netem qdiscs of the link,
+        for the flow bs0 -> bs3 then the flow bs3 -> bs0 (see configure_bottleneck)
+        """
+        if self.compact:
+            return list(zip((self.bs0, self.bs1), self.get_compact_interface_names()))
+        return [(self.bs1, self.topo.get_interface_names(self.bs1)[-1]),
+            (self.bs2, self.topo.get_interface_names(self.bs2)[0])]
 
-    def configure_changing_bottleneck(self):
-        bs1_interface_names = self.topo.get_interface_names(self.bs1)
-        bs2_interface_names = self.topo.get_interface_names(self.bs2)
-        # Flow bs0 -> bs3
-        shaping_cmd = self.link_characteristics.build_changing_bandwidth_cmd(bs1_interface_names[-1])
-        logging.info(shaping_cmd)
-        self.topo.command_to(self.bs1, shaping_cmd)
-        netem_cmd = self.link_characteristics.build_changing_netem_cmd(bs2_interface_names[-1])
-        logging.info(netem_cmd)
-        self.topo.command_to(self.bs2, netem_cmd)
+    def get_shaping_interfaces(self):
+        """
+        Return the (switch, interface name) holding the shaping qdiscs of the link
+        (same order as get_netem_interfaces), and the parent of these qdiscs
+        """
+        if self.compact:
+            return self.get_netem_interfaces(), BottleneckLink.NETEM_CLASS
+        return [(self.bs2, self.topo.get_interface_names(self.bs2)[-1]),
+            (self.bs1, self.topo.get_interface_names(self.bs1)[0])], None
 
-        # Flow bs3 -> bs0
-        shaping_cmd = self.link_characteristics.build_changing_bandwidth_cmd(bs2_interface_names[0])
-        logging.info(shaping_cmd)
-        self.topo.command_to(self.bs2, shaping_cmd)
-        netem_cmd = self.link_characteristics.build_changing_netem_cmd(bs1_interface_names[0])
-        logging.info(netem_cmd)
-        self.topo.command_to(self.bs1, netem_cmd)
+    def schedule_changing_bottleneck(self, scheduler):
+        """
+        Add the netem changes of the link (see NetemAt) to `scheduler`, an instance
+        of LinkEventScheduler. They apply to the netem qdiscs of both directions.
+        """
+        characteristics = self.link_characteristics
+        # Replacing the netem qdisc by another one with the same handle only
+        # changes it, keeping its child in compact mode
+        rate = self.compact and characteristics.shapes_with_netem()
+        for bs, ifname in self.get_netem_interfaces():
+            for n in characteristics.netem_at:
+                netem_cmd = characteristics.build_netem_cmd(ifname, n.cmd, replace=True, rate=rate)
+                logging.info("At {}: {}".format(n.at, netem_cmd))
+                scheduler.add(n.at, bs, netem_cmd)
+
+    def get_trace_events(self):
+        """
+        Generate the link events replaying the trace of the link on both
+        directions, as (time, switch, command), lazily so that the trace is read
+        while it is replayed
+        """
+        characteristics = copy.copy(self.link_characteristics)
+        high_speed = self.topo.topo_parameter.get(TopoParameter.HIGH_SPEED) == "yes"
+        timer = float(self.topo.topo_parameter.get(TopoParameter.SHAPING_TIMER))
+        # In compact mode with netem shaping, the netem qdisc does it all
+        netem_rate = self.compact and characteristics.shapes_with_netem()
+        netem_interfaces = self.get_netem_interfaces()
+        shaping_interfaces, parent = self.get_shaping_interfaces()
+        for at, bandwidth, delay, loss in characteristics.trace.changes():
+            at = at / 1000.0
+            shaping_changed = bandwidth is not None and bandwidth != characteristics.bandwidth
+            if shaping_changed:
+                characteristics.bandwidth = bandwidth
+                if high_speed:
+                    characteristics.burst = get_tbf_burst(bandwidth, timer)
+            netem_changed = (delay is not None and delay != characteristics.delay) or \
+                (loss is not None and loss != characteristics.loss)
+            characteristics.delay = delay if delay is not None else characteristics.delay
+            characteristics.loss = loss if loss is not None else characteristics.loss
+
+            if shaping_changed and not netem_rate:
+                for bs, ifname in shaping_interfaces:
+                    for cmd in characteristics.build_shaping_cmds(ifname, replace=True, parent=parent):
+                        yield at, bs, cmd
+            if netem_changed or (shaping_changed and netem_rate):
+                for bs, ifname in netem_interfaces:
+                    yield at, bs, characteristics.build_netem_change_cmd(ifname, rate=netem_rate)
+
+    def schedule_trace(self, scheduler):
+        """
+        Add the replay of the trace of the link (if any) to `scheduler`, an
+        instance of LinkEventScheduler
+        """
+        if self.link_characteristics.trace is None:
+            return
+        logging.info("Will replay {} on {}".format(self.link_characteristics.trace, self.get_bs_name(0)))
+        scheduler.add_source("{}_{}".format(self.link_characteristics.link_type,
+            self.link_characteristics.id), self.get_trace_events())
+
+    def get_link_event_cmds(self, event):
+        """
+        Return the (node, command) implementing the LinkEvent `event`
+        """
+        if event.event in ("down", "up"):
+            return [(bs, "ip link set dev {} {}".format(ifname, event.event))
+                for bs, ifname in self.get_netem_interfaces()]
+        if event.event == "blackhole":
+            # Drop on the ingress of both ends, leaving the qdiscs of the link untouched
+            return [(bs, "tc qdisc add dev {} ingress; tc filter add dev {} parent ffff: protocol all matchall action drop".format(
+                ifname, ifname)) for bs, ifname in self.get_netem_interfaces()]
+        if event.event == "unblackhole":
+            return [(bs, "tc qdisc del dev {} ingress".format(ifname))
+                for bs, ifname in self.get_netem_interfaces()]
+
+        action = "-I" if event.event == "rst" else "-D"
+        # The experiment holds the shell of the endpoints while events fire
+        return [(self.topo.get_netns_shell(who), "; ".join([BottleneckLink.build_rst_cmd(action, chain, ifname)
+            for chain in ("INPUT", "FORWARD")])) for who, ifname in self.get_endpoint_interfaces()]
+
+    @staticmethod
+    def build_rst_cmd(action, chain, ifname):
+        return "iptables {} {} -i {} -p tcp -j REJECT --reject-with tcp-reset".format(
+            action, chain, ifname)
+
+    def get_endpoint_interfaces(self):
+        """
+        Return the (node, interface name) of the nodes connected to the link
+        """
+        interfaces = []
+        for name, mac in self.endpoints:
+            who = self.topo.get_host(name)
+            ifname = self.topo.get_interface_with_mac(who, mac)
+            if ifname is None:
+                logging.error("No interface of {} on link {}".format(name, self.get_bs_name(0)))
+                continue
+            interfaces.append((who, ifname))
+        return interfaces
+
+    def reset_bottleneck(self, batch=None):
+        """
+        Bring the link back to its initial configuration, undoing the netem
+        changes, trace replay and link events of a previous experiment. If no
+        batch is provided, the commands are run before returning.
+        """
+        own_batch = batch is None
+        if own_batch:
+            batch = self.topo.command_batch()
+
+        for bs, ifname in self.get_netem_interfaces():
+            batch.add(bs, "ip link set dev {} up".format(ifname))
+            batch.add(bs, "tc qdisc del dev {} ingress 2> /dev/null || true".format(ifname))
+        for who, ifname in self.get_endpoint_interfaces():
+            shell = self.topo.get_netns_shell(who)
+            for chain in ("INPUT", "FORWARD"):
+                batch.add(shell, "while {} 2> /dev/null; do :; done".format(
+                    BottleneckLink.build_rst_cmd("-D", chain, ifname)))
+        self.configure_bottleneck(batch=batch)
+        if own_batch:
+            batch.flush()
+
+    def schedule_link_events(self, scheduler):
+        """
+        Add the link events of the link (see LinkEvent) to `scheduler`, an
+        instance of LinkEventScheduler
+        """
+        characteristics = self.link_characteristics
+        for event in characteristics.link_events:
+            label = "{}_{} {}".format(characteristics.link_type, characteristics.id, event.event)
+            for who, cmd in self.get_link_event_cmds(event):
+                logging.info("At {}: {}".format(event.at, cmd))
+                scheduler.add(event.at, who, cmd, label=label)
 
     def get_left(self):
         return self.bs0
 
     def get_right(self):
-        return self.bs3
+        return self.bs1 if self.compact else self.bs3
 
 
 class Topo(object):
@@ -367,34 +876,51 @@ class Topo(object):
         topo_builder    instance of TopoBuilder
         topo_parameter  instance of TopoParameter
         change_netem    boolean indicating if netem must be changed
-        log_file        file descriptor logging commands relative to the topo
+        name_prefix     prefix of all node names, allowing several topologies to coexist
+        journal         instance of CommandJournal recording the commands relative to the topo
+        plan            when not None, the ConfigPlan recording the batched commands
+        manifest        instance of RunManifest accounting the commands run
     """
     MININET_BUILDER = "mininet"
+    NETNS_BUILDER = "netns"
     TOPO_ATTR = "topoType"
     SWITCH_NAME_PREFIX = "s"
     CLIENT_NAME_PREFIX = "Client"
     SERVER_NAME_PREFIX = "Server"
     ROUTER_NAME_PREFIX = "Router"
-    CMD_LOG_FILENAME = "command.log"
 
     def __init__(self, topo_builder, topo_parameter):
         self.topo_builder = topo_builder
         self.topo_parameter = topo_parameter
         self.change_netem = topo_parameter.get(TopoParameter.CHANGE_NETEM).lower() == "yes"
-        self.log_file = open(Topo.CMD_LOG_FILENAME, 'w')
+        self.name_prefix = topo_parameter.get(TopoParameter.NAME_PREFIX)
+        self.journal = self.open_journal(CommandJournal.FILENAME)
+        self.manifest = RunManifest()
+        self.plan = None
+        self.link_count = 0
         self.clients = []
         self.routers = []
         self.servers = []
         self.bottleneck_links = []
 
+    def get_node_name(self, node_name_prefix, index):
+        """
+        Without name prefix, nodes are named e.g. Client_0. With a name prefix,
+        a compact form is used instead (e.g., p01c0) such that interface names
+        ({node}-eth{n}) remain under the 15 characters limit of Linux.
+        """
+        if self.name_prefix:
+            return "{}{}{}".format(self.name_prefix, node_name_prefix[0].lower(), index)
+        return "{}_{}".format(node_name_prefix, index)
+
     def get_client_name(self, index):
-        return "{}_{}".format(Topo.CLIENT_NAME_PREFIX, index)
+        return self.get_node_name(Topo.CLIENT_NAME_PREFIX, index)
 
     def get_router_name(self, index):
-        return "{}_{}".format(Topo.ROUTER_NAME_PREFIX, index)
+        return self.get_node_name(Topo.ROUTER_NAME_PREFIX, index)
 
     def get_server_name(self, index):
-        return "{}_{}".format(Topo.SERVER_NAME_PREFIX, index)
+        return self.get_node_name(Topo.SERVER_NAME_PREFIX, index)
 
     def add_client(self):
         client = self.add_host(self.get_client_name(self.client_count()))
@@ -414,16 +940,80 @@ class Topo(object):
     def get_link_characteristics(self):
         return self.topo_parameter.link_characteristics
 
+    def open_journal(self, path):
+        return CommandJournal(path,
+            max_output=int(self.topo_parameter.get(TopoParameter.JOURNAL_OUTPUT)))
+
     def command_to(self, who, cmd):
-        self.log_file.write("{} : {}\n".format(who, cmd))
-        return self.topo_builder.command_to(who, cmd)
+        """
+        Run `cmd` on `who` and return its output. Single-line commands are run as
+        a batch of one command, so that the journal gets their exit code.
+        """
+        if "\n" not in cmd:
+            return self.command_batch_to(who, [cmd])[0].output
+
+        start = time.monotonic()
+        with self.manifest.command("command_to"):
+            output = self.topo_builder.command_to(who, cmd)
+        self.journal.record(who, cmd, start, time.monotonic(), output=output)
+        return output
+
+    def command_batch_to(self, who, cmds):
+        """
+        Run all the commands of the list `cmds` on `who` with a single shell
+        invocation (or one per MAX_SCRIPT_SIZE bytes of script, see split_batch),
+        and return the list of their CommandResult
+        """
+        results = []
+        for chunk in split_batch(cmds):
+            script = build_batch_script(chunk)
+            if len(script.encode()) > MAX_SCRIPT_SIZE:
+                logging.warning("Command of {} bytes sent to {}, it may be truncated: {}".format(
+                    len(script.encode()), who, chunk[0]))
+            start = time.monotonic()
+            with self.manifest.command("command_to"):
+                output = self.topo_builder.command_to(who, script)
+            chunk_results = parse_batch_output(chunk, output)
+            self.journal.record_results(who, chunk_results, start, time.monotonic())
+            results += chunk_results
+        return results
+
+    def get_netns_path(self, who):
+        """
+        Return the path of the network namespace of `who`, or None if unknown
+        """
+        return self.topo_builder.get_netns_path(who)
+
+    def get_netns_shell(self, who):
+        """
+        Return a NetnsShell running commands in the namespace of `who` without its
+        shell, or `who` itself if its namespace is unknown
+        """
+        netns_path = self.get_netns_path(who)
+        if netns_path is None:
+            logging.warning("Unknown namespace of {}, using its shell".format(who))
+            return who
+        return NetnsShell(who, netns_path)
+
+    def command_batch(self, parallel=True):
+        """
+        Return a new CommandBatch running its commands in this topo, or recording
+        them in the plan being compiled
+        """
+        if self.plan is not None:
+            return PlanBatch(self.plan)
+
+        return CommandBatch(self, parallel=parallel)
 
     def command_global(self, cmd):
         """
         mainly use for not namespace sysctl.
         """
-        self.log_file.write("Global : {}\n".format(cmd))
-        return self.topo_builder.command_global(cmd)
+        start = time.monotonic()
+        with self.manifest.command("command_global"):
+            output = self.topo_builder.command_global(cmd)
+        self.journal.record("Global", cmd, start, time.monotonic(), output=output)
+        return output
 
     def client_count(self):
         return len(self.clients)
@@ -458,7 +1048,41 @@ class Topo(object):
     def add_switch(self, switch):
         return self.topo_builder.add_switch(switch)
 
+    def get_interface_with_mac(self, who, mac):
+        """
+        Return the name of the interface of `who` having the MAC address `mac`,
+        or None
+        """
+        for ifname in self.get_interface_names(who):
+            if who.intf(ifname).MAC() == mac:
+                return ifname
+        return None
+
+    def get_link_macs(self, link_index):
+        """
+        Return the MAC addresses of both ends of the link `link_index`. They are
+        deterministic, so that the configuration of the network (e.g., neighbor
+        entries) only depends on the topology.
+        """
+        return ["02:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}".format(end, (link_index >> 24) & 0xff,
+            (link_index >> 16) & 0xff, (link_index >> 8) & 0xff, link_index & 0xff)
+            for end in (1, 2)]
+
+    def get_link_options(self):
+        """
+        Return the options passed to the builder for all the links. With several
+        link queues, `queues` asks for multi-queue veth interfaces.
+        """
+        queues = int(self.topo_parameter.get(TopoParameter.LINK_QUEUES))
+        return {"queues": queues} if queues > 1 else {}
+
     def add_link(self, from_a, to_b, **kwargs):
+        addr1, addr2 = self.get_link_macs(self.link_count)
+        self.link_count += 1
+        kwargs.setdefault("addr1", addr1)
+        kwargs.setdefault("addr2", addr2)
+        for key, value in self.get_link_options().items():
+            kwargs.setdefault(key, value)
         self.topo_builder.add_link(from_a, to_b, **kwargs)
 
     def add_bottleneck_link(self, from_a, to_b, link_characteristics=None, bottleneck_link=None):
@@ -470,8 +1094,10 @@ class Topo(object):
             bottleneck_link = BottleneckLink(self.topo_builder, self, link_characteristics)
             self.bottleneck_links.append(bottleneck_link)
 
-        self.topo_builder.add_link(from_a, bottleneck_link.get_left())
-        self.topo_builder.add_link(bottleneck_link.get_right(), to_b)
+        bottleneck_link.endpoints.append((from_a, self.get_link_macs(self.link_count)[0]))
+        self.add_link(from_a, bottleneck_link.get_left())
+        bottleneck_link.endpoints.append((to_b, self.get_link_macs(self.link_count)[1]))
+        self.add_link(bottleneck_link.get_right(), to_b)
         return bottleneck_link
 
     def reinit_variables(self):
@@ -482,17 +1108,37 @@ class Topo(object):
         for b in self.bottleneck_links:
             b.reinit_variables()
 
+    def set_working_directory(self, path):
+        """
+        Make `path` the working directory of the orchestrator and of all the hosts
+        """
+        # Each directory gets the journal of the commands run from it, including
+        # the cd of the hosts
+        self.close_journal()
+        self.journal = self.open_journal(os.path.join(path, CommandJournal.FILENAME))
+        os.chdir(path)
+        for host in self.clients + self.routers + self.servers:
+            self.command_to(host, "cd {}".format(path))
+
     def get_cli(self):
         self.topo_builder.get_cli()
 
     def start_network(self):
         self.topo_builder.start_network()
 
-    def close_log_file(self):
-        self.log_file.close()
+    def restart_network(self):
+        """
+        Stop the network and start it again, keeping the journal open
+        """
+        self.topo_builder.stop_network()
+        self.topo_builder.start_network()
+
+    def close_journal(self):
+        self.journal.close()
 
     def stop_network(self):
         self.topo_builder.stop_network()
+        self.close_journal()
 
 
 class TopoConfig(object):
@@ -508,26 +1154,95 @@ class TopoConfig(object):
 
     def configure_network(self):
         self.topo.reinit_variables()
+        if self.param.get(TopoParameter.CONFIG_PLAN) == "yes":
+            self.configure_network_with_plan()
+            return
+
         self.disable_tso()
         logging.debug("Configure network in TopoConfig")
         self.configure_interfaces()
         self.configure_routing()
 
+    def get_plan_hash(self):
+        """
+        Return a hash of everything determining the configuration plan of the topology
+        """
+        plan_inputs = {
+            "version": ConfigPlan.VERSION,
+            "builder": self.topo.topo_builder.__class__.__name__,
+            "topo": self.topo.__class__.__name__,
+            "config": self.__class__.__name__,
+            "parameters": self.param.as_dict(),
+        }
+        return hashlib.sha256(json.dumps(plan_inputs, sort_keys=True).encode()).hexdigest()
+
+    def configure_network_with_plan(self):
+        """
+        Configure the network by applying per-node ip/tc batch files (see
+        core.plan). The configuration is still compiled, as it initializes the
+        attributes of the TopoConfig, but the batch files are only written the
+        first time the topology boots.
+        """
+        plan = ConfigPlan(os.path.join(os.path.expanduser(
+            self.param.get(TopoParameter.CONFIG_PLAN_DIR)), self.get_plan_hash()))
+        self.topo.plan = plan
+        try:
+            self.disable_tso()
+            self.configure_interfaces()
+            self.configure_routing()
+        finally:
+            self.topo.plan = None
+
+        commands = plan.load()
+        if commands is None:
+            logging.info("Write configuration plan in {}".format(plan.directory))
+            commands = plan.write()
+        else:
+            logging.info("Replay configuration plan of {}".format(plan.directory))
+
+        apply_plan_commands(self.topo, commands)
+
+    def keep_offloads(self):
+        """
+        In high-speed mode with keepOffloads, TSO, GSO and GRO are kept when the
+        tbf burst of every link holds the largest GSO packet, as shaping then
+        remains accurate. As a node interface carries traffic to several links,
+        this is decided for the whole topology.
+        """
+        if self.param.get(TopoParameter.HIGH_SPEED) != "yes" or \
+                self.param.get(TopoParameter.KEEP_OFFLOADS) != "yes":
+            return False
+
+        small_bursts = [l for l in self.topo.get_link_characteristics()
+            if l.burst < LinkCharacteristics.GSO_MAX_SIZE]
+        for l in small_bursts:
+            logging.info("Burst of link {}_{} is too small to keep offloads: {} bytes".format(
+                l.link_type, l.id, l.burst))
+        return len(small_bursts) == 0
+
     def disable_tso(self):
         """
-        Disable TSO, GSO and GRO on all interfaces
+        Disable TSO, GSO and GRO on all interfaces, unless they can be kept (see
+        keep_offloads)
         """
+        if self.keep_offloads():
+            logging.info("Keep TSO, GSO and GRO on all interfaces of all nodes")
+            return
+
         logging.info("Disable TSO, GSO and GRO on all interfaces of all nodes")
+        batch = self.topo.command_batch()
         for node in [self.topo.get_host(n) for n in self.topo.topo_builder.net]:
             for intf in self.topo.get_interface_names(node):
                 logging.debug("Disable TSO, GSO and GRO on interface {}".format(intf))
-                cmd = "ethtool -K {} tso off; ethtool -K {} gso off; ethtool -K {} gro off".format(intf, intf, intf)
+                cmd = "ethtool -K {} tso off gso off gro off".format(intf)
                 logging.debug(cmd)
-                self.topo.command_to(node, cmd)
+                batch.add(node, cmd)
+        batch.flush()
 
-    def run_netem_at(self):
+    def schedule_netem_at(self, scheduler):
         """
-        Prepare netem commands to be run after some delay
+        Add the netem changes of all the links to `scheduler`, an instance of
+        LinkEventScheduler
         """
         if not self.topo.change_netem:
             # Just rely on defaults of TCLink
@@ -536,14 +1251,45 @@ class TopoConfig(object):
 
         logging.info("Will change netem config on the fly")
         for b in self.topo.bottleneck_links:
-            b.configure_changing_bottleneck()
+            b.schedule_changing_bottleneck(scheduler)
+
+    def schedule_traces(self, scheduler):
+        """
+        Add the replay of the traces of all the links to `scheduler`, an instance
+        of LinkEventScheduler
+        """
+        for b in self.topo.bottleneck_links:
+            b.schedule_trace(scheduler)
+
+    def schedule_link_events(self, scheduler):
+        """
+        Add the link events (failures and recoveries) of all the links to
+        `scheduler`, an instance of LinkEventScheduler
+        """
+        for b in self.topo.bottleneck_links:
+            b.schedule_link_events(scheduler)
 
     def configure_interfaces(self):
         """
         Function to inherit to configure the interfaces of the topology
+
+        All the bottleneck links are configured concurrently. Their interfaces
+        were just created, so there is no qdisc to delete first.
         """
+        batch = self.topo.command_batch()
         for b in self.topo.bottleneck_links:
-            b.configure_bottleneck()
+            b.configure_bottleneck(batch=batch, clean=False)
+        batch.flush()
+
+    def reset_bottlenecks(self):
+        """
+        Bring all the bottleneck links back to their initial configuration, e.g.,
+        between two experiments run on the same network
+        """
+        batch = self.topo.command_batch()
+        for b in self.topo.bottleneck_links:
+            b.reset_bottleneck(batch=batch)
+        batch.flush()
 
     def configure_routing(self):
         """
@@ -592,7 +1338,9 @@ class TopoConfig(object):
             interface_name)
 
     def interface_up_command(self, interface_name, ip, subnet):
-        return "ifconfig {} {} netmask {}".format(interface_name, ip, subnet)
+        prefix_length = sum([bin(int(b)).count("1") for b in subnet.split(".")])
+        return "ip addr flush dev {}; ip addr add {}/{} brd + dev {}; ip link set dev {} up".format(
+            interface_name, ip, prefix_length, interface_name, interface_name)
 
     def add_table_route_command(self, from_ip, id):
         return "ip rule add from {} table {}".format(from_ip, id + 1)
@@ -610,5 +1358,8 @@ class TopoConfig(object):
     def arp_command(self, ip, mac):
         return "arp -s {} {}".format(ip, mac)
 
+    def neighbor_command(self, ip, mac, interface_name):
+        return "ip neigh replace {} lladdr {} nud permanent dev {}".format(ip, mac, interface_name)
+
     def add_simple_default_route_command(self, via):
         return "ip route add default via {}".format(via)
@@ -0,0 +1,193 @@
+from .files import map_file
+
+import math
+import struct
+
+
+class LinkTrace(object):
+    """
+    Recorded evolution of the bandwidth (Mbps), delay (ms) and loss rate (%) of
+    a link, replayed by BottleneckLink.
+
+    Three formats are read, all memory-mapped and parsed lazily so that long
+    traces are never loaded as a whole:
+        - Mahimahi traces: one line per delivery opportunity, giving the time
+          (in ms) at which one MTU-sized packet can be delivered. They only
+          describe the bandwidth.
+        - Time series (files ending in .csv): lines "{time_ms},{bandwidth}[,{delay}[,{loss}]]",
+          an empty or missing field leaving the value unchanged. Lines starting
+          with # are comments.
+        - Binary traces (files starting with BINARY_MAGIC, see write_binary):
+          little-endian records of RECORD_FORMAT (time in ms, bandwidth, delay,
+          loss), NaN leaving the value unchanged.
+
+    Samples are decimated to one per `interval` ms (the bandwidth of Mahimahi
+    traces being computed over each interval), and only changes are kept.
+
+    Attributes:
+        path        path of the trace file
+        interval    decimation interval, in ms
+        format      one of MAHIMAHI, TIME_SERIES, BINARY
+    """
+    MAHIMAHI = "mahimahi"
+    TIME_SERIES = "csv"
+    BINARY = "binary"
+    BINARY_MAGIC = b"MTTRACE1"
+    RECORD_FORMAT = "<dfff"
+    MTU = 1500
+    DEFAULT_INTERVAL = 10
+    # tbf and netem do not accept a null rate, e.g., during Mahimahi outages
+    MIN_BANDWIDTH = 0.01
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.interval = float(interval)
+        if self.interval <= 0:
+            raise ValueError("Invalid trace interval {}".format(interval))
+        self.format = self.detect_format()
+
+    def detect_format(self):
+        with open(self.path, "rb") as f:
+            if f.read(len(LinkTrace.BINARY_MAGIC)) == LinkTrace.BINARY_MAGIC:
+                return LinkTrace.BINARY
+        if self.path.endswith(".csv"):
+            return LinkTrace.TIME_SERIES
+        return LinkTrace.MAHIMAHI
+
+    def get_lines(self):
+        data = map_file(self.path)
+        if len(data) == 0:
+            return
+        for line in iter(data.readline, b""):
+            line = line.strip()
+            if line and not line.startswith(b"#"):
+                yield line
+
+    def get_mahimahi_samples(self):
+        """
+        Generate the bandwidth of each interval, up to the last delivery opportunity
+        """
+        index, opportunities = 0, 0
+        for line in self.get_lines():
+            time = float(line)
+            while time >= (index + 1) * self.interval:
+                yield index * self.interval, self.get_mahimahi_bandwidth(opportunities), None, None
+                index, opportunities = index + 1, 0
+            opportunities += 1
+        if opportunities > 0:
+            yield index * self.interval, self.get_mahimahi_bandwidth(opportunities), None, None
+
+    def get_mahimahi_bandwidth(self, opportunities):
+        return opportunities * LinkTrace.MTU * 8 / (self.interval * 1000.0)
+
+    def get_time_series_samples(self):
+        for line in self.get_lines():
+            fields = [f.strip() for f in line.decode().split(",")]
+            values = [float(f) if f else None for f in fields[1:4]]
+            values += [None] * (3 - len(values))
+            yield (float(fields[0]),) + tuple(values)
+
+    def get_binary_samples(self):
+        data = map_file(self.path)
+        record_size = struct.calcsize(LinkTrace.RECORD_FORMAT)
+        start = len(LinkTrace.BINARY_MAGIC)
+        end = start + (len(data) - start) // record_size * record_size
+        for record in struct.iter_unpack(LinkTrace.RECORD_FORMAT, memoryview(data)[start:end]):
+            yield tuple(None if math.isnan(v) else v for v in record)
+
+    def samples(self):
+        """
+        Generate the samples of the trace, as (time in ms, bandwidth, delay, loss),
+        None standing for an unchanged value
+        """
+        if self.format == LinkTrace.MAHIMAHI:
+            return self.get_mahimahi_samples()
+        if self.format == LinkTrace.BINARY:
+            return self.get_binary_samples()
+        return self.get_time_series_samples()
+
+    def changes(self):
+        """
+        Generate the changes of the trace, one per interval at most, as (time in
+        ms, bandwidth, delay, loss), None standing for an unchanged value. Within
+        an interval, the last value of each field wins.
+        """
+        current = [None, None, None]
+        pending, pending_index = None, None
+        for sample in self.samples():
+            index = int(sample[0] // self.interval)
+            if index != pending_index:
+                if pending is not None:
+                    change = self.get_change(current, pending)
+                    if change is not None:
+                        yield (pending_index * self.interval,) + change
+                pending, pending_index = [None, None, None], index
+            for i, value in enumerate(sample[1:]):
+                if value is not None:
+                    pending[i] = value
+        if pending is not None:
+            change = self.get_change(current, pending)
+            if change is not None:
+                yield (pending_index * self.interval,) + change
+
+    def get_change(self, current, values):
+        """
+        Return the fields of `values` differing from `current` (others being None),
+        or None if there is no difference. `current` is updated.
+        """
+        change = [None, None, None]
+        for i, value in enumerate(values):
+            if value is not None and value != current[i]:
+                current[i] = change[i] = value
+        if change[0] is not None:
+            change[0] = max(change[0], LinkTrace.MIN_BANDWIDTH)
+        return tuple(change) if change != [None, None, None] else None
+
+    def first_change(self):
+        """
+        Return the first change of the trace (see changes), or None for an empty trace
+        """
+        return next(self.changes(), None)
+
+    def write_binary(self, path):
+        """
+        Write the changes of the trace in the binary format, and return their number
+        """
+        count = 0
+        record = struct.Struct(LinkTrace.RECORD_FORMAT)
+        with open(path, "wb") as f:
+            f.write(LinkTrace.BINARY_MAGIC)
+            for change in self.changes():
+                f.write(record.pack(*[float("nan") if v is None else v for v in change]))
+                count += 1
+        return count
+
+    def __str__(self):
+        return "{} trace {} (interval {} ms)".format(self.format, self.path, self.interval)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or convert link traces")
+    parser.add_argument("trace", help="path to the trace file")
+    parser.add_argument("--interval", "-i", type=float, default=LinkTrace.DEFAULT_INTERVAL,
+        help="decimation interval, in ms")
+    parser.add_argument("--convert", "-c", metavar="OUTPUT",
+        help="write the decimated trace in the binary format to OUTPUT")
+
+    args = parser.parse_args()
+    trace = LinkTrace(args.trace, interval=args.interval)
+    if args.convert:
+        print("{} changes written to {}".format(trace.write_binary(args.convert), args.convert))
+    else:
+        count, last, low, high = 0, None, None, None
+        for change in trace.changes():
+            count, last = count + 1, change[0]
+            if change[1] is not None:
+                low = change[1] if low is None else min(low, change[1])
+                high = change[1] if high is None else max(high, change[1])
+        print(trace)
+        print("{} changes over {} ms".format(count, last))
+        if low is not None:
+            print("bandwidth from {:.3f} to {:.3f} Mbps".format(low, high))
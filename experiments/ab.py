@@ -21,7 +21,9 @@ class AB(RandomFileExperiment):
     SERVER_LOG = "ab_server.log"
     CLIENT_LOG = "ab_client.log"
     AB_BIN = "ab"
+    PORT = 80
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS, ab="ab -V")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(AB, self).__init__(experiment_parameter_filename, topo, topo_config)
@@ -57,7 +59,7 @@ class AB(RandomFileExperiment):
         cmd = self.get_ab_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
         print("Wait for the HTTP server to be up, this can take quite a while...")
-        self.topo.command_to(self.topo_config.client, "sleep 15")
+        self.wait_for_port(self.topo_config.server, AB.PORT, timeout=60)
         cmd = self.get_ab_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, AB.PORT)
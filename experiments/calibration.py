@@ -0,0 +1,121 @@
+from core.experiment import Experiment, ExperimentParameter
+from topos.multi_interface import MultiInterfaceTopo
+import json
+import logging
+
+
+class CalibrationParameter(ExperimentParameter):
+    TIME = "calibrationTime"
+    PARALLEL = "calibrationParallel"
+    TOLERANCE = "calibrationTolerance"  # accepted relative shortfall of the rate
+
+    def __init__(self, experiment_parameter_filename):
+        super(CalibrationParameter, self).__init__(experiment_parameter_filename)
+        self.default_parameters.update({
+            CalibrationParameter.TIME: "10",
+            CalibrationParameter.PARALLEL: "4",
+            CalibrationParameter.TOLERANCE: "0.05",
+        })
+
+
+class Calibration(Experiment):
+    """
+    Check that each client to router path reaches its configured rate, e.g., to
+    validate the high-speed mode of the topology (see TopoParameter.HIGH_SPEED).
+
+    Paths are saturated one after the other with iperf3 from the client IP of
+    the path, and the rate received by the server is compared with the bandwidth
+    of the path in REPORT_FILE. Router to server links should not be the
+    bottleneck, e.g., by not specifying any.
+    """
+    NAME = "calibration"
+    PARAMETER_CLASS = CalibrationParameter
+
+    IPERF_BIN = "iperf3"
+    PORT = 5201
+    SERVER_LOG = "calibration_server.log"
+    CLIENT_OUTPUT = "calibration_{}.json"
+    REPORT_FILE = "calibration.json"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, iperf3="iperf3 --version")
+
+    def __init__(self, experiment_parameter_filename, topo, topo_config):
+        super(Calibration, self).__init__(experiment_parameter_filename, topo, topo_config)
+        self.load_parameters()
+
+    def load_parameters(self):
+        super(Calibration, self).load_parameters()
+        self.time = self.experiment_parameter.get(CalibrationParameter.TIME)
+        self.parallel = self.experiment_parameter.get(CalibrationParameter.PARALLEL)
+        self.tolerance = float(self.experiment_parameter.get(CalibrationParameter.TOLERANCE))
+
+    def prepare(self):
+        super(Calibration, self).prepare()
+        if not isinstance(self.topo, MultiInterfaceTopo):
+            raise Exception("Calibration only runs with MultiInterfaceTopo")
+
+        self.topo.command_to(self.topo_config.server, "rm {}".format(Calibration.SERVER_LOG))
+        for i, _ in enumerate(self.topo.c2r_links):
+            self.topo.command_to(self.topo_config.client, "rm {}".format(
+                Calibration.CLIENT_OUTPUT.format(i)))
+
+    def get_server_cmd(self):
+        s = "{} -s -p {} &> {} &".format(Calibration.IPERF_BIN, Calibration.PORT,
+            Calibration.SERVER_LOG)
+        logging.info(s)
+        return s
+
+    def get_client_cmd(self, path_index):
+        s = "{} -c {} -p {} -B {} -t {} -P {} -J > {}".format(Calibration.IPERF_BIN,
+            self.topo_config.get_server_ip(), Calibration.PORT,
+            self.topo_config.get_client_ip(path_index), self.time, self.parallel,
+            Calibration.CLIENT_OUTPUT.format(path_index))
+        logging.info(s)
+        return s
+
+    def get_measured_rate(self, path_index):
+        """
+        Return the rate (in Mbps) received by the server on the path, or None if
+        the iperf3 output cannot be read
+        """
+        try:
+            with open(Calibration.CLIENT_OUTPUT.format(path_index)) as f:
+                output = json.load(f)
+            return output["end"]["sum_received"]["bits_per_second"] / 1000000.0
+        except (IOError, OSError, ValueError, KeyError) as e:
+            logging.error("Unable to read the iperf3 output of path {}: {}".format(path_index, e))
+            return None
+
+    def write_report(self):
+        paths = []
+        for i, link in enumerate(self.topo.c2r_links):
+            characteristics = link.link_characteristics
+            configured = float(characteristics.bandwidth)
+            measured = self.get_measured_rate(i)
+            ratio = measured / configured if measured is not None else None
+            reached = ratio is not None and ratio >= 1.0 - self.tolerance
+            paths.append({
+                "link": "{}_{}".format(characteristics.link_type, characteristics.id),
+                "configured_mbps": configured,
+                "measured_mbps": measured,
+                "ratio": ratio,
+                "burst": characteristics.burst,
+                "reached": reached,
+            })
+            log = logging.info if reached else logging.warning
+            log("Path {}: {} Mbps configured, {} Mbps measured".format(i, configured, measured))
+
+        with open(Calibration.REPORT_FILE, "w") as f:
+            json.dump({"time": float(self.time), "parallel": int(self.parallel),
+                "tolerance": self.tolerance, "paths": paths}, f, indent=4)
+
+    def clean(self):
+        super(Calibration, self).clean()
+        self.topo.command_to(self.topo_config.server, "pkill -f '{} -s'".format(Calibration.IPERF_BIN))
+
+    def run(self):
+        self.topo.command_to(self.topo_config.server, self.get_server_cmd())
+        self.wait_for_port(self.topo_config.server, Calibration.PORT)
+        for i, _ in enumerate(self.topo.c2r_links):
+            self.topo.command_to(self.topo_config.client, self.get_client_cmd(i))
+
+        self.write_report()
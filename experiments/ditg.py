@@ -30,7 +30,12 @@ class DITG(Experiment):
     DITG_SERVER_LOG = "ditg_server.log"
     ITGDEC_BIN = "/home/mininet/D-ITG-2.8.1-r1023/bin/ITGDec"
     ITGRECV_BIN = "/home/mininet/D-ITG-2.8.1-r1023/bin/ITGRecv"
+    # TCP port of the signaling channel of ITGRecv
+    PORT = 9000
     ITGSEND_BIN = "/home/mininet/D-ITG-2.8.1-r1023/bin/ITGSend"
+    # D-ITG has no version option, its binaries identify it
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS,
+        ditg="sha256sum {} {} {}".format(ITGSEND_BIN, ITGRECV_BIN, ITGDEC_BIN))
     DITG_TEMP_LOG = "snd_log_file"
     DITG_SERVER_TEMP_LOG = "recv_log_file"
     PING_OUTPUT = "ping.log"
@@ -39,7 +44,8 @@ class DITG(Experiment):
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(DITG, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         self.kbytes = self.experiment_parameter.get(DITGParameter.KBYTES)
@@ -84,9 +90,9 @@ class DITG(Experiment):
         cmd = self.get_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, DITG.PORT)
         cmd = self.get_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
         self.topo.command_to(self.topo_config.server, "pkill -9 -f ITGRecv")
         self.topo.command_to(self.topo_config.server, DITG.ITGDEC_BIN + " " + DITG.DITG_SERVER_TEMP_LOG + " &> " + DITG.DITG_SERVER_LOG)
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, DITG.PORT)
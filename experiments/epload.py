@@ -18,13 +18,18 @@ class Epload(Experiment):
     SERVER_LOG = "http_server.log"
     EPLOAD_LOG = "epload.log"
     NODE_BIN = "/usr/local/nodejs/bin/node"
+    PORT = 80
     EPLOAD_EMULATOR="/home/mininet/epload/epload/emulator/run.js"
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS,
+        node="{} --version".format(NODE_BIN),
+        epload="git -C {} rev-parse HEAD".format(os.path.dirname(EPLOAD_EMULATOR)))
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(Epload, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         self.test_dir = self.experiment_parameter.get(EploadParameter.TEST_DIR)
@@ -73,7 +78,7 @@ class Epload(Experiment):
     def run(self):
         cmd = self.get_http_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Epload.PORT)
 
         cmd = self.getSubHostCmd()
         self.topo.command_to(self.topo_config.client, cmd)
@@ -82,6 +87,6 @@ class Epload(Experiment):
         cmd = self.getSubBackHostCmd()
         self.topo.command_to(self.topo_config.client, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Epload.PORT)
         cmd = self.getKillHTTPCmd()
         self.topo.command_to(self.topo_config.server, cmd)
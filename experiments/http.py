@@ -8,6 +8,9 @@ class HTTP(RandomFileExperiment):
     SERVER_LOG = "http_server.log"
     CLIENT_LOG = "http_client.log"
     WGET_BIN = "wget"
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS,
+        wget="wget --version | head -n 1", python3="python3 --version")
+    PORT = 80
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
@@ -44,10 +47,10 @@ class HTTP(RandomFileExperiment):
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_before")
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, HTTP.PORT)
         cmd = self.get_http_client_cmd()
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         self.topo.command_to(self.topo_config.client, cmd)
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_after")
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_after")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, HTTP.PORT)
@@ -7,6 +7,9 @@ class HTTPS(RandomFileExperiment):
     SERVER_LOG = "https_server.log"
     CLIENT_LOG = "https_client.log"
     WGET_BIN = "wget"
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS,
+        wget="wget --version | head -n 1", python="python --version 2>&1")
+    PORT = 443
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
@@ -45,11 +48,11 @@ class HTTPS(RandomFileExperiment):
         self.topo.command_to(self.topo_config.server, cmd)
 
         print("Waiting for the server to run")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, HTTPS.PORT)
         cmd = self.getHTTPSClientCmd()
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         self.topo.command_to(self.topo_config.client, cmd)
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_after")
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_after")
         self.topo.command_to(self.topo_config.server, "pkill -f https_server.py")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, HTTPS.PORT)
@@ -21,12 +21,15 @@ class IPerf(Experiment):
     IPERF_LOG = "iperf.log"
     SERVER_LOG = "server.log"
     IPERF_BIN = "iperf"
+    PORT = 5001
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, iperf="iperf --version")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(IPerf, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         self.time = self.experiment_parameter.get(IPerfParameter.TIME)
@@ -55,7 +58,7 @@ class IPerf(Experiment):
         cmd = self.get_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, IPerf.PORT)
         cmd = self.get_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, IPerf.PORT)
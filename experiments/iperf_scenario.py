@@ -21,12 +21,15 @@ class IPerfScenario(Experiment):
     IPERF_LOG = "iperf.log"
     SERVER_LOG = "server.log"
     IPERF_BIN = "iperf"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, iperf="iperf --version")
+    PORT = 5001
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(IPerfScenario, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         super(IPerfScenario, self).load_parameters()
@@ -63,7 +66,8 @@ class IPerfScenario(Experiment):
         # And set nb of subflows for fullmesh
         self.topo.command_to(self.topo_config.client, "echo {} > /sys/module/mptcp_fullmesh/parameters/num_subflows".format(self.fm_subflows))
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        for s in self.topo_config.servers:
+            self.wait_for_port(s, IPerfScenario.PORT)
 
         # We run as follow.
         logging.info("This experiment last about 1 minute. Please wait...")
@@ -77,8 +81,8 @@ class IPerfScenario(Experiment):
         self.topo.command_to(self.topo_config.client, "sleep 2")
 
         # This is hacky
-        self.topo.command_global("sysctl -w net.mptcp.mptcp_enabled=0")
-        self.topo.command_global("sysctl -w net.ipv4.tcp_congestion_control=reno")
+        self.write_sysctls({"net.mptcp.mptcp_enabled": "0",
+            "net.ipv4.tcp_congestion_control": "reno"})
         
         self.topo.command_to(self.topo_config.client, "sleep 50")
 
@@ -25,12 +25,15 @@ class Msg(Experiment):
     SERVER_LOG = "msg_server.log"
     CLIENT_LOG = "msg_client.log"
     CLIENT_ERR = "msg_client.err"
+    PORT = 8000
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, python="python --version 2>&1")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(Msg, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         self.client_sleep = self.experiment_parameter.get(MsgParameter.CLIENT_SLEEP)
@@ -67,11 +70,11 @@ class Msg(Experiment):
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_before")
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Msg.PORT)
         cmd = self.get_msg_client_cmd()
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         self.topo.command_to(self.topo_config.client, cmd)
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_after")
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_after")
         self.topo.command_to(self.topo_config.server, "pkill -f msg_server.py")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Msg.PORT)
@@ -30,6 +30,7 @@ class NC(Experiment):
     SERVER_NC_LOG = "netcat_server"
     CLIENT_NC_LOG = "netcat_client"
     NC_BIN = "netcat"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, nc="netcat -h 2>&1 | head -n 1")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(NC, self).__init__(experiment_parameter_filename, topo, topo_config)
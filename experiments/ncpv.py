@@ -40,12 +40,16 @@ class NCPV(NC):
     CLIENT_NC_LOG = "netcat_client"
     NC_BIN = "/usr/local/bin/nc"
     PV_BIN = "/usr/local/bin/pv"
+    VERSION_COMMANDS = dict(NC.VERSION_COMMANDS,
+        nc="{} -h 2>&1 | head -n 1".format(NC_BIN),
+        pv="{} --version | head -n 1".format(PV_BIN))
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(NCPV, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def ping(self):
         self.topo.command_to(self.topo_config.client, "rm " + \
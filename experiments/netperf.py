@@ -24,12 +24,15 @@ class Netperf(Experiment):
     NETSERVER_LOG = "netserver.log"
     NETPERF_BIN = "netperf"
     NETSERVER_BIN = "netserver"
+    PORT = 12865
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, netperf="netperf -V")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(Netperf, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def ping(self):
         self.topo.command_to(self.topo_config.client, "rm " + \
@@ -77,7 +80,7 @@ class Netperf(Experiment):
         cmd = self.get_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Netperf.PORT)
         cmd = self.get_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Netperf.PORT)
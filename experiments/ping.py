@@ -4,6 +4,7 @@ class Ping(Experiment):
     NAME = "ping"
 
     PING_OUTPUT = "ping.log"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, ping="ping -V")
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(Ping, self).__init__(experiment_parameter_filename, topo, topo_config)
@@ -23,15 +23,19 @@ class PQUIC(Experiment):
     PARAMETER_CLASS = PQUICParameter
 
     BIN = "~/pquic/picoquicdemo"
+    # picoquicdemo has no version option, its binary identifies it
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS, pquic="sha256sum {}".format(BIN))
     CERT_FILE = "~/pquic/certs/cert.pem"
     KEY_FILE = "~/pquic/certs/key.pem"
     SERVER_LOG = "pquic_server.log"
     CLIENT_LOG = "pquic_client.log"
+    PORT = 4443
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(PQUIC, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def load_parameters(self):
         super(PQUIC, self).load_parameters()
@@ -72,7 +76,7 @@ class PQUIC(Experiment):
         cmd = self.get_pquic_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, PQUIC.PORT, protocol="udp")
 
         cmd = self.get_pquic_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
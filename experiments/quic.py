@@ -24,6 +24,13 @@ class QUIC(RandomFileExperiment):
     CLIENT_GO_FILE = "~/go/src/github.com/lucas-clemente/quic-go/example/client_benchmarker_cached/main.go"
     SERVER_GO_FILE = "~/go/src/github.com/lucas-clemente/quic-go/example/main.go"
     CERTPATH = "~/go/src/github.com/lucas-clemente/quic-go/example/"
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS,
+        go="{} version".format(GO_BIN),
+        quic_go="git -C {} rev-parse HEAD".format(CERTPATH),
+        wget="{} --version | head -n 1".format(WGET),
+        python="python --version 2>&1")
+    PORT = 6121
+    CONG_SERVER_PORT = 443
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
@@ -67,7 +74,7 @@ class QUIC(RandomFileExperiment):
         s = QUIC.GO_BIN + " run " + QUIC.CLIENT_GO_FILE
         if int(self.multipath) > 0:
             s += " -m"
-        s += " https://" + self.topo_config.get_server_ip() + ":6121/random &>" + QUIC.CLIENT_LOG
+        s += " https://" + self.topo_config.get_server_ip() + ":" + str(QUIC.PORT) + "/random &>" + QUIC.CLIENT_LOG
         print(s)
         return s
 
@@ -98,7 +105,11 @@ class QUIC(RandomFileExperiment):
                 self.topo.command_to(cs, cmd)
                 i = i + 1
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        # go run compiles the server first, this can take a while
+        self.wait_for_port(self.topo_config.server, QUIC.PORT, protocol="udp", timeout=120)
+        if isinstance(self.topo_config, MultiInterfaceMultiClientConfig):
+            for cs in self.topo_config.cong_servers:
+                self.wait_for_port(cs, QUIC.CONG_SERVER_PORT)
 
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         # First run congestion clients, then the main one
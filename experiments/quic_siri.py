@@ -21,13 +21,18 @@ class QUICSiri(Experiment):
     SERVER_LOG = "quic_server.log"
     CLIENT_LOG = "quic_client.log"
     CLIENT_GO_FILE = "~/go/src/github.com/lucas-clemente/quic-go/example/siri/client/siri.go"
+    PORT = 8080
     SERVER_GO_FILE = "~/go/src/github.com/lucas-clemente/quic-go/example/siri/siri.go"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS,
+        go="{} version".format(GO_BIN),
+        quic_go="git -C ~/go/src/github.com/lucas-clemente/quic-go rev-parse HEAD")
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(QUICSiri, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def ping(self):
         self.topo.command_to(self.topo_config.client, "rm " + \
@@ -76,7 +81,8 @@ class QUICSiri(Experiment):
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_before")
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        # go run compiles the server first, this can take a while
+        self.wait_for_port(self.topo_config.server, QUICSiri.PORT, protocol="udp", timeout=120)
         cmd = self.get_quic_siri_client_cmd()
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         self.topo.command_to(self.topo_config.client, cmd)
@@ -7,6 +7,9 @@ class SendFile(RandomFileExperiment):
     SERVER_LOG = "sendfile_server.log"
     CLIENT_LOG = "sendfile_client.log"
     WGET_BIN = "./client"
+    # The client and server have no version option, their binaries identify them
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS,
+        send_file="sha256sum {} ./server".format(WGET_BIN))
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
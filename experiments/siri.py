@@ -37,12 +37,16 @@ class Siri(Experiment):
     CLIENT_LOG = "siri_client.log"
     CLIENT_ERR = "siri_client.err"
     JAVA_BIN = "java"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS,
+        java="{} -version 2>&1 | head -n 1".format(JAVA_BIN), python3="python3 --version")
     PING_OUTPUT = "ping.log"
+    PORT = 8080
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(Siri, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def ping(self):
         self.topo.command_to(self.topo_config.client, "rm " + \
@@ -101,11 +105,11 @@ class Siri(Experiment):
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_before")
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Siri.PORT)
         cmd = self.get_siri_client_cmd()
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         self.topo.command_to(self.topo_config.client, cmd)
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_after")
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_after")
         self.topo.command_to(self.topo_config.server, "pkill -f siri_server.py")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Siri.PORT)
@@ -8,10 +8,13 @@ class SiriHTTP(Siri, RandomFileExperiment):
     HTTP_SERVER_LOG = "http_server.log"
     HTTP_CLIENT_LOG = "http_client.log"
     WGET_BIN = "wget"
+    HTTP_PORT = 80
     SERVER_LOG = "siri_server.log"
     CLIENT_LOG = "siri_client.log"
     CLIENT_ERR = "siri_client.err"
     JAVA_BIN = "java"
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS, **Siri.VERSION_COMMANDS)
+    VERSION_COMMANDS["wget"] = "{} --version | head -n 1".format(WGET_BIN)
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
@@ -69,7 +72,8 @@ class SiriHTTP(Siri, RandomFileExperiment):
         cmd = self.get_http_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Siri.PORT)
+        self.wait_for_port(self.topo_config.server, SiriHTTP.HTTP_PORT)
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         cmd = self.get_http_client_cmd()
         self.topo.command_to(self.topo_config.client, "for i in {1..200}; do " + cmd + "; done &")
@@ -78,4 +82,4 @@ class SiriHTTP(Siri, RandomFileExperiment):
         self.topo.command_to(self.topo_config.server, "netstat -sn > netstat_server_after")
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_after")
         self.topo.command_to(self.topo_config.server, "pkill -f siri_server.py")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Siri.PORT)
@@ -23,6 +23,7 @@ class SiriMsg(Siri, Msg):
     CLIENT_LOG = "siri_client.log"
     CLIENT_ERR = "siri_client.err"
     JAVA_BIN = "java"
+    VERSION_COMMANDS = dict(Msg.VERSION_COMMANDS, **Siri.VERSION_COMMANDS)
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
@@ -50,7 +51,8 @@ class SiriMsg(Siri, Msg):
         cmd = self.get_msg_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_port(self.topo_config.server, Siri.PORT)
+        self.wait_for_port(self.topo_config.server, Msg.PORT)
         self.topo.command_to(self.topo_config.client, "netstat -sn > netstat_client_before")
         cmd = self.get_msg_client_cmd(daemon=True)
         self.topo.command_to(self.topo_config.client, cmd)
@@ -61,4 +63,5 @@ class SiriMsg(Siri, Msg):
         self.topo.command_to(self.topo_config.server, "pkill -f siri_server.py")
         self.topo.command_to(self.topo_config.server, "pkill -f msg_server.py")
         self.topo.command_to(self.topo_config.server, "pkill -f msg_client.py")
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, Siri.PORT)
+        self.wait_for_connections_closed(self.topo_config.client, Msg.PORT)
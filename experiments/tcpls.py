@@ -1,7 +1,6 @@
 from core.experiment import RandomFileExperiment, RandomFileParameter, ExperimentParameter
 from topos.multi_interface_multi_client import MultiInterfaceMultiClientConfig
 import os
-import time
 
 class TCPLSParameter(ExperimentParameter):
     #can be on or off
@@ -9,7 +8,8 @@ class TCPLSParameter(ExperimentParameter):
     # one of the client/server interface name
     CLIENT_BACKUP_IF = "clientBackupIF"
     SERVER_BACKUP_IF = "serverBackupIF"
-    # Can be none, drop, rst or ifupdown
+    # Can be none, drop, rst or ifupdown. With none, failures can be injected by
+    # the link events of the topology (see LinkEvent)
     PERTURBATION = "perturbationType"
     GOODPUT_FILE = "goodputFile"
     INTERVAL = "interval"
@@ -29,7 +29,12 @@ class TCPLS(RandomFileExperiment):
     NAME = "tcpls"
     PARAMETER_CLASS = TCPLSParameter
     CLI = "~/picotcpls/cli"
+    # The cli of picotcpls has no version option, its binary identifies it
+    VERSION_COMMANDS = dict(RandomFileExperiment.VERSION_COMMANDS, tcpls="sha256sum {}".format(CLI))
     SERVER_LOG = "tcpls_server.log"
+    PORT = 4443
+    # Maximum duration of the transfer, in seconds
+    TRANSFER_TIMEOUT = 80
     CLIENT_LOG = "tcpls_client.log"
     CERT = "~/picotcpls/t/assets/server.crt"
     KEY = "~/picotcpls/t/assets/server.key"
@@ -90,11 +95,13 @@ class TCPLS(RandomFileExperiment):
         self.topo.command_to(self.topo_config.server, "ip link set dev Server_0-eth1 multipath backup")
         #self.topo.command_to(self.topo_config.client, "ip route add 10.1.1.0/24 via 10.0.1.2 dev Client_0-eth1")
         self.topo.command_to(self.topo_config.server, self.getServerCmd())
-        # ensure the server has started -- 1 sec should be enough
         self.topo.command_to(self.topo_config.client, " tcpdump -i any -n -v host 10.1.0.1 or 10.1.1.1 &> client_tcpdump.log&")
 
-        self.topo.command_to(self.topo_config.client, "sleep 1")
+        # ensure the server and the capture have started
+        self.wait_for_port(self.topo_config.server, TCPLS.PORT)
+        self.wait_for_log(self.topo_config.client, "client_tcpdump.log", "listening on")
         self.topo.command_to(self.topo_config.client, self.getClientCmd())
+        client_pid = self.get_background_pid(self.topo_config.client)
         if self.perturbationType == "drop":
             bin = TCPLS.DROP_SCRIPT
         elif self.perturbationType == "rst":
@@ -103,9 +110,12 @@ class TCPLS(RandomFileExperiment):
         elif self.perturbationType == "ifupdown":
             bin = TCPLS.IFUPDOWN_SCRIPT
             self.topo.command_to(self.topo_config.client, ""+bin+" "+str(self.interval)+" &> ifupdown.log")
+        elif self.perturbationType == "none":
+            pass
         else:
             print("does not know what to do with {}".format(self.perturbationType))
-        time.sleep(80)
+        self.wait_for_process_exit(self.topo_config.client, client_pid,
+            timeout=TCPLS.TRANSFER_TIMEOUT)
 
     def clean(self):
         super(TCPLS, self).clean()
@@ -19,12 +19,17 @@ class VLC(Experiment):
     SERVER_LOG = "vlc_server.log"
     CLIENT_LOG = "vlc_client.log"
     VLC_BIN = "/home/mininet/vlc/vlc"
+    VERSION_COMMANDS = dict(Experiment.VERSION_COMMANDS,
+        vlc="{} --version 2>/dev/null | head -n 1".format(VLC_BIN),
+        apache2="apache2 -v | head -n 1")
+    PORT = 80
     PING_OUTPUT = "ping.log"
 
     def __init__(self, experiment_parameter_filename, topo, topo_config):
         super(VLC, self).__init__(experiment_parameter_filename, topo, topo_config)
         self.load_parameters()
-        self.ping()
+        with self.phase("ping"):
+            self.ping()
 
     def ping(self):
         self.topo.command_to(self.topo_config.client, "rm " + \
@@ -75,7 +80,7 @@ class VLC(Experiment):
         cmd = self.get_vlc_server_cmd()
         self.topo.command_to(self.topo_config.server, cmd)
 
-        self.topo.command_to(self.topo_config.client, "sleep 1")
+        self.wait_for_port(self.topo_config.server, VLC.PORT)
         cmd = self.get_vlc_client_cmd()
         self.topo.command_to(self.topo_config.client, cmd)
 
@@ -83,4 +88,4 @@ class VLC(Experiment):
             self.topo.command_to(self.topo_config.client, "sleep " + self.time)
             self.topo.command_to(self.topo_config.client, "pkill -9 -f vlc")
 
-        self.topo.command_to(self.topo_config.client, "sleep 2")
+        self.wait_for_connections_closed(self.topo_config.client, VLC.PORT)
@@ -54,6 +54,9 @@ class MininetBuilder(Topo):
         else:
             return self.net.getNodeByName(who)
 
+    def get_netns_path(self, who):
+        return "/proc/{}/ns/net".format(who.pid)
+
     def get_interface_names(self, who):
         # NOTE: bs1.intfNames()[0] is lo...
         return [i for i in who.intfNames() if i != "lo"]
@@ -65,6 +68,9 @@ class MininetBuilder(Topo):
         return self.addSwitch(switch)
 
     def add_link(self, from_a, to_b, **kwargs):
+        # Mininet creates single-queue veth pairs
+        if kwargs.pop("queues", 1) > 1:
+            logging.warning("Multi-queue links are not supported by Mininet, use the netns builder")
         return self.addLink(from_a, to_b, **kwargs)
 
     def stop_network(self):
@@ -0,0 +1,314 @@
+from core.command import LAST_BACKGROUND_PID_VARIABLE
+from subprocess import Popen, PIPE, STDOUT, DEVNULL
+
+import logging
+import os
+import re
+import shlex
+import tempfile
+
+
+class NetnsInterface(object):
+    """
+    Interface of a NetnsNode, one end of a veth pair
+
+    Attributes:
+        name    name of the interface
+        node    the NetnsNode owning the interface
+        mac     MAC address of the interface, or None to let the kernel pick one
+        queues  number of transmit and receive queues of the interface
+    """
+    def __init__(self, name, node, mac=None, queues=1):
+        self.name = name
+        self.node = node
+        self.mac = mac
+        self.queues = queues
+
+    def MAC(self):
+        if self.mac is None:
+            output = self.node.cmd("cat /sys/class/net/{}/address".format(self.name))
+            self.mac = output.strip()
+        return self.mac
+
+    def __str__(self):
+        return self.name
+
+
+class NetnsNode(object):
+    """
+    Node of a NetnsBuilder network. Hosts live in their own network namespace;
+    switches are Linux bridges living in the namespace of the orchestrator, like
+    Mininet's OVS bridges.
+
+    There is no shell attached to a node: each command spawns its own bash
+    process. The working directory and the PID of the last command started in
+    background are carried from one command to the next, so that commands
+    relying on them (e.g., `cd`, see Topo.set_working_directory) keep working.
+
+    Attributes:
+        name        name of the node
+        is_switch   True for switches
+        netns       name of the network namespace of the node (None for switches)
+        interfaces  list of NetnsInterface, in the order they were created
+        cwd         working directory of the next command
+        last_pid    PID of the last command started in background (or "")
+    """
+    # Printed at the end of each command, followed by its working directory and
+    # the PID of its last background command. Commands started in background may
+    # print after it.
+    STATE_MARKER = "__minitopo_state__"
+    STATE_MARKER_RE = re.compile(r"\n{}(\d*) (.*)\n".format(STATE_MARKER))
+
+    def __init__(self, name, is_switch=False, netns=None):
+        self.name = name
+        self.is_switch = is_switch
+        self.netns = netns
+        self.interfaces = []
+        self.cwd = os.getcwd()
+        self.last_pid = ""
+        self.pending = None
+
+    def add_interface(self, mac=None, queues=1):
+        # Like Mininet, ports of switches are numbered from 1
+        index = len(self.interfaces) + (1 if self.is_switch else 0)
+        interface = NetnsInterface("{}-eth{}".format(self.name, index), self, mac=mac,
+            queues=queues)
+        self.interfaces.append(interface)
+        return interface
+
+    def intf(self, name):
+        for interface in self.interfaces:
+            if interface.name == name:
+                return interface
+        return None
+
+    def intfNames(self):
+        return [i.name for i in self.interfaces]
+
+    def get_script(self, cmd):
+        return "cd {} 2>/dev/null; {}={}\n{}\nprintf '\\n{}%s %s\\n' \"${{!:-${}}}\" \"$PWD\"".format(
+            shlex.quote(self.cwd), LAST_BACKGROUND_PID_VARIABLE, shlex.quote(self.last_pid),
+            cmd, NetnsNode.STATE_MARKER, LAST_BACKGROUND_PID_VARIABLE)
+
+    def sendCmd(self, cmd):
+        """
+        Start `cmd` without waiting for its end, see waitOutput
+        """
+        args = ["bash", "-c", self.get_script(cmd)]
+        if self.netns is not None:
+            args = ["ip", "netns", "exec", self.netns] + args
+
+        # Commands started in background keep the output file open, so it is not
+        # a pipe: reading it up to its end would wait for them.
+        output_file = tempfile.TemporaryFile()
+        process = Popen(args, stdin=DEVNULL, stdout=output_file, stderr=STDOUT,
+            start_new_session=True)
+        self.pending = (process, output_file)
+
+    def waitOutput(self):
+        """
+        Wait for the end of the command started by sendCmd and return its output
+        """
+        if self.pending is None:
+            return ""
+
+        (process, output_file), self.pending = self.pending, None
+        process.wait()
+        with output_file:
+            output_file.seek(0)
+            output = output_file.read().decode(errors="replace")
+
+        match = None
+        for match in NetnsNode.STATE_MARKER_RE.finditer(output):
+            pass
+        if match is None:
+            # The command exited the shell
+            return output
+
+        self.last_pid, self.cwd = match.group(1), match.group(2)
+        return output[:match.start()] + output[match.end():]
+
+    def cmd(self, cmd):
+        self.sendCmd(cmd)
+        return self.waitOutput()
+
+    def __str__(self):
+        return self.name
+
+
+class NetnsBuilder(object):
+    """
+    Build the network directly with network namespaces, veth pairs and Linux
+    bridges, without Mininet, OVS nor a shell per node.
+
+    The whole network is created with a single `ip -batch` in the namespace of
+    the orchestrator, followed by one per host to bring its interfaces up.
+    Namespaces are named NETNS_PREFIX + node name, and the links created in the
+    namespace of the orchestrator are in the link group LINK_GROUP, so that
+    `cleanup()` can remove them even after a crash. `stop_network()` only
+    deletes the namespaces and links of this builder, leaving those of the
+    networks running concurrently (see runner.ParallelCampaign).
+
+    Attributes:
+        nodes   dictionary node name -> NetnsNode
+        links   list of (from interface, to interface)
+        net     same as nodes once the network is started, None otherwise
+    """
+    NETNS_PREFIX = "minitopo-"
+    LINK_GROUP = 77
+    NETNS_DIR = "/run/netns"
+
+    def __init__(self):
+        self.nodes = {}
+        self.links = []
+        self.net = None
+
+    def command_to(self, who, cmd):
+        """
+        Launch command `cmd` to the specific name space of `who`
+        """
+        return who.cmd(cmd)
+
+    def command_global(self, cmd):
+        """
+        Launch command `cmd` over the global system, i.e., not specific to a name space
+        """
+        p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        if stderr:
+            logging.error("Got error when running cmd: {}".format(cmd))
+            return "Error"
+        return stdout
+
+    def run_ip_batch(self, lines, netns=None):
+        args = ["ip"] + (["-n", netns] if netns is not None else []) + ["-batch", "-"]
+        p = Popen(args, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+        stdout, _ = p.communicate(("\n".join(lines) + "\n").encode())
+        if p.returncode != 0:
+            raise Exception("Unable to build the network: {}".format(
+                stdout.decode(errors="replace").strip()))
+
+    def get_interface_options(self, intf):
+        options = []
+        if intf.mac:
+            options.append("address {}".format(intf.mac))
+        if intf.queues > 1:
+            options.append("numtxqueues {} numrxqueues {}".format(intf.queues, intf.queues))
+        return " ".join(options)
+
+    def start_network(self):
+        """
+        Create the namespaces, bridges and veth pairs of the network
+        """
+        lines = []
+        for node in self.nodes.values():
+            if node.is_switch:
+                lines.append("link add name {} type bridge".format(node.name))
+                lines.append("link set dev {} group {} up".format(node.name, NetnsBuilder.LINK_GROUP))
+            else:
+                lines.append("netns add {}".format(node.netns))
+
+        for from_intf, to_intf in self.links:
+            lines.append("link add name {} {} type veth peer name {} {}".format(
+                from_intf.name, self.get_interface_options(from_intf),
+                to_intf.name, self.get_interface_options(to_intf)))
+            for intf in (from_intf, to_intf):
+                if intf.node.is_switch:
+                    lines.append("link set dev {} master {} group {} up".format(
+                        intf.name, intf.node.name, NetnsBuilder.LINK_GROUP))
+                else:
+                    lines.append("link set dev {} netns {}".format(intf.name, intf.node.netns))
+
+        self.run_ip_batch(lines)
+        for node in self.nodes.values():
+            if not node.is_switch:
+                self.run_ip_batch(["link set dev lo up"] +
+                    ["link set dev {} up".format(i.name) for i in node.interfaces],
+                    netns=node.netns)
+
+        self.net = self.nodes
+
+    def get_cli(self):
+        """
+        There is no CLI, nodes are reached with `ip netns exec`
+        """
+        logging.error("No CLI with the netns builder, use e.g., ip netns exec {}<node> bash".format(
+            NetnsBuilder.NETNS_PREFIX))
+
+    def get_host(self, who):
+        if self.net is None:
+            logging.error("Network not available...")
+            raise Exception("Network not ready")
+        else:
+            return self.net[who]
+
+    def get_netns_path(self, who):
+        if who.netns is None:
+            return None
+        return os.path.join(NetnsBuilder.NETNS_DIR, who.netns)
+
+    def get_interface_names(self, who):
+        return who.intfNames()
+
+    def add_host(self, host):
+        self.nodes[host] = NetnsNode(host, netns=NetnsBuilder.NETNS_PREFIX + host)
+        return host
+
+    def add_switch(self, switch):
+        self.nodes[switch] = NetnsNode(switch, is_switch=True)
+        return switch
+
+    def add_link(self, from_a, to_b, **kwargs):
+        """
+        Link the nodes named `from_a` and `to_b`. As with Mininet, `addr1` and
+        `addr2` set the MAC addresses of both ends; `queues` sets the number of
+        queues of both ends.
+        """
+        queues = kwargs.get("queues", 1)
+        from_intf = self.nodes[from_a].add_interface(mac=kwargs.get("addr1"), queues=queues)
+        to_intf = self.nodes[to_b].add_interface(mac=kwargs.get("addr2"), queues=queues)
+        self.links.append((from_intf, to_intf))
+
+    def stop_network(self):
+        if self.net is None:
+            logging.warning("Unable to stop the network: net is None")
+        else:
+            NetnsBuilder.delete_namespaces([n.netns for n in self.nodes.values() if not n.is_switch])
+            # The veth pairs of the hosts are gone with their namespaces; the ones
+            # between two switches are deleted with one of their ends
+            NetnsBuilder.delete_links([n.name for n in self.nodes.values() if n.is_switch] +
+                [f.name for f, t in self.links if f.node.is_switch and t.node.is_switch])
+            self.net = None
+
+    @staticmethod
+    def delete_namespaces(netns_names):
+        """
+        Kill the processes of the namespaces `netns_names`, and delete them (with
+        their interfaces)
+        """
+        for netns in netns_names:
+            Popen("ip netns pids {} | xargs -r kill -9".format(netns), shell=True).wait()
+            Popen(["ip", "netns", "delete", netns], stderr=DEVNULL).wait()
+
+    @staticmethod
+    def delete_links(names):
+        """
+        Delete the links `names` of the namespace of the orchestrator, ignoring
+        those already gone
+        """
+        p = Popen(["ip", "-force", "-batch", "-"], stdin=PIPE, stdout=DEVNULL, stderr=DEVNULL)
+        p.communicate("".join(["link delete dev {}\n".format(n) for n in names]).encode())
+
+    @staticmethod
+    def cleanup():
+        """
+        Remove what is left of all the networks built by NetnsBuilder, including
+        those of other processes: only call it when none is running
+        """
+        try:
+            netns_names = [n for n in os.listdir(NetnsBuilder.NETNS_DIR)
+                if n.startswith(NetnsBuilder.NETNS_PREFIX)]
+        except OSError:
+            netns_names = []
+        NetnsBuilder.delete_namespaces(netns_names)
+        Popen(["ip", "link", "delete", "group", str(NetnsBuilder.LINK_GROUP)], stderr=DEVNULL).wait()
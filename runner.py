@@ -1,15 +1,25 @@
 #!/usr/bin/python
 
+from core.cache import ResultCache, get_run_inputs
 from core.experiment import Experiment, ExperimentParameter, ExperimentParameter
+from core.manifest import RunManifest
 from core.topo import Topo, TopoParameter
 
 from mininet_builder import MininetBuilder
+from netns_builder import NetnsBuilder
 from mininet.clean import cleanup
 
 from experiments import EXPERIMENTS
 from topos import TOPO_CONFIGS, TOPOS
 
+import cProfile
+import itertools
+import json
 import logging
+import multiprocessing
+import os
+import queue
+import time
 import traceback
 
 
@@ -19,23 +29,32 @@ class Runner(object):
     described by `topo_parameter_file` in the network environment built by
     `builder_type`.
 
-    All the operations are done when calling the constructor.
+    All the operations are done when calling the constructor. The timing of each
+    phase of the run is written in the manifest file of the run (see
+    core.manifest) in the current directory.
     """
     def __init__(self, builder_type, topo_parameter_file, experiment_parameter_file):
+        self.manifest = RunManifest()
         self.topo_parameter = TopoParameter(topo_parameter_file)
         self.set_builder(builder_type)
         self.apply_topo()
         self.apply_topo_config()
-        self.start_topo()
-        self.run_experiment(experiment_parameter_file)
-        self.stop_topo()
+        try:
+            self.start_topo()
+            self.run_experiment(experiment_parameter_file)
+        finally:
+            self.stop_topo()
+            self.manifest.write(RunManifest.FILENAME)
 
     def set_builder(self, builder_type):
         """
-        Currently the only builder type supported is Mininet...
+        Builders are Mininet (Topo.MININET_BUILDER) and plain network namespaces
+        (Topo.NETNS_BUILDER, see netns_builder)
         """
         if builder_type == Topo.MININET_BUILDER:
             self.topo_builder = MininetBuilder()
+        elif builder_type == Topo.NETNS_BUILDER:
+            self.topo_builder = NetnsBuilder()
         else:
             raise Exception("I can not find the builder {}".format(builder_type))
 
@@ -44,10 +63,13 @@ class Runner(object):
         Matches the name of the topo and find the corresponding Topo class.
         """
         t = self.topo_parameter.get(Topo.TOPO_ATTR)
-        if t in TOPOS:
-            self.topo = TOPOS[t](self.topo_builder, self.topo_parameter)
-        else:
-            raise Exception("Unknown topo: {}".format(t))
+        with self.manifest.phase("apply_topo"):
+            if t in TOPOS:
+                self.topo = TOPOS[t](self.topo_builder, self.topo_parameter)
+            else:
+                raise Exception("Unknown topo: {}".format(t))
+
+        self.topo.manifest = self.manifest
 
         logging.info("Using topo {}".format(self.topo))
 
@@ -67,8 +89,10 @@ class Runner(object):
         """
         Initialize the topology with its configuration
         """
-        self.topo.start_network()
-        self.topo_config.configure_network()
+        with self.manifest.phase("start_topo"):
+            self.topo.start_network()
+            with self.manifest.phase("configure_network"):
+                self.topo_config.configure_network()
 
     def run_experiment(self, experiment_parameter_file):
         """
@@ -76,17 +100,496 @@ class Runner(object):
         """
         # Well, we need to load twice the experiment parameters, is it really annoying?
         xp = ExperimentParameter(experiment_parameter_file).get(ExperimentParameter.XP_TYPE)
-        if xp in EXPERIMENTS:
-            exp = EXPERIMENTS[xp](experiment_parameter_file, self.topo, self.topo_config)
-            exp.classic_run()
-        else:
-            raise Exception("Unknown experiment {}".format(xp))
+        with self.manifest.phase("run_experiment"):
+            if xp in EXPERIMENTS:
+                exp = EXPERIMENTS[xp](experiment_parameter_file, self.topo, self.topo_config)
+                exp.classic_run()
+            else:
+                raise Exception("Unknown experiment {}".format(xp))
 
     def stop_topo(self):
         """
         Stop the topology
         """
-        self.topo.stop_network()
+        with self.manifest.phase("stop_topo"):
+            self.topo.stop_network()
+
+
+class CampaignRun(object):
+    """
+    A single run of a campaign: an experiment in a topology, for a given repetition.
+
+    Attributes:
+        topo_parameter_file         path to the topo parameter file
+        experiment_parameter_file   path to the experiment parameter file (may be None)
+        repetition                  index of the repetition of this (topo, experiment) pair
+        inputs                      when results are cached, the inputs identifying the run
+        run_hash                    when results are cached, the hash of `inputs`
+    """
+    def __init__(self, topo_parameter_file, experiment_parameter_file, repetition):
+        self.topo_parameter_file = os.path.abspath(topo_parameter_file)
+        self.experiment_parameter_file = os.path.abspath(experiment_parameter_file) \
+            if experiment_parameter_file is not None else None
+        self.repetition = repetition
+        self.inputs = None
+        self.run_hash = None
+
+    def load_inputs(self):
+        """
+        Gather the inputs identifying the run, as defined by core.cache
+        """
+        experiment_class, experiment_parameter = load_experiment_parameter(
+            self.experiment_parameter_file)
+        return get_run_inputs(TopoParameter(self.topo_parameter_file), experiment_parameter,
+            experiment_class, self.repetition)
+
+    def get_info(self):
+        return {
+            "topo_parameter_file": self.topo_parameter_file,
+            "experiment_parameter_file": self.experiment_parameter_file,
+            "repetition": self.repetition,
+            "inputs": self.inputs,
+        }
+
+    def __str__(self):
+        return "{} in {} (repetition {})".format(self.experiment_parameter_file,
+            self.topo_parameter_file, self.repetition)
+
+
+class CampaignRunner(Runner):
+    """
+    Run several campaign runs, one after the other, in the topology described by
+    `topo_parameter` (an instance of TopoParameter).
+
+    The network is booted and configured only once, before the first run, and
+    stopped after the last one. A failing run is logged and recorded in
+    `failed_runs`, but does not prevent the next ones from running.
+
+    When `result_cache` (an instance of ResultCache) is provided, each run is
+    performed in its own result directory.
+
+    Before each run but the first, the bottleneck links are brought back to
+    their initial configuration. After a failed run, whose experiment may not
+    have been cleaned, the network is rebooted instead.
+
+    Each run has its own manifest; the one of the first run also holds the
+    phases booting the topology, and the one of the last run the phase stopping
+    it.
+    """
+    def __init__(self, builder_type, topo_parameter, campaign_runs, result_cache=None):
+        self.manifest = RunManifest()
+        self.manifest_path = None
+        self.topo_parameter = topo_parameter
+        self.result_cache = result_cache
+        self.failed_runs = []
+        self.last_run_failed = False
+        self.set_builder(builder_type)
+        self.apply_topo()
+        self.apply_topo_config()
+        try:
+            self.start_topo()
+            for campaign_run in campaign_runs:
+                try:
+                    self.run_campaign_run(campaign_run)
+                    self.last_run_failed = False
+                except Exception as e:
+                    logging.error("Run {} failed: {}".format(campaign_run, e))
+                    traceback.print_exc()
+                    self.failed_runs.append(campaign_run)
+                    self.last_run_failed = True
+        finally:
+            self.stop_topo()
+            if self.manifest_path is not None:
+                self.manifest.write(self.manifest_path)
+
+    def run_campaign_run(self, campaign_run):
+        if self.manifest_path is not None:
+            # The manifest of the previous run is complete
+            self.manifest = RunManifest()
+            self.topo.manifest = self.manifest
+            if self.last_run_failed:
+                self.restart_topo()
+            else:
+                # Undo what the previous experiment changed on the links
+                with self.manifest.phase("reset_bottlenecks"):
+                    self.topo_config.reset_bottlenecks()
+
+        if self.result_cache is not None:
+            self.topo.set_working_directory(self.result_cache.start(campaign_run.run_hash))
+
+        try:
+            self.run_experiment(campaign_run.experiment_parameter_file)
+        finally:
+            self.manifest_path = os.path.abspath(RunManifest.FILENAME)
+            self.manifest.write(self.manifest_path)
+
+        if self.result_cache is not None:
+            directory = self.result_cache.complete(campaign_run.run_hash,
+                campaign_run.get_info())
+            self.manifest_path = os.path.join(directory, RunManifest.FILENAME)
+
+    def restart_topo(self):
+        """
+        Boot and configure the network again, keeping the same topology
+        """
+        logging.info("Restart the network after a failed run")
+        with self.manifest.phase("restart_topo"):
+            self.topo.restart_network()
+            with self.manifest.phase("configure_network"):
+                self.topo_config.configure_network()
+
+
+class Campaign(object):
+    """
+    Run a list of (topo parameter file, experiment parameter file) pairs, each
+    of them `repetitions` times.
+
+    Runs are grouped by the content of their topology parameter file, such that
+    each distinct topology is booted once and all its experiments are run on it
+    before moving to the next topology. Groups are run in the order of their
+    first appearance in `runs`.
+
+    When `results_dir` is provided, the results of each run are stored in a
+    directory named after the hash of the inputs of the run, and runs whose
+    results are already complete are skipped (see core.cache). Interrupted
+    campaigns can thus be resumed by running them again.
+
+    Attributes:
+        builder_type    the network builder to use for all the runs
+        runs            list of (topo_parameter_file, experiment_parameter_file)
+        repetitions     number of times each run is performed
+        result_cache    instance of ResultCache, or None if results are not cached
+        failed_runs     list of the CampaignRun that failed
+    """
+    def __init__(self, builder_type, runs, repetitions=1, results_dir=None):
+        self.builder_type = builder_type
+        self.runs = runs
+        self.repetitions = repetitions
+        self.result_cache = ResultCache(results_dir) if results_dir is not None else None
+        self.failed_runs = []
+
+    def get_pending_runs(self):
+        """
+        Return the list of CampaignRun to perform. When results are cached, the
+        runs whose results are complete are skipped.
+        """
+        pending_runs = []
+        for topo_parameter_file, experiment_parameter_file in self.runs:
+            for repetition in range(self.repetitions):
+                campaign_run = CampaignRun(topo_parameter_file, experiment_parameter_file,
+                    repetition)
+                if self.result_cache is not None:
+                    campaign_run.inputs = campaign_run.load_inputs()
+                    campaign_run.run_hash = self.result_cache.get_run_hash(campaign_run.inputs)
+                    if self.result_cache.is_complete(campaign_run.run_hash):
+                        logging.info("Skip {}: results already in {}".format(campaign_run,
+                            self.result_cache.get_directory(campaign_run.run_hash)))
+                        continue
+
+                pending_runs.append(campaign_run)
+
+        return pending_runs
+
+    def group_runs(self, campaign_runs):
+        """
+        Return a list of (TopoParameter, [CampaignRun, ...]), one entry per
+        distinct topology content.
+        """
+        groups = {}
+        for campaign_run in campaign_runs:
+            topo_parameter = TopoParameter(campaign_run.topo_parameter_file)
+            key = topo_parameter.content_key()
+            if key not in groups:
+                groups[key] = (topo_parameter, [])
+            groups[key][1].append(campaign_run)
+
+        return list(groups.values())
+
+    def run(self):
+        pending_runs = self.get_pending_runs()
+        groups = self.group_runs(pending_runs)
+        logging.info("Campaign of {} pending runs over {} distinct topologies".format(
+            len(pending_runs), len(groups)))
+        for topo_parameter, campaign_runs in groups:
+            logging.info("Booting topology {} for {} run(s)".format(
+                topo_parameter, len(campaign_runs)))
+            try:
+                runner = CampaignRunner(self.builder_type, topo_parameter, campaign_runs,
+                    result_cache=self.result_cache)
+                failed = runner.failed_runs
+            except Exception as e:
+                logging.error("Unable to run topology {}: {}".format(topo_parameter, e))
+                traceback.print_exc()
+                failed = campaign_runs
+                # Make sure the next topology boots in a clean environment
+                cleanup_network(self.builder_type)
+
+            self.failed_runs.extend(failed)
+
+        self.report_failed_runs()
+
+    def report_failed_runs(self):
+        if len(self.failed_runs) > 0:
+            logging.error("{} run(s) failed: {}".format(len(self.failed_runs),
+                ", ".join(["{}".format(r) for r in self.failed_runs])))
+
+
+class ParallelCampaign(Campaign):
+    """
+    Run the runs of a campaign concurrently, in `jobs` worker processes.
+
+    Each worker process holds a slot that gives its runs their own:
+        - name prefix for nodes, and hence for interfaces and bridges
+        - left and right subnets
+        - set of CPUs (the available CPUs are split among the slots)
+    Each run has its own working directory, containing the parameter files of
+    the run (with the slot-specific values) and all the outputs of the run. This
+    is either the result directory of the run when results are cached, or a
+    directory in `output_dir` otherwise. The global sysctls of the experiments
+    are set in the client and server namespaces instead of the host.
+
+    Once all runs are over, their status is merged in `output_dir/runs.json`.
+    Note that in this mode, each run boots its own network.
+    """
+    RUNS_FILENAME = "runs.json"
+    RUN_DIRECTORY = "run_{:04d}"
+    TOPO_FILENAME = "topo"
+    EXPERIMENT_FILENAME = "xp"
+    # Name prefixes have two digits; this also keeps the subnets of all the
+    # slots valid (see _get_slot_topo_parameters)
+    MAX_JOBS = 100
+    # Seconds a task waits for a free slot; as there are as many slots as
+    # workers and each task returns its slot, this only expires if a slot leaked
+    SLOT_TIMEOUT = 60
+
+    def __init__(self, builder_type, runs, jobs, output_dir, repetitions=1, results_dir=None):
+        super(ParallelCampaign, self).__init__(builder_type, runs, repetitions=repetitions,
+            results_dir=results_dir)
+        if jobs > ParallelCampaign.MAX_JOBS:
+            raise Exception("Cannot run more than {} jobs in parallel".format(
+                ParallelCampaign.MAX_JOBS))
+        self.jobs = jobs
+        self.output_dir = os.path.abspath(output_dir)
+
+    def get_cpu_sets(self):
+        """
+        Split the available CPUs in `jobs` contiguous sets
+        """
+        cpus = sorted(os.sched_getaffinity(0))
+        n = len(cpus)
+        return [cpus[i * n // self.jobs:(i + 1) * n // self.jobs] or [cpus[i % n]]
+            for i in range(self.jobs)]
+
+    def get_tasks(self, campaign_runs):
+        results_dir = self.result_cache.results_dir if self.result_cache is not None else None
+        return [(self.builder_type, index, campaign_run, results_dir,
+            os.path.join(self.output_dir, ParallelCampaign.RUN_DIRECTORY.format(index)))
+            for index, campaign_run in enumerate(campaign_runs)]
+
+    def run(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        pending_runs = self.get_pending_runs()
+        logging.info("Running {} pending runs in {} parallel jobs".format(
+            len(pending_runs), self.jobs))
+        slots = multiprocessing.Queue()
+        for slot in range(self.jobs):
+            slots.put(slot)
+
+        pool = multiprocessing.Pool(self.jobs, initializer=_init_parallel_worker,
+            initargs=(slots, self.get_cpu_sets()))
+        try:
+            results = pool.map(_run_parallel_task, self.get_tasks(pending_runs), chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.failed_runs = [r for r, result in zip(pending_runs, results)
+            if result["status"] != "ok"]
+        self.merge_results(results)
+        self.report_failed_runs()
+
+    def merge_results(self, results):
+        with open(os.path.join(self.output_dir, ParallelCampaign.RUNS_FILENAME), "w") as f:
+            json.dump(results, f, indent=4)
+
+        logging.info("{} run(s) succeeded, {} failed; see {}".format(
+            len(results) - len(self.failed_runs), len(self.failed_runs),
+            os.path.join(self.output_dir, ParallelCampaign.RUNS_FILENAME)))
+
+
+# Queue of the free slots of a ParallelCampaign, and CPU set of each slot, in
+# its worker processes
+_worker_slots = None
+_worker_cpu_sets = None
+
+
+def _init_parallel_worker(slots, cpu_sets):
+    global _worker_slots, _worker_cpu_sets
+    _worker_slots = slots
+    _worker_cpu_sets = cpu_sets
+
+
+def _get_slot_topo_parameters(slot):
+    if 2 * slot + 1 > 255:
+        raise Exception("No subnets left for slot {}".format(slot))
+
+    return {
+        TopoParameter.NAME_PREFIX: "p{:02d}".format(slot),
+        TopoParameter.LEFT_SUBNET: "10.{}.".format(2 * slot),
+        TopoParameter.RIGHT_SUBNET: "10.{}.".format(2 * slot + 1),
+    }
+
+
+def _run_parallel_task(task):
+    """
+    Run a single run of a ParallelCampaign in a free slot, which is held for the
+    duration of the run
+    """
+    try:
+        slot = _worker_slots.get(timeout=ParallelCampaign.SLOT_TIMEOUT)
+    except queue.Empty:
+        # Raising would discard the results of all the other runs
+        error = "No free slot after {} seconds".format(ParallelCampaign.SLOT_TIMEOUT)
+        logging.error("Run {} failed: {}".format(task[2], error))
+        result = _get_task_result(task, None)
+        result.update({"status": "failed", "error": error, "directory": task[4],
+            "duration": 0})
+        return result
+
+    try:
+        os.sched_setaffinity(0, _worker_cpu_sets[slot])
+        return _run_parallel_task_in_slot(task, slot)
+    finally:
+        _worker_slots.put(slot)
+
+
+def _get_task_result(task, slot):
+    _, index, campaign_run, _, _ = task
+    return {
+        "index": index,
+        "topo": campaign_run.topo_parameter_file,
+        "experiment": campaign_run.experiment_parameter_file,
+        "repetition": campaign_run.repetition,
+        "slot": slot,
+        "status": "ok",
+    }
+
+
+def _run_parallel_task_in_slot(task, slot):
+    """
+    Run a single run of a ParallelCampaign in its own working directory
+    """
+    builder_type, index, campaign_run, results_dir, run_dir = task
+    result_cache = ResultCache(results_dir) if results_dir is not None else None
+    if result_cache is not None:
+        run_dir = result_cache.start(campaign_run.run_hash)
+
+    result = _get_task_result(task, slot)
+    start = time.time()
+    try:
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+
+        run_topo_parameter_file = os.path.join(run_dir, ParallelCampaign.TOPO_FILENAME)
+        write_parameter_file(campaign_run.topo_parameter_file, run_topo_parameter_file,
+            _get_slot_topo_parameters(slot))
+        run_experiment_parameter_file = os.path.join(run_dir, ParallelCampaign.EXPERIMENT_FILENAME)
+        write_parameter_file(campaign_run.experiment_parameter_file,
+            run_experiment_parameter_file, {ExperimentParameter.NAMESPACE_SYSCTL: "yes"})
+
+        # Node shells inherit the working directory of the process booting them
+        os.chdir(run_dir)
+        Runner(builder_type, run_topo_parameter_file, run_experiment_parameter_file)
+        if result_cache is not None:
+            run_dir = result_cache.complete(campaign_run.run_hash, campaign_run.get_info())
+    except Exception as e:
+        logging.error("Run {} failed: {}".format(campaign_run, e))
+        traceback.print_exc()
+        result["status"] = "failed"
+        result["error"] = "{}".format(e)
+
+    result["directory"] = run_dir
+    result["duration"] = time.time() - start
+    return result
+
+
+# cProfile statistics of the orchestrator, when profiling is enabled
+PROFILE_FILENAME = "orchestrator.prof"
+
+
+def cleanup_network(builder_type):
+    """
+    Remove what is left of the networks built by `builder_type`
+    """
+    if builder_type == Topo.NETNS_BUILDER:
+        NetnsBuilder.cleanup()
+    else:
+        cleanup()
+
+
+def load_experiment_parameter(experiment_parameter_file):
+    """
+    Return the Experiment class matching `experiment_parameter_file` and the
+    instance of its PARAMETER_CLASS holding the parameters of the file.
+    """
+    xp = ExperimentParameter(experiment_parameter_file).get(ExperimentParameter.XP_TYPE)
+    if xp not in EXPERIMENTS:
+        raise Exception("Unknown experiment {}".format(xp))
+
+    experiment_class = EXPERIMENTS[xp]
+    return experiment_class, experiment_class.PARAMETER_CLASS(experiment_parameter_file)
+
+
+def write_parameter_file(parameter_file, output_file, overrides):
+    """
+    Copy the parameter file `parameter_file` (that may be None) to `output_file`,
+    replacing the values of the keys present in the `overrides` dictionary.
+    """
+    lines = []
+    if parameter_file is not None:
+        with open(parameter_file) as f:
+            lines = [l for l in f.readlines() if l.split(":", 1)[0].strip() not in overrides]
+
+    with open(output_file, "w") as f:
+        f.writelines(lines)
+        if len(lines) > 0 and not lines[-1].endswith("\n"):
+            f.write("\n")
+        for k, v in overrides.items():
+            f.write("{}:{}\n".format(k, v))
+
+
+def matrix_runs(topo_parameter_files, experiment_parameter_files):
+    """
+    Return the runs of the matrix topo files x experiment files
+    """
+    return list(itertools.product(topo_parameter_files, experiment_parameter_files))
+
+
+def load_campaign_file(campaign_file):
+    """
+    Load a campaign file, containing one run per line with the following format:
+        {topo_parameter_file} {experiment_parameter_file}
+
+    Empty lines and lines starting with # are ignored. Paths are relative to
+    the current directory.
+    """
+    runs = []
+    with open(campaign_file) as f:
+        for line in f.readlines():
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+
+            try:
+                topo_parameter_file, experiment_parameter_file = line.split()
+            except ValueError:
+                logging.warning("Invalid campaign line '{}'; ignore it".format(line))
+            else:
+                runs.append((topo_parameter_file, experiment_parameter_file))
+
+    return runs
 
 
 if __name__ == '__main__':
@@ -95,22 +598,66 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description="Minitopo, a wrapper of Mininet to run multipath experiments")
 
-    parser.add_argument("--topo_param_file", "-t", required=True,
-        help="path to the topo parameter file")
-    parser.add_argument("--experiment_param_file", "-x",
-        help="path to the experiment parameter file")
+    parser.add_argument("--topo_param_file", "-t", nargs="+",
+        help="path to the topo parameter file(s)")
+    parser.add_argument("--experiment_param_file", "-x", nargs="+",
+        help="path to the experiment parameter file(s); with several topo and/or "
+             "experiment files, each experiment is run in each topology")
+    parser.add_argument("--campaign", "-c",
+        help="path to a campaign file listing '{topo} {experiment}' runs, one per line")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+        help="number of runs of a campaign to run in parallel, each in its own network")
+    parser.add_argument("--output_dir", "-o", default="runs",
+        help="directory holding the outputs of each run when running in parallel")
+    parser.add_argument("--results_dir", "-r",
+        help="store the results of each run in a directory named after the hash of its "
+             "inputs, and skip runs whose results are already there")
+    parser.add_argument("--repetitions", "-n", type=int, default=1,
+        help="number of times each run is performed")
+    parser.add_argument("--builder", "-b", default=Topo.MININET_BUILDER,
+        choices=[Topo.MININET_BUILDER, Topo.NETNS_BUILDER],
+        help="how the network is built: with Mininet and OVS bridges, or directly "
+             "with network namespaces, veth pairs and Linux bridges")
+    parser.add_argument("--profile", action="store_true",
+        help="profile the orchestrator and dump the statistics in {}".format(PROFILE_FILENAME))
 
     args = parser.parse_args()
+    if args.topo_param_file is None and args.campaign is None:
+        parser.error("either --topo_param_file or --campaign is required")
 
     logging.basicConfig(format="%(asctime)-15s [%(levelname)s] %(funcName)s: %(message)s", level=logging.INFO)
 
-    # XXX Currently, there is no alternate topo builder...
+    profiler = None
+    if args.profile:
+        # Campaigns may change the current directory
+        profile_file = os.path.abspath(PROFILE_FILENAME)
+        profiler = cProfile.Profile()
+        profiler.enable()
+
     try:
-        Runner(Topo.MININET_BUILDER, args.topo_param_file, args.experiment_param_file)
+        experiment_param_files = args.experiment_param_file or [None]
+        if args.campaign is not None:
+            runs = load_campaign_file(args.campaign)
+        else:
+            runs = matrix_runs(args.topo_param_file, experiment_param_files)
+
+        if args.jobs > 1:
+            ParallelCampaign(args.builder, runs, args.jobs, args.output_dir,
+                repetitions=args.repetitions, results_dir=args.results_dir).run()
+        elif len(runs) != 1 or args.repetitions > 1 or args.results_dir is not None:
+            Campaign(args.builder, runs, repetitions=args.repetitions,
+                results_dir=args.results_dir).run()
+        else:
+            topo_param_file, experiment_param_file = runs[0]
+            Runner(args.builder, topo_param_file, experiment_param_file)
     except Exception as e:
         logging.fatal("A fatal error occurred: {}".format(e))
         traceback.print_exc()
     finally:
-        # Always cleanup Mininet
-        logging.info("cleanup mininet")
-        cleanup()
\ No newline at end of file
+        # Always cleanup the network
+        logging.info("cleanup {}".format(args.builder))
+        cleanup_network(args.builder)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            logging.info("Orchestrator profile written in {}".format(profile_file))
\ No newline at end of file
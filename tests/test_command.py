@@ -0,0 +1,53 @@
+import subprocess
+
+import pytest
+
+from core.command import BATCH_MARKER, build_batch_script, parse_batch_output, split_batch
+
+
+def run_batch(cmds, cwd):
+    output = subprocess.run(["bash", "-c", build_batch_script(cmds)], cwd=str(cwd),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
+    return parse_batch_output(cmds, output)
+
+
+def test_batch_script(tmp_path):
+    (tmp_path / "dir").mkdir()
+    cmds = ["echo a # not the end of the script", "cd dir;", "pwd", "echo 'it''s' \"quoted\" >&2",
+        "sleep 0 &", "false", "f() { return 3; }; f"]
+    results = run_batch(cmds, tmp_path)
+    assert [r.cmd for r in results] == cmds
+    assert [r.output for r in results] == ["a\n", "", "{}\n".format(tmp_path / "dir"),
+        "its quoted\n", "", "", ""]
+    assert [r.exit_code for r in results] == [0, 0, 0, 0, 0, 1, 3]
+    assert all(r.end_time is not None for r in results)
+    assert "\n" not in build_batch_script(cmds)
+
+
+def test_batch_script_multi_line():
+    with pytest.raises(ValueError):
+        build_batch_script(["echo a\necho b"])
+
+
+def test_parse_batch_output():
+    cmds = ["a", "b", "c", "d"]
+    output = "out a\n\n{0}0 1700000000.5\nout b\n\n{0}2 1700000001,25\nout c".format(BATCH_MARKER)
+    a, b, c, d = parse_batch_output(cmds, output.encode())
+    assert (a.output, a.exit_code, a.end_time) == ("out a\n", 0, 1700000000.5)
+    # Decimal comma of some locales
+    assert (b.output, b.exit_code, b.end_time) == ("out b\n", 2, 1700000001.25)
+    # Interrupted during c, d never ran
+    assert (c.output, c.exit_code, c.end_time) == ("out c", None, None)
+    assert (d.output, d.exit_code) == ("", None)
+
+
+def test_split_batch():
+    cmds = ["echo {:02d}".format(i) for i in range(20)]
+    size = len(build_batch_script(cmds[:1]).encode()) + 2
+    chunks = split_batch(cmds, max_size=3 * size)
+    assert [len(c) for c in chunks] == [3] * 6 + [2]
+    assert sum(chunks, []) == cmds
+    # A command longer than the limit is alone in its chunk
+    size = len(build_batch_script(["b"]).encode()) + 2
+    assert split_batch(["a" * 100, "b", "c"], max_size=2 * size) == [["a" * 100], ["b", "c"]]
+    assert split_batch([]) == []
@@ -0,0 +1,70 @@
+import struct
+
+from core.mptcp import DSS_DATA_ACK, DSS_DATA_ACK_8, DSS_DSN_8, DSS_MAPPING, RangeSet, \
+    get_key_token, parse_dss_mapping
+
+
+KEY = bytes(range(1, 9))
+
+
+def test_key_token():
+    # SHA-256 for MPTCP v1, SHA-1 for v0: the token is the most significant 32
+    # bits of the hash of the key, the IDSN its least significant 64 bits
+    assert get_key_token(KEY) == get_key_token(KEY, version=1) == (0x66840dda, 0xf5a101d3d29d6f72)
+    assert get_key_token(KEY, version=0) == (0xdd5783bc, 0x3a95ed6e4ebb4ad5)
+
+
+def test_range_set_in_order():
+    ranges = RangeSet()
+    assert ranges.add(0, 100) == 100
+    assert ranges.add(100, 150) == 50
+    assert (ranges.nxt, ranges.ranges) == (150, [])
+    # Already seen
+    assert ranges.add(50, 120) == 0
+    assert ranges.add(140, 160) == 10
+    assert ranges.nxt == 160
+
+
+def test_range_set_holes():
+    ranges = RangeSet()
+    assert ranges.add(200, 300) == 100
+    assert ranges.add(400, 500) == 100
+    assert (ranges.nxt, ranges.ranges) == (0, [(200, 300), (400, 500)])
+    # Overlapping and adjacent ranges are merged
+    assert ranges.add(250, 420) == 100
+    assert ranges.ranges == [(200, 500)]
+    assert ranges.add(500, 510) == 10
+    assert ranges.add(600, 700) == 100
+    # Filling the hole at the start advances the prefix over the merged ranges
+    assert ranges.add(0, 200) == 200
+    assert (ranges.nxt, ranges.ranges) == (510, [(600, 700)])
+    assert ranges.add(0, 1000) == 490 - 100
+    assert (ranges.nxt, ranges.ranges) == (1000, [])
+
+
+def test_range_set_spanning():
+    ranges = RangeSet()
+    for start in (10, 30, 50):
+        ranges.add(start, start + 10)
+    assert ranges.add(15, 55) == 20
+    assert ranges.ranges == [(10, 60)]
+    assert ranges.add(5, 5) == 0
+
+
+def dss(flags, data_ack=b"", dsn=b"", ssn=0, length=0):
+    option = bytes([30, 0, 0x20, flags]) + data_ack + dsn
+    if flags & DSS_MAPPING:
+        option += struct.pack("!IH", ssn, length) + bytes(2)
+    return bytes([30, len(option)]) + option[2:]
+
+
+def test_parse_dss_mapping():
+    assert parse_dss_mapping(dss(DSS_MAPPING, dsn=struct.pack("!I", 7), ssn=1, length=1400)) == \
+        (7, 4, 1, 1400)
+    assert parse_dss_mapping(dss(DSS_MAPPING | DSS_DSN_8 | DSS_DATA_ACK | DSS_DATA_ACK_8,
+        data_ack=bytes(8), dsn=struct.pack("!Q", 1 << 40), ssn=2, length=10)) == (1 << 40, 8, 2, 10)
+    assert parse_dss_mapping(dss(DSS_MAPPING | DSS_DATA_ACK, data_ack=bytes(4),
+        dsn=struct.pack("!I", 9), ssn=3, length=20)) == (9, 4, 3, 20)
+    # Data ack only, or truncated
+    assert parse_dss_mapping(dss(DSS_DATA_ACK, data_ack=bytes(4))) is None
+    assert parse_dss_mapping(dss(DSS_MAPPING, dsn=struct.pack("!I", 7))[:8]) is None
@@ -0,0 +1,76 @@
+import struct
+
+import pytest
+
+from core.npy import NPY_HEADER_SIZE, NPY_MAGIC, NpyRecordWriter, NpyWriter, \
+    iter_npy_records, load_npy, read_npy_header
+
+
+def test_writer_roundtrip(tmp_path):
+    path = str(tmp_path / "a.npy")
+    writer = NpyWriter(path, ["time", "value"])
+    writer.append((0.0, 1.5))
+    writer.extend([(1.0, -2.0), (2.0, 3.25)])
+    writer.close()
+    assert writer.rows == 3
+    assert load_npy(path) == [(0.0, 1.5), (1.0, -2.0), (2.0, 3.25)]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    header, offset = read_npy_header(data, path)
+    assert offset == NPY_HEADER_SIZE
+    assert header == {"descr": "<f8", "fortran_order": False, "shape": (3, 2)}
+    assert len(data) == NPY_HEADER_SIZE + 3 * 2 * 8
+
+
+def test_empty_writer(tmp_path):
+    path = str(tmp_path / "a.npy")
+    NpyWriter(path, ["time"]).close()
+    assert load_npy(path) == []
+
+
+def test_record_writer_roundtrip(tmp_path):
+    path = str(tmp_path / "r.npy")
+    writer = NpyRecordWriter(path, [("time", "d"), ("src", "4s"), ("port", "H"),
+        ("seq", "I"), ("flags", "B"), ("dsn", "Q"), ("rtt", "f")])
+    rows = [(1.5, b"\x0a\x00\x00\x01", 5001, 1 << 31, 0x12, 1 << 63, 0.25),
+        (2.5, b"\x0a\x00\x00\x02", 80, 0, 0, 0, -1.0)]
+    writer.append(rows[0])
+    writer.extend(rows[1:])
+    writer.close()
+    assert list(iter_npy_records(path)) == rows
+
+    with open(path, "rb") as f:
+        data = f.read()
+    header, offset = read_npy_header(data, path)
+    # numpy requires the data to be aligned on 64 bytes
+    assert offset % 64 == 0
+    assert header["shape"] == (2,)
+    assert header["descr"] == [("time", "<f8"), ("src", "|S4"), ("port", "<u2"), ("seq", "<u4"),
+        ("flags", "|u1"), ("dsn", "<u8"), ("rtt", "<f4")]
+
+
+def test_record_writer_header_size(tmp_path):
+    path = str(tmp_path / "r.npy")
+    writer = NpyRecordWriter(path, [("time", "d")])
+    writer.close()
+    with open(path, "rb") as f:
+        data = f.read()
+    header_length, = struct.unpack_from("<H", data, len(NPY_MAGIC))
+    # The header of an empty array has room for any number of rows
+    assert len(writer.get_header_text(1 << 63)) < header_length
+    assert data[len(NPY_MAGIC) + 2 + header_length - 1:][:1] == b"\n"
+
+
+def test_invalid_files(tmp_path):
+    path = tmp_path / "a.npy"
+    path.write_bytes(b"\x93NUMPY\x02\x00" + bytes(120))
+    with pytest.raises(ValueError):
+        load_npy(str(path))
+    with pytest.raises(ValueError):
+        read_npy_header(path.read_bytes(), str(path))
+
+    records = str(tmp_path / "r.npy")
+    NpyRecordWriter(records, [("time", "d")]).close()
+    with pytest.raises(ValueError):
+        load_npy(records)
@@ -0,0 +1,90 @@
+import struct
+
+from core.packetsummary import BPF_INSTRUCTION, BPF_JA, BPF_JEQ, BPF_JSET, BPF_LD_B_ABS, \
+    BPF_LD_H_ABS, BPF_LD_H_IND, BPF_LD_W_ABS, BPF_LDX_IMM, BPF_LDX_MSH, BPF_RET, \
+    SKF_AD_PROTOCOL, SUMMARY_SNAPLEN, build_filter
+
+
+def run_filter(program, packet, protocol):
+    """
+    Interpret the classic BPF `program` on `packet` (starting at its network
+    header, as for a SOCK_DGRAM packet socket) of the link protocol `protocol`,
+    and return the number of bytes it keeps (0 when out of bounds, as the kernel)
+    """
+    a = x = pc = 0
+    while True:
+        code, jt, jf, k = program[pc]
+        pc += 1
+        try:
+            if code == BPF_LD_W_ABS:
+                a = protocol if k == SKF_AD_PROTOCOL else struct.unpack_from("!I", packet, k)[0]
+            elif code == BPF_LD_H_ABS:
+                a, = struct.unpack_from("!H", packet, k)
+            elif code == BPF_LD_B_ABS:
+                a = packet[k]
+            elif code == BPF_LD_H_IND:
+                a, = struct.unpack_from("!H", packet, x + k)
+            elif code == BPF_LDX_IMM:
+                x = k
+            elif code == BPF_LDX_MSH:
+                x = (packet[k] & 0x0f) * 4
+            elif code == BPF_JA:
+                pc += k
+            elif code == BPF_JEQ:
+                pc += jt if a == k else jf
+            elif code == BPF_JSET:
+                pc += jt if a & k else jf
+            elif code == BPF_RET:
+                return k
+            else:
+                raise ValueError("Unexpected instruction {:#x}".format(code))
+        except (IndexError, struct.error):
+            return 0
+
+
+def ipv4(protocol=6, sport=5001, dport=80, fragment=0, options=b""):
+    header_length = 20 + len(options)
+    return struct.pack("!BxH2xHxB2x8x", 0x40 | header_length // 4, header_length + 20,
+        fragment, protocol) + options + struct.pack("!HH16x", sport, dport)
+
+
+def ipv6(next_header=6, sport=5001, dport=80):
+    return struct.pack("!I2xBx32x", 6 << 28, next_header) + struct.pack("!HH16x", sport, dport)
+
+
+def test_any_port():
+    program = build_filter()
+    assert run_filter(program, ipv4(), 0x0800) == SUMMARY_SNAPLEN
+    assert run_filter(program, ipv6(), 0x86dd) == SUMMARY_SNAPLEN
+    # IP options move the TCP header
+    assert run_filter(program, ipv4(options=bytes(8)), 0x0800) == SUMMARY_SNAPLEN
+
+
+def test_dropped():
+    program = build_filter()
+    # UDP, non-first fragment, IPv6 extension header, ARP
+    assert run_filter(program, ipv4(protocol=17), 0x0800) == 0
+    assert run_filter(program, ipv4(fragment=0x2000 | 185), 0x0800) == 0
+    assert run_filter(program, ipv6(next_header=0), 0x86dd) == 0
+    assert run_filter(program, bytes(28), 0x0806) == 0
+    # More fragments flag on a first fragment is kept
+    assert run_filter(program, ipv4(fragment=0x2000), 0x0800) == SUMMARY_SNAPLEN
+
+
+def test_ports():
+    program = build_filter([80, 443])
+    assert run_filter(program, ipv4(sport=5001, dport=80), 0x0800) == SUMMARY_SNAPLEN
+    assert run_filter(program, ipv4(sport=443, dport=5001), 0x0800) == SUMMARY_SNAPLEN
+    assert run_filter(program, ipv6(sport=80, dport=5001), 0x86dd) == SUMMARY_SNAPLEN
+    assert run_filter(program, ipv4(options=bytes(4), dport=443), 0x0800) == SUMMARY_SNAPLEN
+    assert run_filter(program, ipv4(sport=5001, dport=8080), 0x0800) == 0
+    assert run_filter(program, ipv6(sport=5001, dport=8080), 0x86dd) == 0
+
+
+def test_encoding():
+    program = build_filter([80])
+    for code, jt, jf, k in program:
+        BPF_INSTRUCTION.pack(code, jt, jf, k)
+        # Jumps only go forward, within the program
+        assert 0 <= jt < len(program) and 0 <= jf < len(program)
+    assert program[-1] == (BPF_RET, 0, 0, 0)
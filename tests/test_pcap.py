@@ -0,0 +1,147 @@
+import struct
+
+import pytest
+
+from core.pcap import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL2, LINKTYPE_RAW, PCAP_HEADER, \
+    PCAP_MAGIC_NS, PCAP_MAGIC_US, TCPOPT_MPTCP, PcapReader, get_mptcp_options
+
+
+CLIENT = bytes([10, 0, 0, 1])
+SERVER = bytes([10, 1, 0, 1])
+CLIENT6 = bytes(15) + b"\x01"
+SERVER6 = bytes(15) + b"\x02"
+# MP_CAPABLE (subtype 0, version 1) with a 8 bytes key, padded with a NOP and EOL
+MPTCP_OPTIONS = bytes([TCPOPT_MPTCP, 12, 0x01, 0x81]) + bytes(range(1, 9)) + b"\x01\x00\x00\x00"
+
+
+def tcp(sport=5001, dport=80, seq=1000, ack=2000, flags=0x18, window=512, options=b""):
+    return struct.pack("!HHIIBBH4x", sport, dport, seq, ack, (20 + len(options)) // 4 << 4,
+        flags, window) + options
+
+
+def ipv4(segment, payload=0, protocol=6, fragment=0, src=CLIENT, dst=SERVER):
+    return struct.pack("!BxHHHxBH4s4s", 0x45, 20 + len(segment) + payload, 0, fragment,
+        protocol, 0, src, dst) + segment
+
+
+def ipv6(segment, payload=0, extension=None):
+    headers, next_header = segment, 6
+    if extension is not None:
+        # Hop-by-hop options header of 8 bytes
+        headers, next_header = bytes([6, 0]) + bytes(6) + segment, extension
+    return struct.pack("!IHBB16s16s", 6 << 28, len(headers) + payload, next_header, 64,
+        CLIENT6, SERVER6) + headers
+
+
+def ethernet(packet, ethertype=0x0800, vlan=False):
+    header = bytes(12)
+    if vlan:
+        header += struct.pack("!HH", 0x8100, 42)
+    return header + struct.pack("!H", ethertype) + packet
+
+
+def write_pcap(path, records, linktype=LINKTYPE_ETHERNET, endian="<", magic=PCAP_MAGIC_US,
+        truncate=0):
+    """
+    Write the pcap file `path` of the (seconds, fraction, data) `records`, whose
+    last `truncate` bytes are cut
+    """
+    data = struct.pack(endian + PCAP_HEADER.format, magic, 2, 4, 0, 0, 65535, linktype)
+    for seconds, fraction, packet in records:
+        data += struct.pack(endian + "IIII", seconds, fraction, len(packet), len(packet)) + packet
+    with open(path, "wb") as f:
+        f.write(data[:len(data) - truncate])
+    return str(path)
+
+
+def read_packets(path):
+    with PcapReader(path) as reader:
+        return list(reader.packets())
+
+
+def test_ethernet_ipv4(tmp_path):
+    path = write_pcap(tmp_path / "c.pcap", [
+        (10, 500000, ethernet(ipv4(tcp(options=MPTCP_OPTIONS), payload=1000))),
+        (11, 0, ethernet(ipv4(tcp(sport=80, dport=5001, flags=0x10)))),
+    ])
+    first, second = read_packets(path)
+    assert first.offset == PCAP_HEADER.size
+    assert first.time == pytest.approx(10.5)
+    assert (first.src, first.sport, first.dst, first.dport) == (CLIENT, 5001, SERVER, 80)
+    assert (first.seq, first.ack, first.flags, first.window) == (1000, 2000, 0x18, 512)
+    assert first.length == 1000
+    assert first.options == MPTCP_OPTIONS
+    assert (second.sport, second.dport, second.length) == (80, 5001, 0)
+
+
+def test_skipped_records(tmp_path):
+    path = write_pcap(tmp_path / "c.pcap", [
+        # UDP, non-first fragment, ARP, then a TCP segment
+        (1, 0, ethernet(ipv4(bytes(8), protocol=17))),
+        (2, 0, ethernet(ipv4(bytes(20), fragment=185))),
+        (3, 0, ethernet(bytes(28), ethertype=0x0806)),
+        (4, 0, ethernet(ipv4(tcp()))),
+    ])
+    packets = read_packets(path)
+    assert [p.time for p in packets] == [4]
+
+
+def test_vlan_and_ipv6(tmp_path):
+    path = write_pcap(tmp_path / "c.pcap", [
+        (1, 0, ethernet(ipv4(tcp(), payload=10), vlan=True)),
+        (2, 0, ethernet(ipv6(tcp(), payload=20), ethertype=0x86dd)),
+        (3, 0, ethernet(ipv6(tcp(), payload=30, extension=0), ethertype=0x86dd)),
+    ])
+    vlan, v6, v6_extension = read_packets(path)
+    assert (vlan.src, vlan.length) == (CLIENT, 10)
+    assert (v6.src, v6.dst, v6.length) == (CLIENT6, SERVER6, 20)
+    assert (v6_extension.sport, v6_extension.length) == (5001, 30)
+
+
+def test_link_types(tmp_path):
+    raw = write_pcap(tmp_path / "raw.pcap", [(1, 0, ipv4(tcp()))], linktype=LINKTYPE_RAW)
+    assert read_packets(raw)[0].src == CLIENT
+    # Linux cooked v2: protocol, then 18 bytes of interface and address
+    sll2 = write_pcap(tmp_path / "sll2.pcap", [(1, 0, struct.pack("!H", 0x0800) + bytes(18) +
+        ipv4(tcp()))], linktype=LINKTYPE_LINUX_SLL2)
+    assert read_packets(sll2)[0].dst == SERVER
+
+
+def test_big_endian_nanoseconds(tmp_path):
+    path = write_pcap(tmp_path / "c.pcap", [(5, 250000000, ethernet(ipv4(tcp())))],
+        endian=">", magic=PCAP_MAGIC_NS)
+    packet, = read_packets(path)
+    assert packet.time == pytest.approx(5.25)
+
+
+def test_truncated_record(tmp_path):
+    path = write_pcap(tmp_path / "c.pcap", [(1, 0, ethernet(ipv4(tcp()))),
+        (2, 0, ethernet(ipv4(tcp())))], truncate=10)
+    assert [p.time for p in read_packets(path)] == [1]
+
+
+def test_packet_at(tmp_path):
+    first = ethernet(ipv4(tcp(seq=1)))
+    path = write_pcap(tmp_path / "c.pcap", [(1, 0, first), (2, 0, ethernet(ipv4(tcp(seq=2))))])
+    with PcapReader(path) as reader:
+        assert reader.packet_at(PCAP_HEADER.size + 16 + len(first)).seq == 2
+
+
+def test_invalid_files(tmp_path):
+    empty = tmp_path / "empty.pcap"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        PcapReader(str(empty))
+    pcapng = tmp_path / "c.pcapng"
+    pcapng.write_bytes(b"\x0a\x0d\x0d\x0a" + bytes(28))
+    with pytest.raises(ValueError):
+        PcapReader(str(pcapng))
+    with pytest.raises(ValueError):
+        PcapReader(write_pcap(tmp_path / "c.pcap", [], linktype=1000))
+
+
+def test_get_mptcp_options():
+    options = b"\x01\x01" + bytes([2, 4, 5, 0xb4]) + MPTCP_OPTIONS
+    assert list(get_mptcp_options(options)) == [(0, MPTCP_OPTIONS[:12])]
+    # Invalid length ends the parsing
+    assert list(get_mptcp_options(bytes([TCPOPT_MPTCP, 1, 0x20]))) == []
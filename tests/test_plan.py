@@ -0,0 +1,104 @@
+import json
+import logging
+
+from core.command import CommandBatch, CommandResult
+from core.plan import ConfigPlan, PlanBatch, apply_plan_commands
+
+
+def record(directory, cmds):
+    plan = ConfigPlan(str(directory))
+    batch = PlanBatch(plan)
+    for who, cmd in cmds:
+        batch.add(who, cmd)
+    assert batch.flush() == {}
+    return plan
+
+
+CMDS = [
+    ("bs0", "tc qdisc add dev bs0-eth1 root handle 10: netem delay 10ms; tc qdisc add dev bs0-eth1 "
+        "parent 10:1 handle 1:0 tbf rate 10mbit burst 15000 limit 30000"),
+    ("bs0", "ethtool -K bs0-eth1 tso off"),
+    ("bs0", "tc qdisc add dev bs0-eth2 root handle 10: netem delay 10ms"),
+    ("Client_0", "ip rule add from 10.0.0.1 table 1; ip route add 10.0.0.0/24 dev Client_0-eth0 table 1"),
+    ("Client_0", "ip -6 addr flush dev Client_0-eth0"),
+    ("Client_0", "echo 1 > /proc/sys/net/ipv4/ip_forward; ip link set dev lo up"),
+]
+
+
+def test_add(tmp_path):
+    plan = record(tmp_path, CMDS)
+    assert plan.steps["bs0"] == [
+        ("tc", "qdisc add dev bs0-eth1 root handle 10: netem delay 10ms"),
+        ("tc", "qdisc add dev bs0-eth1 parent 10:1 handle 1:0 tbf rate 10mbit burst 15000 limit 30000"),
+        (None, "ethtool -K bs0-eth1 tso off"),
+        ("tc", "qdisc add dev bs0-eth2 root handle 10: netem delay 10ms"),
+    ]
+    # Options of the tool cannot go in a batch file, shell commands are kept as a whole
+    assert plan.steps["Client_0"][2:] == [
+        (None, "ip -6 addr flush dev Client_0-eth0"),
+        (None, "echo 1 > /proc/sys/net/ipv4/ip_forward; ip link set dev lo up"),
+    ]
+
+
+def test_compile(tmp_path):
+    commands, batch_files = record(tmp_path, CMDS).compile()
+    bs0_tc, bs0_tc_2 = (str(tmp_path / "bs0.{}.tc".format(i)) for i in (0, 2))
+    client_ip = str(tmp_path / "Client_0.0.ip")
+    assert commands == {
+        "bs0": ["tc -force -batch " + bs0_tc, "ethtool -K bs0-eth1 tso off",
+            "tc -force -batch " + bs0_tc_2],
+        "Client_0": ["ip -force -batch " + client_ip, "ip -6 addr flush dev Client_0-eth0",
+            "echo 1 > /proc/sys/net/ipv4/ip_forward; ip link set dev lo up"],
+    }
+    assert [len(batch_files[f]) for f in (bs0_tc, bs0_tc_2, client_ip)] == [2, 1, 2]
+
+
+def test_write_load(tmp_path):
+    directory = tmp_path / "plan"
+    commands = record(directory, CMDS).write()
+    assert (directory / "bs0.0.tc").read_text() == \
+        "qdisc add dev bs0-eth1 root handle 10: netem delay 10ms\n" \
+        "qdisc add dev bs0-eth1 parent 10:1 handle 1:0 tbf rate 10mbit burst 15000 limit 30000\n"
+    assert record(directory, CMDS).load() == commands
+    # No plan yet
+    assert record(tmp_path / "other", CMDS).load() is None
+
+
+def test_stale(tmp_path):
+    record(tmp_path, CMDS).write()
+    # Other steps, e.g., compiled by another version of the code
+    assert record(tmp_path, CMDS[1:]).load() is None
+
+    plan_file = tmp_path / ConfigPlan.PLAN_FILENAME
+    plan = json.loads(plan_file.read_text())
+    plan_file.write_text(json.dumps(dict(plan, version=ConfigPlan.VERSION - 1)))
+    assert record(tmp_path, CMDS).load() is None
+    plan_file.write_text("{")
+    assert record(tmp_path, CMDS).load() is None
+
+
+class FakeTopo(object):
+    def __init__(self, exit_codes):
+        self.exit_codes = exit_codes
+        self.commands = {}
+
+    def command_batch(self):
+        return CommandBatch(self, parallel=False)
+
+    def get_host(self, name):
+        return name
+
+    def command_batch_to(self, who, cmds):
+        self.commands.setdefault(who, []).extend(cmds)
+        return [CommandResult(cmd, "error" if self.exit_codes.get(cmd) else "",
+            self.exit_codes.get(cmd, 0)) for cmd in cmds]
+
+
+def test_apply(tmp_path, caplog):
+    commands = record(tmp_path, CMDS).write()
+    topo = FakeTopo({commands["bs0"][1]: 1})
+    with caplog.at_level(logging.ERROR):
+        apply_plan_commands(topo, commands)
+    assert topo.commands == commands
+    assert [r.getMessage() for r in caplog.records] == \
+        ["ethtool -K bs0-eth1 tso off failed on bs0: error"]
@@ -0,0 +1,119 @@
+import json
+import time
+
+from core.command import CommandBatch, CommandResult
+from core.scheduler import LinkEventScheduler
+
+
+class FakeTopo(object):
+    """
+    Topology recording the commands run by each flush, failing the commands
+    starting with "false" and raising for the host "broken"
+    """
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.flushes = []
+
+    def command_batch(self):
+        self.flushes.append({})
+        return CommandBatch(self, parallel=False)
+
+    def command_batch_to(self, who, cmds):
+        self.flushes[-1][who] = cmds
+        time.sleep(self.delay)
+        if who == "broken":
+            raise OSError("no shell")
+        return [CommandResult(cmd, "", 1 if cmd.startswith("false") else 0) for cmd in cmds]
+
+
+def run(scheduler):
+    scheduler.start()
+    scheduler.thread.join()
+
+
+def test_order_and_batching():
+    topo = FakeTopo()
+    scheduler = LinkEventScheduler(topo)
+    scheduler.add(0.05, "bs1", "c", label="later")
+    scheduler.add(0, "bs0", "a1")
+    scheduler.add(0, "bs1", "b")
+    scheduler.add(0, "bs0", "a2")
+    run(scheduler)
+    # Events due together are fired with a single batch, in the order they were added
+    assert topo.flushes == [{"bs0": ["a1", "a2"], "bs1": ["b"]}, {"bs1": ["c"]}]
+    assert [r["cmd"] for r in scheduler.records] == ["a1", "b", "a2", "c"]
+    first, last = scheduler.records[0], scheduler.records[-1]
+    assert all(r["fired"] == first["fired"] for r in scheduler.records[:3])
+    assert last["fired"] >= 0.05 and last["label"] == "later"
+    assert first["completed"] >= first["fired"] >= first["at"] == 0
+    assert scheduler.max_lateness == max(r["lateness"] for r in scheduler.records)
+
+
+def test_failures():
+    scheduler = LinkEventScheduler(FakeTopo())
+    scheduler.add(0, "bs0", "false")
+    scheduler.add(0, "broken", "true")
+    scheduler.add(0.01, "bs0", "true")
+    run(scheduler)
+    failed, broken, next_event = scheduler.records
+    assert (failed["exit_code"], failed["error"]) == (1, None)
+    assert (broken["exit_code"], broken["error"]) == (None, "no shell")
+    assert (next_event["exit_code"], next_event["error"]) == (0, None)
+
+
+def test_sources():
+    def raising():
+        yield 0.01, "bs0", "x"
+        raise ValueError("bad trace")
+
+    topo = FakeTopo()
+    scheduler = LinkEventScheduler(topo)
+    scheduler.add_source("trace", ((i * 0.01, "bs0", "false" if i == 1 else "true")
+        for i in range(3)))
+    scheduler.add_source("broken", raising())
+    # Sources are pulled one event at a time
+    assert len(scheduler) == 2
+    run(scheduler)
+    assert scheduler.records == []
+    assert scheduler.sources["trace"]["fired"] == 3 and scheduler.sources["trace"]["failed"] == 1
+    assert scheduler.sources["broken"]["fired"] == 1
+
+
+def test_lateness():
+    # The first flush takes 50 ms, the second event is fired late
+    scheduler = LinkEventScheduler(FakeTopo(delay=0.05))
+    scheduler.add(0, "bs0", "a")
+    scheduler.add(0.01, "bs0", "b")
+    run(scheduler)
+    first, second = scheduler.records
+    assert second["fired"] >= first["completed"] >= 0.05
+    assert second["lateness"] >= 0.04
+    assert scheduler.max_lateness == second["lateness"]
+
+
+def test_cancel(tmp_path):
+    topo = FakeTopo()
+    scheduler = LinkEventScheduler(topo)
+    scheduler.add(0, "bs0", "a")
+    scheduler.add(60, "bs0", "b")
+    scheduler.start()
+    while len(scheduler.records) == 0:
+        time.sleep(0.001)
+    start = time.monotonic()
+    scheduler.cancel()
+    assert time.monotonic() - start < 1
+    assert topo.flushes == [{"bs0": ["a"]}]
+
+    path = str(tmp_path / LinkEventScheduler.FILENAME)
+    scheduler.write(path)
+    with open(path) as f:
+        written = json.load(f)
+    assert (written["fired"], written["cancelled"]) == (1, 1)
+    assert written["events"][0]["cmd"] == "a"
+
+
+def test_no_events():
+    scheduler = LinkEventScheduler(FakeTopo())
+    scheduler.start()
+    assert scheduler.thread is None
+    scheduler.cancel()
@@ -0,0 +1,32 @@
+import socket
+import struct
+
+from core.sockstats import parse_mptcp_connections, parse_proc_address
+
+
+def proc_address(family, address, port):
+    # 32 bits words of the address in host order, as the kernel prints them
+    packed = socket.inet_pton(family, address)
+    return "".join("{:08X}".format(struct.unpack_from("=I", packed, i)[0])
+        for i in range(0, len(packed), 4)) + ":{:04X}".format(port)
+
+
+def test_parse_proc_address():
+    assert parse_proc_address(proc_address(socket.AF_INET, "10.0.0.1", 5001)) == ("10.0.0.1", 5001)
+    assert parse_proc_address(proc_address(socket.AF_INET6, "fd00::1:2", 80)) == ("fd00::1:2", 80)
+
+
+def test_parse_mptcp_connections():
+    text = "  sl  loc_tok  rem_tok  v6 local_address                         remote_address" \
+        "                        st ns tx_queue rx_queue inode\n"
+    text += "   0: 4A1B2C3D 5E6F7A8B  0 {}                         {}                        " \
+        " 01 02 00000000:00000000 0\n".format(proc_address(socket.AF_INET, "10.0.0.1", 49394),
+            proc_address(socket.AF_INET, "10.1.0.1", 5001))
+    text += "   1: 0000000A 0000000B  1 {} {}  01 01 00000000:00000000 0\n".format(
+        proc_address(socket.AF_INET6, "fd00::1", 80), proc_address(socket.AF_INET6, "fd00::2", 443))
+    text += "   2: truncated\n"
+    assert parse_mptcp_connections(text) == {
+        ("10.0.0.1", 49394, "10.1.0.1", 5001): (0x4a1b2c3d, 0x5e6f7a8b),
+        ("fd00::1", 80, "fd00::2", 443): (0xa, 0xb),
+    }
+    assert parse_mptcp_connections("") == {}
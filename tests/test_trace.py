@@ -0,0 +1,56 @@
+import pytest
+
+from core.trace import LinkTrace
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_mahimahi(tmp_path):
+    # 10 ms intervals: 2, 0 then 1 delivery opportunities of 1500 bytes
+    trace = LinkTrace(write(tmp_path / "link.trace", b"0\n5\n25\n"))
+    assert trace.format == LinkTrace.MAHIMAHI
+    assert list(trace.samples()) == [(0, 2.4, None, None), (10, 0.0, None, None),
+        (20, 1.2, None, None)]
+    # No null rate
+    assert list(trace.changes()) == [(0, 2.4, None, None), (10, LinkTrace.MIN_BANDWIDTH, None, None),
+        (20, 1.2, None, None)]
+
+
+def test_time_series(tmp_path):
+    trace = LinkTrace(write(tmp_path / "link.csv", b"# time,bw,delay,loss\n"
+        b"0,10,20,0\n"
+        b"\n"
+        b"3,12\n"
+        b"7,15,,1\n"
+        b"15,15,20\n"
+        b"21,,30\n"))
+    assert trace.format == LinkTrace.TIME_SERIES
+    assert next(trace.samples()) == (0, 10, 20, 0)
+    # The last value of each field within an interval wins, unchanged values are dropped
+    assert list(trace.changes()) == [(0, 15, 20, 1), (20, None, 30, None)]
+    assert trace.first_change() == (0, 15, 20, 1)
+
+
+def test_binary_roundtrip(tmp_path):
+    trace = LinkTrace(write(tmp_path / "link.csv", b"0,10,20\n10,,25,2\n"))
+    binary = str(tmp_path / "link.bin")
+    assert trace.write_binary(binary) == 2
+    converted = LinkTrace(binary)
+    assert converted.format == LinkTrace.BINARY
+    assert list(converted.changes()) == list(trace.changes()) == \
+        [(0, 10, 20, None), (10, None, 25, 2)]
+
+
+def test_interval(tmp_path):
+    path = write(tmp_path / "link.csv", b"0,10\n15,20\n35,30\n")
+    assert list(LinkTrace(path, interval=20).changes()) == [(0, 20, None, None),
+        (20, 30, None, None)]
+    with pytest.raises(ValueError):
+        LinkTrace(path, interval=0)
+
+
+def test_empty(tmp_path):
+    assert LinkTrace(write(tmp_path / "link.trace", b"")).first_change() is None
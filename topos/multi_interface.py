@@ -76,95 +76,105 @@ class MultiInterfaceConfig(TopoConfig):
         super(MultiInterfaceConfig, self).__init__(topo, param)
 
     def configure_routing(self):
+        batch = self.topo.command_batch()
         for i, _ in enumerate(self.topo.c2r_links):
             cmd = self.add_table_route_command(self.get_client_ip(i), i)
-            self.topo.command_to(self.client, cmd)
+            batch.add(self.client, cmd)
 
             cmd = self.add_link_scope_route_command(
                     self.get_client_subnet(i),
                     self.get_client_interface(0, i), i)
-            self.topo.command_to(self.client, cmd)
+            batch.add(self.client, cmd)
 
             cmd = self.add_table_default_route_command(self.get_router_ip_to_client_switch(i),
                     i)
-            self.topo.command_to(self.client, cmd)
+            batch.add(self.client, cmd)
 
         for i, _ in enumerate(self.topo.r2s_links):
             cmd = self.add_table_route_command(self.get_server_ip(i), i)
-            self.topo.command_to(self.server, cmd)
+            batch.add(self.server, cmd)
 
             cmd = self.add_link_scope_route_command(
                     self.get_server_subnet(i),
                     self.get_server_interface(0, i), i)
-            self.topo.command_to(self.server, cmd)
+            batch.add(self.server, cmd)
 
             cmd = self.add_table_default_route_command(self.get_router_ip_to_server_switch(i),
                     i)
-            self.topo.command_to(self.server, cmd)
+            batch.add(self.server, cmd)
 
         cmd = self.add_global_default_route_command(self.get_router_ip_to_client_switch(0),
                 self.get_client_interface(0, 0))
-        self.topo.command_to(self.client, cmd)
+        batch.add(self.client, cmd)
 
         cmd = self.add_simple_default_route_command(self.get_router_ip_to_server_switch(0))
-        self.topo.command_to(self.server, cmd)
+        batch.add(self.server, cmd)
+        batch.flush()
 
 
     def configure_interfaces(self):
         logging.info("Configure interfaces using MultiInterfaceConfig...")
         super(MultiInterfaceConfig, self).configure_interfaces()
+        batch = self.topo.command_batch()
         self.client = self.topo.get_client(0)
         self.server = self.topo.get_server(0)
         self.router = self.topo.get_router(0)
         netmask = "255.255.255.0"
+        # Static neighbor entries are queued once all interfaces of the node are up
+        neighbor_entries = []
 
         for i, _ in enumerate(self.topo.c2r_links):
             cmd = self.interface_up_command(self.get_client_interface(0, i), self.get_client_ip(i), netmask)
-            self.topo.command_to(self.client, cmd)
+            batch.add(self.client, cmd)
             client_interface_mac = self.client.intf(self.get_client_interface(0, i)).MAC()
-            self.topo.command_to(self.router, "arp -s {} {}".format(self.get_client_ip(i), client_interface_mac))
+            neighbor_entries.append((self.router, self.get_client_ip(i), client_interface_mac,
+                self.get_router_interface_to_client_switch(i)))
 
             if self.topo.get_client_to_router_links()[i].backup:
                 cmd = self.interface_backup_command(self.get_client_interface(0, i))
-                self.topo.command_to(self.client, cmd)
+                batch.add(self.client, cmd)
 
         for i, _ in enumerate(self.topo.c2r_links):
             cmd = self.interface_up_command(self.get_router_interface_to_client_switch(i),
                     self.get_router_ip_to_client_switch(i), netmask)
-            self.topo.command_to(self.router, cmd)
+            batch.add(self.router, cmd)
             router_interface_mac = self.router.intf(self.get_router_interface_to_client_switch(i)).MAC()
-            self.topo.command_to(self.client, "arp -s {} {}".format(
-                self.get_router_ip_to_client_switch(i), router_interface_mac))
+            neighbor_entries.append((self.client, self.get_router_ip_to_client_switch(i),
+                router_interface_mac, self.get_client_interface(0, i)))
 
         if len(self.topo.r2s_links) == 0:
             # Case no server param is specified
             cmd = self.interface_up_command(self.get_router_interface_to_server_switch(0),
                     self.get_router_ip_to_server_switch(0), netmask)
-            self.topo.command_to(self.router, cmd)
+            batch.add(self.router, cmd)
             router_interface_mac = self.router.intf(self.get_router_interface_to_server_switch(0)).MAC()
-            self.topo.command_to(self.server, "arp -s {} {}".format(
-                self.get_router_ip_to_server_switch(0), router_interface_mac))
+            neighbor_entries.append((self.server, self.get_router_ip_to_server_switch(0),
+                router_interface_mac, self.get_server_interface(0, 0)))
 
             cmd = self.interface_up_command(self.get_server_interface(0, 0), self.get_server_ip(0), netmask)
-            self.topo.command_to(self.server, cmd)
+            batch.add(self.server, cmd)
             server_interface_mac = self.server.intf(self.get_server_interface(0, 0)).MAC()
-            self.topo.command_to(self.router, "arp -s {} {}".format(
-                self.get_server_ip(0), server_interface_mac))
+            neighbor_entries.append((self.router, self.get_server_ip(0), server_interface_mac,
+                self.get_router_interface_to_server_switch(0)))
 
         for i, _ in enumerate(self.topo.r2s_links):
             cmd = self.interface_up_command(self.get_router_interface_to_server_switch(i),
                     self.get_router_ip_to_server_switch(i), netmask)
-            self.topo.command_to(self.router, cmd)
+            batch.add(self.router, cmd)
             router_interface_mac = self.router.intf(self.get_router_interface_to_server_switch(i)).MAC()
-            self.topo.command_to(self.server, "arp -s {} {}".format(
-                self.get_router_ip_to_server_switch(i), router_interface_mac))
+            neighbor_entries.append((self.server, self.get_router_ip_to_server_switch(i),
+                router_interface_mac, self.get_server_interface(0, i)))
 
         for i, _ in enumerate(self.topo.r2s_links):
             cmd = self.interface_up_command(self.get_server_interface(0, i), self.get_server_ip(i), netmask)
-            self.topo.command_to(self.server, cmd)
+            batch.add(self.server, cmd)
             server_interface_mac = self.server.intf(self.get_server_interface(0, i)).MAC()
-            self.topo.command_to(self.router, "arp -s {} {}".format(
-                self.get_server_ip(i), server_interface_mac))
+            neighbor_entries.append((self.router, self.get_server_ip(i), server_interface_mac,
+                self.get_router_interface_to_server_switch(i)))
+
+        for node, ip, mac, interface_name in neighbor_entries:
+            batch.add(node, self.neighbor_command(ip, mac, interface_name))
+        batch.flush()
 
     def get_client_ip(self, interface_index):
         return "{}{}.1".format(self.param.get(TopoParameter.LEFT_SUBNET), interface_index)
@@ -42,48 +42,58 @@ class MultiInterfaceMultiClientConfig(MultiInterfaceConfig):
 
     def configure_routing(self):
         super(MultiInterfaceMultiClientConfig, self).configure_routing()
+        batch = self.topo.command_batch()
         for i, _ in enumerate(self.topo.c2r_links):
             # Routing for the congestion client
             cmd = self.add_global_default_route_command(self.get_router_ip_to_client_switch(i),
                 self.get_client_interface(i+1, 0))
-            self.topo.command_to(self.clients[i+1], cmd)
+            batch.add(self.clients[i+1], cmd)
 
         for i, s in enumerate(self.topo.servers):
             # Routing for the congestion server
             cmd = self.add_simple_default_route_command(self.get_router_ip_to_server_switch(i))
-            self.topo.command_to(s, cmd)
+            batch.add(s, cmd)
+        batch.flush()
 
     def configure_interfaces(self):
         logging.info("Configure interfaces using MultiInterfaceMultiClientConfig...")
         super(MultiInterfaceMultiClientConfig, self).configure_interfaces()
+        batch = self.topo.command_batch()
         self.clients = [self.topo.get_client(i) for i in range(0, self.topo.client_count())]
         self.servers = [self.topo.get_server(i) for i in range(0, self.topo.server_count())]
         netmask = "255.255.255.0"
+        # Static neighbor entries are queued once all interfaces of the node are up
+        neighbor_entries = []
 
         for i, _ in enumerate(self.topo.c2r_links):
             # Congestion client
             cmd = self.interface_up_command(self.get_client_interface(i + 1, 0), self.get_client_ip(i, congestion_client=True), netmask)
-            self.topo.command_to(self.clients[i+1], cmd)
+            batch.add(self.clients[i+1], cmd)
             client_interface_mac = self.clients[i+1].intf(self.get_client_interface(i + 1, 0)).MAC()
-            self.topo.command_to(self.router, "arp -s {} {}".format(self.get_client_ip(i, congestion_client=True), client_interface_mac))
+            neighbor_entries.append((self.router, self.get_client_ip(i, congestion_client=True),
+                client_interface_mac, self.get_router_interface_to_client_switch(i)))
 
             router_interface_mac = self.router.intf(self.get_router_interface_to_client_switch(i)).MAC()
             # Congestion client
-            self.topo.command_to(self.clients[i+1], "arp -s {} {}".format(
-                self.get_router_ip_to_client_switch(i), router_interface_mac))
+            neighbor_entries.append((self.clients[i+1], self.get_router_ip_to_client_switch(i),
+                router_interface_mac, self.get_client_interface(i + 1, 0)))
 
         for i, s in enumerate(self.servers):
             cmd = self.interface_up_command(self.get_router_interface_to_server_switch(i),
                 self.get_router_ip_to_server_switch(i), netmask)
-            self.topo.command_to(self.router, cmd)
+            batch.add(self.router, cmd)
             router_interface_mac = self.router.intf(self.get_router_interface_to_server_switch(i)).MAC()
-            self.topo.command_to(s, "arp -s {} {}".format(
-                self.get_router_ip_to_server_switch(i), router_interface_mac))
+            neighbor_entries.append((s, self.get_router_ip_to_server_switch(i), router_interface_mac,
+                self.get_server_interface(i, 0)))
             cmd = self.interface_up_command(self.get_server_interface(i, 0), self.get_server_ip(interface_index=i), netmask)
-            self.topo.command_to(s, cmd)
+            batch.add(s, cmd)
             server_interface_mac = s.intf(self.get_server_interface(i, 0)).MAC()
-            self.topo.command_to(self.router, "arp -s {} {}".format(
-                self.get_server_ip(interface_index=i), server_interface_mac))
+            neighbor_entries.append((self.router, self.get_server_ip(interface_index=i),
+                server_interface_mac, self.get_router_interface_to_server_switch(i)))
+
+        for node, ip, mac, interface_name in neighbor_entries:
+            batch.add(node, self.neighbor_command(ip, mac, interface_name))
+        batch.flush()
 
     def get_client_ip(self, interface_index, congestion_client=False):
         return "{}{}.{}".format(self.param.get(TopoParameter.LEFT_SUBNET), interface_index, "10" if congestion_client else "1")